@@ -10,6 +10,7 @@ from datetime import datetime
 # Add parent directory to path to import config
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 import src.config as config
+import src.content_store as content_store
 
 # Import data manager and tab modules
 from .data_manager import DataManager
@@ -97,7 +98,10 @@ class Dashboard:
             """Serve images from cache directory."""
             logger.debug(f"Serving image: {path}")
             try:
-                return send_from_directory(self.cache_dir, path)
+                response = send_from_directory(self.cache_dir, path)
+                # viewed files are kept longer by the retention
+                content_store.touch(path, root=self.cache_dir)
+                return response
             except Exception as e:
                 logger.error(f"Error serving image {path}: {str(e)}")
                 raise
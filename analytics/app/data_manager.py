@@ -4,6 +4,7 @@ Centralizes all database operations and DataFrame management.
 """
 import pandas as pd
 import sqlite3
+import json
 import logging
 import os
 import sys
@@ -502,6 +503,19 @@ class DataManager:
             logger.error(f"Database error in get_image_by_id_or_sha1: {str(e)}")
             return None, pd.DataFrame()
 
+    def get_cached_faces(self, sha1):
+        """Get the detected faces of an image from the face cache, None if the image is not in the cache."""
+        face_cache_path = config.FaceAnalysis_get_face_cache_path()
+        if not os.path.exists(face_cache_path):
+            return None
+        try:
+            with sqlite3.connect(face_cache_path) as conn:
+                row = conn.execute("SELECT Faces FROM tblFaces WHERE SHA1 = ?", (sha1,)).fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            logger.error(f"Database error in get_cached_faces: {str(e)}")
+            return None
+
     def get_style_usage(self, start_date=None, end_date=None):
         """Get aggregated counts of generation styles used with percentages."""
         if self._df is None:
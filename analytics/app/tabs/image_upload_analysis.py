@@ -138,6 +138,14 @@ class ImageUploadAnalysisTab:
             customdata=df[['SHA1', 'CachePath', 'Token', 'Face', 'GenderText', 'AgeSpan', 'Session']].values
         )
 
+    def _format_cached_faces(self, faces):
+        """Short text of the faces stored in the face cache, e.g. '2: Male (25-32), Female (15-20)'."""
+        if faces is None:
+            return 'N/A'
+        if len(faces) == 0:
+            return '0'
+        return f"{len(faces)}: " + ", ".join(f"{face.get('gender', '?')} {face.get('age', '')}" for face in faces)
+
     def create_top_uploaded_images_chart(self, df):
         """Create bar chart of most frequently uploaded images."""
         logger.debug("Creating top uploaded images chart")
@@ -395,6 +403,10 @@ class ImageUploadAnalysisTab:
                         html.Strong("Age Range: "),
                         html.Span(image_data['AgeSpan'] if pd.notna(image_data['AgeSpan']) else 'N/A')
                     ], style={'margin': '5px 0'}),
+                    html.Div([
+                        html.Strong("Faces (cache): "),
+                        html.Span(self._format_cached_faces(self.data_manager.get_cached_faces(image_data['SHA1'])))
+                    ], style={'margin': '5px 0'}),
                     html.Div([
                         html.Strong(f"Uploads for this File: "),
                         html.Span(str(image_data["UploadCount"]))
@@ -23,8 +23,12 @@ logger = logging.getLogger("app.main")
 # Read configuration
 config.read_configuration()
 
-from src.UI import create_gradio_interface
+from src.UI import create_gradio_interface, background_generator, submit_style_generation, warm_up_face_analysis, flush_background_tasks, get_delivery_folder
 import src.analytics as analytics
+import src.precompute as precompute
+import src.retention as retention
+import src.onnx_fusion as onnx_fusion
+import src.face_cache as face_cache
 import src.utils as utils
 import gradio as gr
 
@@ -48,15 +52,21 @@ if __name__ == "__main__":
         try:
             utils.download_file_if_not_existing(config.get_modelurl_onnx_age_googlenet(), local_path=config.get_modelfile_onnx_age_googlenet())
             utils.download_file_if_not_existing(config.get_modelurl_onnx_gender_googlenet(), local_path=config.get_modelfile_onnx_gender_googlenet())
+            onnx_fusion.build_age_gender_model()
         except Exception as e:
             logger.error("Could not detect or download face recognition models: %s", str(e))
 
 
         if config.is_analytics_enabled():
             analytics.start()
+        face_cache.start()
+        warm_up_face_analysis()
         title = config.get_app_title()
         logger.info("Starting server with title: %s", title)
         app = create_gradio_interface()
+        # needs the style details of the interface
+        precompute.start(background_generator, submit_style_generation)
+        retention.start(background_generator, get_delivery_folder())
         app.launch(
             server_name="0.0.0.0",#TODO: add ip to config
             server_port=config.get_server_port(),
@@ -66,6 +76,10 @@ if __name__ == "__main__":
             enable_monitoring=False,
             max_file_size=12*gr.FileSize.MB
         )
+        precompute.stop()
+        retention.stop()
+        # uploads and generation results are stored after the response
+        flush_background_tasks(timeout=30)
         analytics.stop()
     except Exception as e:
         logger.error("Application error: %s", str(e))
@@ -1,4 +1,6 @@
 import gc
+import math
+import numpy as np
 from PIL import Image, ImageDraw
 from hashlib import sha1
 import logging
@@ -130,6 +132,9 @@ def _load_img2img_model(model=config.get_model(), use_cached_model=True):
         pipeline = pipeline.to(device)
         if device == "cuda":
             pipeline.enable_xformers_memory_efficient_attention()
+        if config.GenAI_is_tiled_generation_enabled():
+            # encode and decode big images tile by tile to keep the memory usage bounded
+            pipeline.enable_vae_tiling()
         logger.debug("Pipeline created")
         IMAGE_TO_IMAGE_PIPELINE = pipeline
         return pipeline
@@ -140,9 +145,11 @@ def _load_img2img_model(model=config.get_model(), use_cached_model=True):
         raise Exception(message="Error while loading the model.\nSee logfile for details.")
 
 def _cleanup_img2img_pipeline():
-    global IMAGE_TO_IMAGE_PIPELINE
+    global IMAGE_TO_IMAGE_PIPELINE, _MODEL_SCHEDULER
     try:
         logger.info("Unload image captioner")
+        _SCHEDULER_CACHE.clear()
+        _MODEL_SCHEDULER = None
         if IMAGE_TO_IMAGE_PIPELINE!= None:
             del IMAGE_TO_IMAGE_PIPELINE
             IMAGE_TO_IMAGE_PIPELINE = None
@@ -169,8 +176,258 @@ def change_text2img_model(model):
         raise (f"Loading new img2img model '{model}' failed", e)
 
 
-def generate_image(image: Image, prompt: str, negative_prompt: str = "", strength: float = 0.5, steps: int = 60):
-    """Convert the entire input image to the selected style."""
+# supported schedulers (samplers) as name: (diffusers class, additional config)
+SCHEDULERS = {
+    "ddim": ("DDIMScheduler", {}),
+    "pndm": ("PNDMScheduler", {}),
+    "lms": ("LMSDiscreteScheduler", {}),
+    "euler": ("EulerDiscreteScheduler", {}),
+    "euler_a": ("EulerAncestralDiscreteScheduler", {}),
+    "dpm++2m": ("DPMSolverMultistepScheduler", {}),
+    "dpm++2m_karras": ("DPMSolverMultistepScheduler", {"use_karras_sigmas": True}),
+    "dpm++2m_sde": ("DPMSolverMultistepScheduler", {"algorithm_type": "sde-dpmsolver++"}),
+    "unipc": ("UniPCMultistepScheduler", {}),
+}
+# schedulers are created once per loaded model and reused
+_SCHEDULER_CACHE = {}
+# the scheduler which was shipped with the model
+_MODEL_SCHEDULER = None
+
+
+def _set_scheduler(model, name: str):
+    """Switch the pipeline to the given scheduler, an empty name restores the scheduler of the model."""
+    global _MODEL_SCHEDULER
+    if not name and _MODEL_SCHEDULER is None:
+        # scheduler was never changed
+        return
+    if _MODEL_SCHEDULER is None:
+        _MODEL_SCHEDULER = model.scheduler
+    if not name:
+        model.scheduler = _MODEL_SCHEDULER
+        return
+    if name not in SCHEDULERS:
+        logger.warning("Unknown scheduler '%s', using scheduler of the model", name)
+        model.scheduler = _MODEL_SCHEDULER
+        return
+    if name not in _SCHEDULER_CACHE:
+        import diffusers
+        class_name, scheduler_config = SCHEDULERS[name]
+        scheduler_class = getattr(diffusers, class_name)
+        _SCHEDULER_CACHE[name] = scheduler_class.from_config(_MODEL_SCHEDULER.config, **scheduler_config)
+        logger.debug("Created scheduler %s (%s)", name, class_name)
+    model.scheduler = _SCHEDULER_CACHE[name]
+
+
+def _get_generator(seed: int = None):
+    """Get a torch generator for reproducible results or None for random results."""
+    if seed is None: return None
+    return torch.Generator(device=device).manual_seed(seed)
+
+
+class GenerationCancelled(Exception):
+    """Raised if a generation was cancelled with its cancel event (e.g. background jobs)."""
+
+
+def _cancel_arguments(cancel_event) -> dict:
+    """Pipeline arguments to stop the denoising loop as soon as the cancel event is set."""
+    if cancel_event is None: return {}
+    def callback(pipe, step, timestep, callback_kwargs):
+        if cancel_event.is_set():
+            pipe._interrupt = True
+        return callback_kwargs
+    return {"callback_on_step_end": callback}
+
+
+def _resize_to_bucket(image: Image, max_size: int) -> Image:
+    """Shrink the image to max_size and snap both sides to multiples of 8 as required by the VAE."""
+    image = image.copy()
+    image.thumbnail((max_size, max_size))
+    width = max(8, image.width - image.width % 8)
+    height = max(8, image.height - image.height % 8)
+    if (width, height) != image.size:
+        image = image.resize((width, height))
+    return image
+
+
+def encode_image(model, image: Image):
+    """Encode the image once with the VAE of the given pipeline, so that the latents can be reused."""
+    with torch.no_grad():
+        tensor = model.image_processor.preprocess(image).to(device=device, dtype=model.vae.dtype)
+        latents = model.vae.encode(tensor).latent_dist.sample()
+        return latents * model.vae.config.scaling_factor
+
+
+def _compute_tile_boxes(width: int, height: int, tile_size: int, overlap: int) -> list:
+    """Split an image into overlapping tiles which cover the whole image.
+
+    All tiles have the same size (tile_size or the image size if it is smaller), the last tile
+    of each row and column is aligned to the image border.
+
+    Returns:
+        list of boxes (left, top, right, bottom)
+    """
+    def positions(length):
+        if length <= tile_size: return [0]
+        stride = max(8, tile_size - overlap)
+        count = math.ceil((length - tile_size) / stride) + 1
+        return sorted(set(min(i * stride, length - tile_size) for i in range(count)))
+
+    tile_width = min(tile_size, width)
+    tile_height = min(tile_size, height)
+    return [(left, top, left + tile_width, top + tile_height)
+            for top in positions(height)
+            for left in positions(width)]
+
+
+def _tile_weights(width: int, height: int, overlap: int) -> np.ndarray:
+    """Weights for blending a tile, fading out linearly to the tile border within the overlap."""
+    def ramp(length):
+        index = np.arange(length, dtype=np.float32)
+        fade = max(1, overlap) + 1
+        return np.minimum(1.0, np.minimum(index + 1, length - index) / fade)
+    return np.outer(ramp(height), ramp(width))
+
+
+def _blend_tiles(size: tuple, boxes: list, tiles: list, overlap: int) -> Image:
+    """Combine the rendered tiles into one image and blend the seams in the overlapping areas."""
+    width, height = size
+    result = np.zeros((height, width, 3), dtype=np.float32)
+    weight_sum = np.zeros((height, width, 1), dtype=np.float32)
+    for (left, top, right, bottom), tile in zip(boxes, tiles):
+        tile = tile.convert("RGB")
+        if tile.size != (right - left, bottom - top):
+            tile = tile.resize((right - left, bottom - top))
+        weights = _tile_weights(right - left, bottom - top, overlap)[..., None]
+        result[top:bottom, left:right] += np.asarray(tile, dtype=np.float32) * weights
+        weight_sum[top:bottom, left:right] += weights
+    result = result / np.maximum(weight_sum, 1e-6)
+    return Image.fromarray(np.clip(result + 0.5, 0, 255).astype(np.uint8))
+
+
+def _needs_tiling(image: Image) -> bool:
+    """Check if the image must be rendered in tiles to stay in the memory limit."""
+    if not config.GenAI_is_tiled_generation_enabled(): return False
+    tile_size = config.GenAI_get_tile_size()
+    return image.width > tile_size or image.height > tile_size
+
+
+def _encode_prompt(model, prompt: str, negative_prompt: str, batch_size: int) -> dict:
+    """Encode the prompt once and return the embeddings as arguments for a pipeline call of batch_size images."""
+    with torch.no_grad():
+        if hasattr(model, "text_encoder_2"):
+            # SDXL has two text encoders and additional pooled embeddings
+            prompt_embeds, negative_embeds, pooled_embeds, negative_pooled_embeds = model.encode_prompt(
+                prompt=prompt, device=device, num_images_per_prompt=1,
+                do_classifier_free_guidance=True, negative_prompt=negative_prompt)
+            return {
+                "prompt_embeds": prompt_embeds.repeat(batch_size, 1, 1),
+                "negative_prompt_embeds": negative_embeds.repeat(batch_size, 1, 1),
+                "pooled_prompt_embeds": pooled_embeds.repeat(batch_size, 1),
+                "negative_pooled_prompt_embeds": negative_pooled_embeds.repeat(batch_size, 1),
+            }
+        prompt_embeds, negative_embeds = model.encode_prompt(
+            prompt=prompt, device=device, num_images_per_prompt=1,
+            do_classifier_free_guidance=True, negative_prompt=negative_prompt)
+        return {
+            "prompt_embeds": prompt_embeds.repeat(batch_size, 1, 1),
+            "negative_prompt_embeds": negative_embeds.repeat(batch_size, 1, 1),
+        }
+
+
+def _generate_tiled(model, image: Image, prompt: str, negative_prompt: str, strength: float, steps: int, generator=None, cancel_event=None) -> Image:
+    """Render a big image tile by tile with shared prompt embeddings and blend the seams."""
+    tile_size = config.GenAI_get_tile_size()
+    overlap = config.GenAI_get_tile_overlap()
+    batch_size = config.GenAI_get_tile_batch_size()
+    boxes = _compute_tile_boxes(image.width, image.height, tile_size, overlap)
+    logger.debug("Tiled generation of %dx%d image with %d tiles", image.width, image.height, len(boxes))
+
+    embeddings = {}
+    tiles = []
+    for i in range(0, len(boxes), batch_size):
+        batch = boxes[i:i + batch_size]
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled()
+        # the last batch can be smaller
+        if len(batch) not in embeddings:
+            embeddings[len(batch)] = _encode_prompt(model, prompt, negative_prompt, len(batch))
+        result = model(
+            image=[image.crop(box) for box in batch],
+            num_inference_steps=steps,
+            strength=strength,
+            generator=generator,
+            **embeddings[len(batch)],
+            **_cancel_arguments(cancel_event),
+        )
+        tiles.extend(result.images)
+    return _blend_tiles(image.size, boxes, tiles, overlap)
+
+
+def generate_images_for_styles(image: Image, styles: list, batch_size: int = 4):
+    """Render one image in several styles with a shared resize and VAE encoding.
+
+    Args:
+        image: the source image
+        styles: list of dictionaries with name, prompt, negative_prompt, strength, steps and scheduler
+        batch_size: maximum number of styles rendered in one pipeline call
+
+    Yields:
+        (name, image) tuples as soon as the batch containing the style is finished
+    """
+    try:
+        if image is None:
+            raise Exception("no image provided")
+
+        logger.debug("Starting AI.generate_images_for_styles for %d styles", len(styles))
+        model = _load_img2img_model()
+
+        if (not config.SKIP_AI and model == None):
+            logger.error("No model loaded")
+            raise Exception("No model loaded. Generation not available")
+
+        image = _resize_to_bucket(image, config.get_max_size())
+        if _needs_tiling(image):
+            # big images are rendered tile by tile, so batching of styles is not possible
+            for style in styles:
+                _set_scheduler(model, style.get("scheduler", ""))
+                yield style["name"], _generate_tiled(model, image, style["prompt"], style["negative_prompt"], style["strength"], style["steps"])
+            return
+        latents = encode_image(model, image)
+
+        # styles with the same scheduler, steps and strength share the same timesteps and can be batched
+        groups = {}
+        for style in styles:
+            groups.setdefault((style.get("scheduler", ""), style["steps"], style["strength"]), []).append(style)
+
+        for (scheduler, steps, strength), group in groups.items():
+            _set_scheduler(model, scheduler)
+            for i in range(0, len(group), max(1, batch_size)):
+                batch = group[i:i + max(1, batch_size)]
+                logger.debug("Rendering %s with strength: %f, steps: %d, scheduler: %s", [s["name"] for s in batch], strength, steps, scheduler)
+                result = model(
+                    prompt=[s["prompt"] for s in batch],
+                    negative_prompt=[s["negative_prompt"] for s in batch],
+                    num_inference_steps=steps,
+                    image=latents,
+                    strength=strength,
+                )
+                for style, result_image in zip(batch, result.images):
+                    yield style["name"], result_image
+
+    except RuntimeError as e:
+        logger.error("RuntimeError: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        _cleanup_img2img_pipeline()
+        raise Exception("Error while creating the images. More details in log.")
+
+
+def generate_image(image: Image, prompt: str, negative_prompt: str = "", strength: float = 0.5, steps: int = 60, scheduler: str = "", seed: int = None, cancel_event=None):
+    """Convert the entire input image to the selected style.
+
+    scheduler: name of the scheduler (see SCHEDULERS), empty to use the scheduler of the model
+    seed: fixed seed for reproducible results (e.g. benchmarks), None for random results
+    cancel_event: optional threading.Event, if it is set the generation stops and raises GenerationCancelled
+    """
     try:
         if image is None:
             raise Exception("no image provided")
@@ -185,23 +442,34 @@ def generate_image(image: Image, prompt: str, negative_prompt: str = "", strengt
             raise Exception(message="No model loaded. Generation not available")
 
         max_size = config.get_max_size()
-        image.thumbnail((max_size, max_size))
+        # the image of the caller is not changed, it is still used to identify the upload
+        if max(image.size) > max_size:
+            image = image.copy()
+            image.thumbnail((max_size, max_size))
 
         # create a mask which covers the whole image
         mask = Image.new("L", image.size, 255)
 
-        logger.debug("Strength: %f, Steps: %d", strength, steps)
-
-        # Generate new picture
-        result_image = model(
-            prompt=prompt,
-            negative_prompt=negative_prompt,
-            num_inference_steps=steps,
-            image=image,
-            mask_image=mask,
-            strength=strength,
-        ).images[0]
+        logger.debug("Strength: %f, Steps: %d, Scheduler: %s", strength, steps, scheduler)
+        _set_scheduler(model, scheduler)
 
+        if _needs_tiling(image):
+            result_image = _generate_tiled(model, _resize_to_bucket(image, max_size), prompt, negative_prompt, strength, steps, _get_generator(seed), cancel_event)
+        else:
+            # Generate new picture
+            result_image = model(
+                prompt=prompt,
+                negative_prompt=negative_prompt,
+                num_inference_steps=steps,
+                image=image,
+                mask_image=mask,
+                strength=strength,
+                generator=_get_generator(seed),
+                **_cancel_arguments(cancel_event),
+            ).images[0]
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise GenerationCancelled()
         return result_image
 
     except RuntimeError as e:
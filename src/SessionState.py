@@ -21,10 +21,14 @@ class SessionState:
             raise TypeError(f"session must be of type str, but {type(value).__name__} was assigned.")
         return value
 
-    def __init__(self, token: int=0, session: str=None):
+    def __init__(self, token: int=0, session: str=None, image_id: Optional[str]=None, mobile: bool=False):
         """State object for storing application data in browser."""
         self.token: int = token        
         self.session: str = str(uuid.uuid4()) if session==None else session
+        # handle of the current upload in the image store (the image hash)
+        self.image_id: Optional[str] = image_id
+        # client class by the user agent, selects the result size of the automatic resolution
+        self.mobile: bool = mobile
 
     def __str__(self) -> str:
         """String representation for logging."""
@@ -45,7 +49,9 @@ class SessionState:
         """Convert SessionState to dictionary for serialization."""
         return {
             'token': self.token,
-            'session': str(self.session)
+            'session': str(self.session),
+            'image_id': self.image_id,
+            'mobile': self.mobile
         }
 
     @classmethod
@@ -55,7 +61,9 @@ class SessionState:
             return cls()
         return cls(
             token=data.get('token', 0),
-            session=data.get('session', str(uuid.uuid4()))
+            session=data.get('session', str(uuid.uuid4())),
+            image_id=data.get('image_id'),
+            mobile=bool(data.get('mobile', False))
         )
 
     @classmethod
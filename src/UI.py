@@ -1,46 +1,139 @@
 import os
 import PIL
 import gradio as gr
-from hashlib import sha1
 import time # for sleep in SKIP_AI
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed
 from datetime import datetime, timedelta
 import logging
+import uuid
+from gradio.utils import get_upload_folder
 
 import src.config as config
 import src.utils as utils
 import src.analytics as analytics
 import src.AI as AI
 from src.SessionState import SessionState
+from src.background import BackgroundGenerator, PRIORITY_SPECULATIVE
+import src.precompute as precompute
+import src.face_cache as face_cache
+import src.token_ledger as token_ledger
+import src.token_lock as token_lock
+import src.postprocess as postprocess
+import src.ingest as ingest
+import src.image_store as image_store
+import src.content_store as content_store
 
 # Set up module logger
 logger = logging.getLogger(__name__)
 
-if config.SKIP_ONNX or not config.is_feature_generation_with_token_enabled():
+# results are only cached if the faces are really analyzed
+FACE_ANALYSIS_ENABLED = not config.SKIP_ONNX and config.is_feature_generation_with_token_enabled()
+if not FACE_ANALYSIS_ENABLED:
     def analyze_faces(pil_image: any):
         """ without onnx we cant detect and analyze faces"""
         return []
+    def warm_up_face_analysis():
+        """ nothing to load without onnx"""
+        pass
 else:
     logger.info("Activating ONNX functions")
-    from src.onnx_analyzer import FaceAnalyzer
-    _face_analyzer = None
+    from src.onnx_analyzer import FaceAnalyzerPool
+    # uploads run concurrently, each analyzer is used by one upload at a time
+    _face_analyzer_pool = FaceAnalyzerPool(
+        size=config.FaceAnalysis_get_pool_size(),
+        intra_op_threads=config.FaceAnalysis_get_intra_op_threads(),
+        inter_op_threads=config.FaceAnalysis_get_inter_op_threads())
     def analyze_faces(pil_image):
-        global _face_analyzer
-        if _face_analyzer == None: _face_analyzer = FaceAnalyzer()
-        return _face_analyzer.get_gender_and_age_from_image(pil_image)
+        with _face_analyzer_pool.analyzer() as face_analyzer:
+            # a failed analysis must not be cached as "no faces"
+            return face_analyzer.get_gender_and_age_from_image(pil_image, raise_errors=True)
+    def warm_up_face_analysis():
+        """ loads the first analyzer before the server accepts uploads"""
+        _face_analyzer_pool.warm_up()
+
+# captioning and face analysis of an upload run in parallel, the upload is stored after the response
+_upload_executor = ThreadPoolExecutor(max_workers=config.UI_get_upload_analysis_workers(), thread_name_prefix="upload")
+_upload_store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="upload-store")
+_upload_store_futures = set()
+_upload_store_lock = threading.Lock()
+
+def _timed_stage(stage_seconds: dict, stage: str, fn, *args):
+    """Runs one stage of the upload handling and records its duration."""
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        stage_seconds[stage] = time.perf_counter() - start
+
+def _run_store_task(fn, *args, **kwargs):
+    try:
+        fn(*args, **kwargs)
+    except Exception as e:
+        logger.error("Error while storing upload: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+
+def submit_store_task(fn, *args, **kwargs):
+    """Runs fn after the response in the store thread, errors are logged."""
+    future = _upload_store_executor.submit(_run_store_task, fn, *args, **kwargs)
+    with _upload_store_lock:
+        _upload_store_futures.add(future)
+    future.add_done_callback(_discard_store_future)
+
+def _discard_store_future(future):
+    with _upload_store_lock:
+        _upload_store_futures.discard(future)
+
+def flush_background_tasks(timeout: float = None) -> bool:
+    """Waits until all uploads and generation results are written, returns False on timeout."""
+    start = time.monotonic()
+    with _upload_store_lock:
+        futures = list(_upload_store_futures)
+    if len(wait(futures, timeout=timeout).not_done) > 0: return False
+    return postprocess.flush(None if timeout is None else max(0, timeout - (time.monotonic() - start)))
+
+def _get_input_cache_folder():
+    """Returns the root of the content store for uploads, None if the input cache is disabled."""
+    if not config.is_input_cache_enabled(): return None
+    return config.get_output_folder()
+
+def _store_upload(image, image_sha1: str, store_root: str, save_details, details: dict):
+    """Saves the upload in the content store below store_root and its details with save_details (analytics), both optional."""
+    start = time.perf_counter()
+    cache_path = None
+    if store_root is not None:
+        cache_path = content_store.put_image(image, image_sha1, root=store_root)
+    if save_details is not None:
+        save_details(
+            sha1=image_sha1,
+            cache_path_and_filename=cache_path or "",
+            **details)
+    logger.debug("UPLOAD ID %s stored in %.3fs", image_sha1, time.perf_counter() - start)
 
 # used to get properties of the selected style liek prompt or strangth
 # will be filled while interface is loading
 style_details = {}
 
+# low priority generations which run while no user generation is active
+SPECULATIVE_GENERATION = config.GenAI_is_speculative_generation_enabled()
+IDLE_PRECOMPUTE = config.GenAI_is_idle_precompute_enabled()
+# precomputed results must fit beside the speculative results, otherwise they replace each other
+background_generator = BackgroundGenerator(max_results=20 + (config.GenAI_get_precompute_top_n() * config.get_style_count() if IDLE_PRECOMPUTE else 0))
+
 
 def action_session_initialized(request: gr.Request, session_state: SessionState):
-    """Initialize analytics session when app loads.
+    """Initialize analytics session and the client class of the session when app loads.
     
     Args:
         request (gr.Request): The Gradio request object containing client information
         state_dict (dict): The current application state dictionary
     """
     logger.info("Session - %s - initialized with %i token for: %s",session_state.session, session_state.token, request.client.host)
+    # the client class selects the automatic resolution of the results
+    try:
+        session_state.mobile = analytics.get_client_details(request.headers["user-agent"])["IsMobile"] == 1
+    except Exception as e:
+        logger.debug("Client class of session %s unknown: %s", session_state.session, str(e))
     if config.is_analytics_enabled() and request:
         try:
             analytics.save_session(
@@ -57,34 +150,57 @@ def action_update_all_local_models():
     """updates the list of available models in the ui"""
     return gr.update(choices=utils.get_all_local_models(config.get_model_folder()))
 
-session_image_hashes = {}
-def action_handle_input_file(request: gr.Request, image: PIL.Image, gradio_state: str):
-    """Analyze the Image, Handle Session Info, Save the input image in a cache if enabled, count token."""
-    global session_image_hashes
+def action_handle_input_file(request: gr.Request, image, gradio_state: str):
+    """Analyze the Image, Handle Session Info, Save the input image in a cache if enabled, count token.
+
+    image is the path of the upload (or a decoded image for API usage), it is decoded once
+    in the size needed by the consumers, see ingest.
+    The response is streamed: the credits for a new image enable the start button at once,
+    the face bonuses and the caption follow as soon as they are computed.
+    """
     session_state = SessionState.from_gradio_state(gradio_state)
+    session_state.image_id = None
     # deactivate the start button on error
     if image is None: 
-        return wrap_handle_input_response(session_state, False, "")
+        yield wrap_handle_input_response(session_state, False, "")
+        return
     # API Users don't have a request (by documentation)
     if not request: 
-        return wrap_handle_input_response(session_state, False, "")
+        yield wrap_handle_input_response(session_state, False, "")
+        return
+    # a generation can run while the bonuses are streamed, both change the credits by the ledger
+    if config.is_feature_generation_with_token_enabled(): token_ledger.sync(session_state)
+
+    # a new upload makes the speculative generation of the previous image useless
+    if SPECULATIVE_GENERATION: background_generator.cancel_owner(session_state.session)
 
-    input_file_path = ""
-    image_sha1 = sha1(image.tobytes()).hexdigest()
-    if config.is_input_cache_enabled():
-        dir = config.get_output_folder()
-        dir = os.path.join(dir, datetime.now().strftime("%Y%m%d"))
-        input_file_path = utils.save_image_as_file(image, dir)
+    # caption and face analysis run in parallel, so the upload takes as long as the slowest stage
+    stage_seconds = {}
+    start = time.perf_counter()
+    try:
+        image = _timed_stage(stage_seconds, "decode", ingest.open_image, image)
+    except (ValueError, PIL.Image.DecompressionBombError) as e:
+        # the browser reduces the image before the upload, so only API clients and old browsers get here
+        logger.warning("UPLOAD from %s rejected: %s", session_state.session, str(e))
+        gr.Warning(str(e))
+        yield wrap_handle_input_response(session_state, False, "")
+        return
+    variants = _timed_stage(stage_seconds, "variants", ingest.create_variants, image)
+    image_sha1 = _timed_stage(stage_seconds, "hash", utils.compute_image_hash, image)
+    # generations get the image from the store by the handle in the session state
+    image_store.put(image_sha1, image)
+    submit_store_task(image_store.save_to_disk, image_sha1, image)
+    session_state.image_id = image_sha1
 
     logger.info(f"UPLOAD from {session_state.session} with ID: {image_sha1}")
 
+    # popular images are already described by the idle precomputation, the same description
+    # is required to use the precomputed results
     image_description = ""
-    try:
-        image_description = action_describe_image(image)
-    except Exception as e:
-        logger.error("Error creating image description: %s", str(e))
-        #logger.debug("Exception details:", exc_info=True)
-        gr.Warning("Could not create a proper image description. Please describe your image shortly for better results.")
+    if IDLE_PRECOMPUTE: image_description = precompute.get_description(image_sha1)
+    caption_future = None
+    if image_description == "":
+        caption_future = _upload_executor.submit(_timed_stage, stage_seconds, "caption", action_describe_image, variants["caption"])
 
     # variables used for analytics if enabled
     face_detected = False
@@ -97,124 +213,300 @@ def action_handle_input_file(request: gr.Request, image: PIL.Image, gradio_state
     #check that the image was not already used in this session
     analyze_input_image_details = True
     if config.is_feature_generation_with_token_enabled():
+        # locks the image if it is new, so only one of parallel uploads of the image gets credits
         min_age, max_age, gender, face_detected, analyze_input_image_details = check_same_upload_in_block_time(image_sha1)
+    else:
+        lock_image_hash(image_sha1, gender, min_age, max_age, face_detected)
 
+    faces_future = None
     if analyze_input_image_details:
-        detected_faces = []
-        try:
-            detected_faces = analyze_faces(image)
-        except Exception as e:
-            logger.error("Error while analyzing face: %s", str(e))
-            logger.debug("Exception details:", exc_info=True)
-        
+        # the credits for a new image do not depend on the analysis, the face details are added to the lock after the analysis
         new_token = config.get_token_for_new_image()
-        if len(detected_faces)>0:
-            face_detected = True
-            #we have minimum one face
-            logger.debug("Bonus: face")
-            face_bonus = config.get_token_bonus_for_face()
-            if face_bonus>0: 
-                new_token += face_bonus
-                gr.Info(f"{face_bonus} Bonus credits added for an Image with a Face!")
-
-            # we have that bonus in a variable as we want to give it only once
-            token_for_cuteness = config.get_token_bonus_for_cuteness()
-            token_for_smiling = config.get_token_bonus_for_smile() 
-            gender = 0 #{0: "unkown", 1: "male", 2: "female", 3: "female + male"}
-            for face in detected_faces:
-                #just save the jungest and oldest if we have multiple faces
-                min_age = face["minAge"] if face["minAge"]<min_age or min_age == 0 else min_age
-                max_age = face["maxAge"] if face["maxAge"]>max_age or max_age == 0 else max_age
-                if face["isFemale"]: 
-                    gender |= 2
-                    # until we can recognize smiles we give bonus for other properties
-                    if token_for_smiling>0:
-                        logger.debug("Bonus: smiling")
-                        new_token+=token_for_smiling
-                        gr.Info(f"{token_for_smiling} special Bonus credits added!")
-                        token_for_smiling = 0 #apply only once per image
-                elif face["isMale"]:
-                    gender |= 1
-
-                if token_for_cuteness>0 and (face["maxAge"]<20 or face["minAge"]>60):
-                    logger.debug("Bonus: cuteness")
-                    new_token+=token_for_cuteness
-                    gr.Info(f"{token_for_cuteness} special Bonus credits added!")
-                    token_for_cuteness = 0 #allow bonus only once per upload
-
-        # save the hash to prevent reuse
-        session_image_hashes[image_sha1]={
-            "dt": datetime.now()+timedelta(minutes=config.get_token_time_lock_for_new_image()),
-            "gender": gender,
+        _add_token(session_state, new_token)
+
+        # the same image could be analyzed before the lock expired or before a restart
+        detected_faces = face_cache.get_faces(image_sha1) if FACE_ANALYSIS_ENABLED else None
+        if detected_faces is None:
+            faces_future = _upload_executor.submit(_timed_stage, stage_seconds, "faces", analyze_faces, variants["faces"])
+        else:
+            logger.debug("Faces of %s found in face cache", image_sha1)
+            bonus, face_detected, min_age, max_age, gender = get_face_bonus(detected_faces or [])
+            new_token += bonus
+            _add_token(session_state, bonus)
+            lock_image_hash(image_sha1, gender, min_age, max_age, face_detected)
+            if config.is_feature_generation_with_token_enabled() and new_token>0:
+                gr.Info(f"Total new Credits: {new_token}")
+
+    yield wrap_handle_input_response(session_state, _is_start_enabled(session_state), image_description)
+
+    for future in as_completed([f for f in (caption_future, faces_future) if f is not None]):
+        if future is faces_future:
+            detected_faces = []
+            try:
+                detected_faces = future.result()
+                # only a successful analysis is cached, a failed one is repeated with the next upload
+                if FACE_ANALYSIS_ENABLED and detected_faces is not None: submit_store_task(face_cache.save_faces, image_sha1, detected_faces)
+            except Exception as e:
+                logger.error("Error while analyzing face: %s", str(e))
+                logger.debug("Exception details:", exc_info=True)
+            bonus, face_detected, min_age, max_age, gender = get_face_bonus(detected_faces or [])
+            new_token += bonus
+            _add_token(session_state, bonus)
+            lock_image_hash(image_sha1, gender, min_age, max_age, face_detected)
+            if config.is_feature_generation_with_token_enabled() and new_token>0:
+                gr.Info(f"Total new Credits: {new_token}")
+        else:
+            try:
+                image_description = future.result()
+            except Exception as e:
+                logger.error("Error creating image description: %s", str(e))
+                #logger.debug("Exception details:", exc_info=True)
+                gr.Warning("Could not create a proper image description. Please describe your image shortly for better results.")
+        yield wrap_handle_input_response(session_state, _is_start_enabled(session_state), image_description)
+
+    logger.info(f"UPLOAD ID {image_sha1} received {new_token} credits total.")
+
+    # the input cache and analytics are not needed for the response
+    store_root = _get_input_cache_folder()
+    save_details = analytics.save_input_image_details if config.is_analytics_enabled() else None
+    if store_root is not None or save_details is not None:
+        submit_store_task(_store_upload, image, image_sha1, store_root, save_details, {
+            "session": session_state.session,
+            "token": new_token,
+            "face_detected": face_detected,
             "min_age": min_age,
             "max_age": max_age,
-            "face_detected": face_detected
-        }
+            "gender": gender
+            })
+    logger.info("UPLOAD ID %s analyzed in %.2fs (%s)", image_sha1, time.perf_counter() - start,
+                ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stage_seconds.items()))
+
+    if SPECULATIVE_GENERATION and _is_start_enabled(session_state):
+        try:
+            speculate_default_style(session_state.session, variants["generation"], image_sha1, image_description,
+                                    get_tier_max_size(get_resolution_tier(session_state)))
+        except Exception as e:
+            logger.error("Error while starting speculative generation: %s", str(e))
+            logger.debug("Exception details:", exc_info=True)
 
-    if config.is_feature_generation_with_token_enabled() and new_token>0:
-        gr.Info(f"Total new Credits: {new_token}")
+def get_face_bonus(detected_faces: list):
+    """Calculates the bonus credits for the detected faces.
 
-    logger.info(f"UPLOAD ID {image_sha1} received {new_token} credits total.")
-    session_state.token += new_token
-
-    if config.is_analytics_enabled():
-        analytics.save_input_image_details(
-            session=session_state.session, 
-            sha1=image_sha1, 
-            token=new_token,
-            cache_path_and_filename=os.path.relpath(input_file_path, config.get_output_folder()), 
-            face_detected=face_detected,
-            min_age=min_age,
-            max_age=max_age,
-            gender=gender
-            )    
-
-    start_enabled = True if not config.is_feature_generation_with_token_enabled() else bool(session_state.token>0)
-    return wrap_handle_input_response(session_state, start_enabled, image_description)
+    Returns:
+        tuple: bonus, face_detected, min_age, max_age, gender
+    """
+    bonus = 0
+    min_age = 0
+    max_age = 0
+    gender = 0 #{0: "unkown", 1: "male", 2: "female", 3: "female + male"}
+    if len(detected_faces) == 0: return bonus, False, min_age, max_age, gender
+
+    #we have minimum one face
+    logger.debug("Bonus: face")
+    face_bonus = config.get_token_bonus_for_face()
+    if face_bonus>0: 
+        bonus += face_bonus
+        gr.Info(f"{face_bonus} Bonus credits added for an Image with a Face!")
+
+    # we have that bonus in a variable as we want to give it only once
+    token_for_cuteness = config.get_token_bonus_for_cuteness()
+    token_for_smiling = config.get_token_bonus_for_smile() 
+    for face in detected_faces:
+        #just save the jungest and oldest if we have multiple faces
+        min_age = face["minAge"] if face["minAge"]<min_age or min_age == 0 else min_age
+        max_age = face["maxAge"] if face["maxAge"]>max_age or max_age == 0 else max_age
+        if face["isFemale"]: 
+            gender |= 2
+            # until we can recognize smiles we give bonus for other properties
+            if token_for_smiling>0:
+                logger.debug("Bonus: smiling")
+                bonus+=token_for_smiling
+                gr.Info(f"{token_for_smiling} special Bonus credits added!")
+                token_for_smiling = 0 #apply only once per image
+        elif face["isMale"]:
+            gender |= 1
+
+        if token_for_cuteness>0 and (face["maxAge"]<20 or face["minAge"]>60):
+            logger.debug("Bonus: cuteness")
+            bonus+=token_for_cuteness
+            gr.Info(f"{token_for_cuteness} special Bonus credits added!")
+            token_for_cuteness = 0 #allow bonus only once per upload
+    return bonus, True, min_age, max_age, gender
+
+def lock_image_hash(image_sha1: str, gender: int, min_age: int, max_age: int, face_detected: bool):
+    """Locks the image for new credits for the configured time."""
+    token_lock.lock(image_sha1,
+        datetime.now()+timedelta(minutes=config.get_token_time_lock_for_new_image()),
+        gender=gender,
+        min_age=min_age,
+        max_age=max_age,
+        face_detected=face_detected)
+
+def _add_token(session_state: SessionState, amount: int):
+    """Changes the credits of the session, by the ledger if credits are enabled."""
+    if config.is_feature_generation_with_token_enabled():
+        token_ledger.add(session_state, amount)
+    else:
+        session_state.token += amount
+
+def _try_spend_token(session_state: SessionState, amount: int = 1) -> bool:
+    """Spends credits before a generation, returns False if the balance is not sufficient.
+
+    The check and the spending are one step of the ledger, so parallel generations (even on
+    other instances with a shared state backend) can not use the same credit.
+    """
+    if config.is_feature_generation_with_token_enabled():
+        return token_ledger.try_spend(session_state, amount)
+    session_state.token -= amount
+    return True
+
+def _is_start_enabled(session_state: SessionState) -> bool:
+    return True if not config.is_feature_generation_with_token_enabled() else bool(session_state.token>0)
+
+def action_reset_upload(gradio_state):
+    """Removes the handle of the former upload and disables the start button until the new upload is stored."""
+    session_state = SessionState.from_gradio_state(gradio_state)
+    session_state.image_id = None
+    return gr.update(interactive=False), session_state
+
+def resolve_upload(session_state: SessionState, image):
+    """Returns the canonical image of the current upload and its hash.
+
+    The image is taken from the image store by the handle of the session, the given image
+    (path or decoded image) is only decoded if the store does not have it (anymore).
+    """
+    stored = image_store.get(session_state.image_id) if session_state.image_id else None
+    if stored is not None: return stored, session_state.image_id
+    logger.debug("Upload %s not in image store, decoding the input", session_state.image_id)
+    image = ingest.open_image(image)
+    image_sha1 = utils.compute_image_hash(image)
+    image_store.put(image_sha1, image)
+    session_state.image_id = image_sha1
+    return image, image_sha1
 
 def check_same_upload_in_block_time(image_sha1):
-    """check if the same file is uploaded from same user again to gain token"""
+    """check if the same file is uploaded from same user again to gain token, a new file is locked in the same step"""
     analyzation_required = True
     face_detected = False
     min_age = 0
     max_age = 0
     gender = 0
-    if image_sha1 in session_image_hashes.keys():
-        # check if the image is locked
-        last_upload = session_image_hashes[image_sha1]
+    # expired locks are removed by the lock store
+    last_upload = token_lock.try_lock(image_sha1,
+        datetime.now()+timedelta(minutes=config.get_token_time_lock_for_new_image()),
+        gender=gender,
+        min_age=min_age,
+        max_age=max_age,
+        face_detected=face_detected)
+    if last_upload is not None:
         dt = last_upload["dt"]
-        if dt>datetime.now():
-            analyzation_required = False
-            if config.is_feature_generation_with_token_enabled():
-                gr.Warning(
-                    f"""This image signature was already used to gain credits.
-                    New credits for it will be provided after {dt.strftime("%d.%m.%Y - %H:%M")}""")
-            gender=last_upload["gender"]
-            min_age=last_upload["min_age"]
-            max_age=last_upload["max_age"]
-            face_detected=last_upload["face_detected"]
-        else:
-            #remove current entry as it is outdated
-            del session_image_hashes[image_sha1]
-
-    #cleanup the whole list of locked images to not waste memory
-    try:
-        keys_to_remove = [key for key, dt in session_image_hashes.items() if dt < datetime.now()]
-        for key in keys_to_remove:
-            del session_image_hashes[key]
-        if len(keys_to_remove)>0:
-            logger.info(f"Removed token lock for {len(keys_to_remove)} image(s)")
-    except:
-        pass
+        analyzation_required = False
+        if config.is_feature_generation_with_token_enabled():
+            gr.Warning(
+                f"""This image signature was already used to gain credits.
+                New credits for it will be provided after {dt.strftime("%d.%m.%Y - %H:%M")}""")
+        gender=last_upload["gender"]
+        min_age=last_upload["min_age"]
+        max_age=last_upload["max_age"]
+        face_detected=last_upload["face_detected"]
     return min_age, max_age, gender, face_detected, analyzation_required
 
+def _generation_key(image_sha1: str, style: str, strength: float, steps: int, image_description: str, max_size: int = None):
+    """Key of a generation, generations with the same key are interchangeable."""
+    return (image_sha1, style, round(float(strength), 2), int(steps), str(image_description), max_size)
+
+# resolution tiers of the results, auto selects the tier by the client class of the session
+RESOLUTION_AUTO = "auto"
+RESOLUTION_REDUCED = "reduced"
+RESOLUTION_FULL = "full"
+
+_resolution_lock = threading.Lock()
+_resolution_stats = {}  # tier: generations, generated pixels and pixels of the full resolution
+# the saved compute per tier is logged after this number of generations
+RESOLUTION_LOG_INTERVAL = 20
+
+def get_resolution_tier(session_state: SessionState, resolution: str = RESOLUTION_AUTO) -> str:
+    """Returns the tier of a generation, the choice of the user or by the client class for auto."""
+    if resolution in (RESOLUTION_REDUCED, RESOLUTION_FULL): return resolution
+    return RESOLUTION_REDUCED if session_state.mobile else RESOLUTION_FULL
+
+def get_tier_max_size(tier: str):
+    """Returns the maximum dimension of the generations of a tier, None for the full resolution (max_size)."""
+    if tier != RESOLUTION_REDUCED: return None
+    reduced_max_size = config.GenAI_get_reduced_max_size()
+    return reduced_max_size if reduced_max_size < config.get_max_size() else None
+
+def _record_resolution(tier: str, full_size: tuple, size: tuple):
+    """Counts a generation of the tier with its size and the size it would have in full resolution."""
+    with _resolution_lock:
+        stats = _resolution_stats.setdefault(tier, {"generations": 0, "pixels": 0, "full_pixels": 0})
+        stats["generations"] += 1
+        stats["pixels"] += size[0] * size[1]
+        stats["full_pixels"] += full_size[0] * full_size[1]
+        generations = sum(tier_stats["generations"] for tier_stats in _resolution_stats.values())
+    if generations % RESOLUTION_LOG_INTERVAL == 0:
+        _log_resolution_stats()
+
+def _log_resolution_stats():
+    for tier, stats in sorted(get_resolution_stats().items()):
+        logger.info("Resolution %s: %i generations, %.1f MP saved (%.0f%% of the compute in full resolution)",
+                    tier, stats["generations"], stats["saved_megapixels"], stats["saved_percent"])
+
+def get_resolution_stats() -> dict:
+    """Returns the generations per tier and the compute saved compared to the full resolution.
+
+    The compute of a generation grows with its pixels, so saved_percent is the share of
+    pixels (and about the share of compute) not generated.
+    """
+    with _resolution_lock:
+        return {tier: dict(stats,
+                    saved_megapixels=(stats["full_pixels"] - stats["pixels"]) / 1000000,
+                    saved_percent=100 * (1 - stats["pixels"] / stats["full_pixels"]) if stats["full_pixels"] > 0 else 0.0)
+                for tier, stats in _resolution_stats.items()}
+
+def submit_style_generation(owner: str, image, image_sha1: str, image_description: str, style: str, priority: int = PRIORITY_SPECULATIVE, max_size: int = None) -> bool:
+    """Queue the generation of a style with the initial slider values in background, returns False if not queued.
+
+    max_size is the size of the resolution tier, None for the full resolution.
+    """
+    sd = style_details.get(style)
+    if sd == None: return False
+    # use the same values as the initial values of the sliders
+    strength = config.get_default_strength() if config.UI_show_strength_slider() else sd["strength"]
+    steps = config.get_default_steps() if config.UI_show_steps_slider() else sd["steps"]
+    prompt = str(sd["prompt"]).replace("{prompt}", str(image_description))
+    image = ingest.get_generation_image(image, max_size).copy()
+
+    def job(cancel_event):
+        if config.SKIP_AI:
+            if cancel_event.wait(5): return None
+            return utils.image_convert_to_sepia(image)
+        return AI.generate_image(
+            image=image,
+            prompt=prompt,
+            negative_prompt=sd["negative_prompt"],
+            steps=steps,
+            strength=strength,
+            scheduler=sd.get("scheduler", ""),
+            cancel_event=cancel_event)
+
+    key = _generation_key(image_sha1, style, strength, steps, image_description, max_size)
+    return background_generator.submit(key, job, owner=owner, priority=priority)
+
+def speculate_default_style(session: str, image, image_sha1: str, image_description: str, max_size: int = None):
+    """Start the generation of the default style in background, as most users keep the default style."""
+    if config.get_style_count() < 1: return
+    style = config.get_style_name(1)
+    if submit_style_generation(session, image, image_sha1, image_description, style, max_size=max_size):
+        logger.debug("Speculative generation of %s started for %s", style, session)
+
 def action_describe_image(image):
     """describe an image for better inpaint results."""
     if config.SKIP_AI: return "ai deactivated"
     # Fallback
     value = "please describe your image here"    
     try:
-        value = AI.describe_image(image)
+        value = AI.describe_image(ingest.open_image(image, ingest.CAPTION_SIZE))
         logger.debug("Image description: %s", value)
     except Exception:
         pass
@@ -229,14 +521,22 @@ def action_reload_model(model):
     except Exception as e:
         gr.Error(message=e.message)
 
-def action_generate_image(request: gr.Request, image, style, strength, steps, image_description, gradio_state):
-    """Convert the entire input image to the selected style."""
+def action_generate_image(request: gr.Request, image, style, strength, steps, image_description, gradio_state, resolution: str = RESOLUTION_AUTO):
+    """Convert the entire input image to the selected style.
+
+    The image of the upload is taken from the image store by the handle in the session state,
+    image is only decoded if the store does not have it anymore (or for API usage).
+    resolution selects the size of the result, see get_resolution_tier.
+    """
     global style_details
     session_state = SessionState.from_gradio_state(gradio_state)
     #setting token always to 10 if the feature is disabled saved a lot of "if feature enabled .." statements
     if session_state.token == None: session_state.token = 0 
     if not config.is_feature_generation_with_token_enabled(): session_state.token = 10
+    # bonuses of a streamed upload may not be in the browser yet
+    else: token_ledger.sync(session_state)
 
+    spent = False
     try:
         if config.is_feature_generation_with_token_enabled() and session_state.token<=0:
             gr.Warning("You have not enough credits to start a generation. Upload a new image to get new credits!", duration=0)
@@ -248,10 +548,15 @@ def action_generate_image(request: gr.Request, image, style, strength, steps, im
         if request is None: 
             logger.warning("No request object. API usage?")
             return wrap_generate_image_response(session_state, None)
+        if not _try_spend_token(session_state):
+            gr.Warning("You have not enough credits to start a generation. Upload a new image to get new credits!", duration=0)
+            return wrap_generate_image_response(session_state, image)
+        spent = True
+        image, image_sha1 = resolve_upload(session_state, image)
 
         strength = strength/100  # we use values 1 - 100 in UI instead of 0.1--1
         logger.debug("Starting image generation")
-        if image_description == None or image_description == "": image_description = AI.describe_image(image)
+        if image_description == None or image_description == "": image_description = AI.describe_image(ingest.shrink(image, ingest.CAPTION_SIZE))
 
         sd = style_details.get(style)
         if sd == None:
@@ -259,70 +564,223 @@ def action_generate_image(request: gr.Request, image, style, strength, steps, im
                 "prompt": "",
                 "negative_prompt": config.get_style_negative_prompt(99),#99 means you will get back the default overall negative prompt if style 99 does not exist
                 "strength": config.get_default_strength(),
-                "steps": config.get_default_steps()
+                "steps": config.get_default_steps(),
+                "scheduler": config.get_default_scheduler()
             }
             # add to gloabel list for caching
             style_details[style] = sd
 
         prompt = str(sd["prompt"]).replace("{prompt}", str(image_description))
         
-        logger.info(f"GENERATE - {session_state.session} - {style}: {image_description}")
+        tier = get_resolution_tier(session_state, resolution)
+        max_size = get_tier_max_size(tier)
+        logger.info(f"GENERATE - {session_state.session} - {style} ({tier}): {image_description}")
 
-        # must be before resizing, otherwise hash will not be same as from source image
-        # or adapt the source image saving with thumbnail property
-        image_sha1 = sha1(image.tobytes()).hexdigest()
+        full_size = ingest.get_generation_size(image.width, image.height)
+        image = ingest.get_generation_image(image, max_size)
 
         # use always the sliders for strength and steps if they are enabled
         if not config.UI_show_strength_slider(): strength = sd["strength"]
         if not config.UI_show_steps_slider(): steps = sd["steps"]
 
-        if config.SKIP_AI:
-            result_image = utils.image_convert_to_sepia(image)
-            time.sleep(5)
-        else:
-            # Generate new picture
-            result_image = AI.generate_image(
-                image = image,
-                prompt=prompt, 
-                negative_prompt=sd["negative_prompt"],
-                steps=steps, 
-                strength=strength,
-                )
-        
-        # save generated file if enabled
-        fn=None
-        if config.is_save_output_enabled():
-            folder_path=config.get_output_folder()
-            folder_path = os.path.join(folder_path, datetime.now().strftime("%Y%m%d"))
-            fn = utils.save_image_with_timestamp(
-                image=result_image,
-                folder_path=folder_path,
-                reference=f"{image_sha1}-{style}",
-                ignore_errors=True)
-
-        if config.is_analytics_enabled():
-            if config.is_save_output_enabled() and fn:
-                rel_path = os.path.relpath(fn, config.get_output_folder())
+        result_image = None
+        if SPECULATIVE_GENERATION or IDLE_PRECOMPUTE:
+            result_image = background_generator.claim(_generation_key(image_sha1, style, strength, steps, image_description, max_size))
+            if result_image is None and max_size is not None:
+                # a precomputed result in full resolution is better and needs no compute
+                result_image = background_generator.claim(_generation_key(image_sha1, style, strength, steps, image_description))
+            if result_image is None:
+                # style or parameters changed, the speculative generation is not needed anymore
+                background_generator.cancel_owner(session_state.session)
             else:
-                rel_path = None
-            analytics.save_generation_details(
-                session_state.session,
-                sha1=image_sha1,
-                style=style,
-                prompt=image_description,
-                output_filename=rel_path
-                )
-        session_state.token -= 1
+                logger.info(f"GENERATE - {session_state.session} - served from background generation")
+
+        if result_image is None:
+            with background_generator.foreground():
+                if config.SKIP_AI:
+                    result_image = utils.image_convert_to_sepia(image)
+                    time.sleep(5)
+                else:
+                    # Generate new picture
+                    result_image = AI.generate_image(
+                        image = image,
+                        prompt=prompt, 
+                        negative_prompt=sd["negative_prompt"],
+                        steps=steps, 
+                        strength=strength,
+                        scheduler=sd.get("scheduler", ""),
+                        )
+            _record_resolution(tier, full_size, image.size)
+        
+        result = deliver_generation_result(session_state, result_image, image_sha1, style, image_description)
         if session_state.token <= 0: gr.Warning("You running out of Credits.\n\nUpload a new image to continue.", duration=30)
-        #make it smaller (WebP to JPG)
-        result_image = result_image.convert("RGB") 
-        return wrap_generate_image_response(session_state, result_image)
+        return wrap_generate_image_response(session_state, result)
     except RuntimeError as e:
         logger.error("RuntimeError: %s", str(e))
         logger.debug("Exception details:", exc_info=True)
         gr.Error(e)
+        # no result, no costs
+        if spent: _add_token(session_state, 1)
+        return wrap_generate_image_response(session_state, None)
+    except ValueError as e:
+        # e.g. an image of an API client above the upload size
+        logger.warning("Image rejected: %s", str(e))
+        gr.Warning(str(e))
+        if spent: _add_token(session_state, 1)
+        return wrap_generate_image_response(session_state, None)
+    except Exception as e:
+        # AI raises plain exceptions, e.g. if the model could not be loaded
+        logger.error("Error while generating image: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        gr.Error(str(e))
+        if spent: _add_token(session_state, 1)
         return wrap_generate_image_response(session_state, None)
 
+def action_generate_full_resolution(request: gr.Request, image, style, strength, steps, image_description, gradio_state):
+    """Render the style again in full resolution, offered after a result in reduced resolution."""
+    return action_generate_image(request, image, style, strength, steps, image_description, gradio_state, RESOLUTION_FULL)
+
+def action_show_upgrade(gradio_state, resolution: str = RESOLUTION_AUTO):
+    """Show the full resolution button if the last result was generated in reduced resolution."""
+    session_state = SessionState.from_gradio_state(gradio_state)
+    tier = get_resolution_tier(session_state, resolution)
+    return gr.update(visible=get_tier_max_size(tier) is not None)
+
+def _get_output_folder():
+    """Returns the output folder (root of the content store), None if results are not saved."""
+    if not config.is_save_output_enabled(): return None
+    return config.get_output_folder()
+
+def get_delivery_folder():
+    """Returns the folder of the results sent to the browser, gradio serves its cache folder without copying."""
+    return os.path.join(get_upload_folder(), "results")
+
+def deliver_generation_result(session_state: SessionState, result_image, image_sha1: str, style: str, image_description: str):
+    """Encodes the result once and returns the file for the browser.
+
+    The file is written into the cache of gradio and sent to the browser as it is, so gradio
+    does not encode the image again. Only the encoding runs in the generation slot: linking the
+    file into the content store (if saving is enabled) and the analytics entry are done by the
+    post-processing stage.
+
+    Returns:
+        str: path of the encoded result, the image itself if encoding failed
+    """
+    # results of different sessions must not overwrite each other
+    file_path = utils.save_image_with_timestamp(
+        image=result_image,
+        folder_path=get_delivery_folder(),
+        reference=f"{image_sha1}-{style}-{uuid.uuid4().hex[:8]}",
+        ignore_errors=True)
+    if not file_path:
+        return result_image.convert("RGB")
+
+    output_folder = _get_output_folder()
+    save_details = analytics.save_generation_details if config.is_analytics_enabled() else None
+    if output_folder is not None or save_details is not None:
+        postprocess.submit(_store_result, file_path, image_sha1, output_folder, save_details,
+            {"session": session_state.session, "style": style, "prompt": image_description})
+    return file_path
+
+def _store_result(file_path: str, image_sha1: str, store_root: str, save_details, details: dict):
+    """Links the encoded result into the content store below store_root and saves its details with save_details (analytics), both optional."""
+    start = time.perf_counter()
+    rel_path = None
+    if store_root is not None:
+        rel_path = content_store.put_file(file_path, image_sha1, root=store_root)
+    if save_details is not None:
+        save_details(
+            sha1=image_sha1,
+            output_filename=rel_path,
+            **details)
+    logger.debug("Result of UPLOAD ID %s stored in %.3fs", image_sha1, time.perf_counter() - start)
+
+def action_generate_all_styles(request: gr.Request, image, strength, steps, image_description, gradio_state, resolution: str = RESOLUTION_AUTO):
+    """Convert the input image into all configured styles and stream each result into the gallery."""
+    session_state = SessionState.from_gradio_state(gradio_state)
+    if session_state.token == None: session_state.token = 0
+    if not config.is_feature_generation_with_token_enabled(): session_state.token = 10 * config.get_style_count()
+    else: token_ledger.sync(session_state)
+
+    gallery = []
+    reserved = 0
+    try:
+        if config.is_feature_generation_with_token_enabled() and session_state.token<=0:
+            gr.Warning("You have not enough credits to start a generation. Upload a new image to get new credits!", duration=0)
+            yield wrap_generate_all_styles_response(session_state, gallery)
+            return
+        if image is None:
+            gr.Error("Start of Generation without image!")
+            yield wrap_generate_all_styles_response(session_state, gallery)
+            return
+        # API Users don't have a request object (by documentation)
+        if request is None:
+            logger.warning("No request object. API usage?")
+            yield wrap_generate_all_styles_response(session_state, gallery)
+            return
+        image, image_sha1 = resolve_upload(session_state, image)
+
+        strength = strength/100  # we use values 1 - 100 in UI instead of 0.1--1
+        # caption and hash are shared by all styles
+        if image_description == None or image_description == "": image_description = AI.describe_image(ingest.shrink(image, ingest.CAPTION_SIZE))
+
+        jobs = []
+        for i in range(1, config.get_style_count()+1):
+            name = config.get_style_name(i)
+            sd = style_details.get(name)
+            if sd == None: continue
+            jobs.append({
+                "name": name,
+                "prompt": str(sd["prompt"]).replace("{prompt}", str(image_description)),
+                "negative_prompt": sd["negative_prompt"],
+                "strength": strength if config.UI_show_strength_slider() else sd["strength"],
+                "steps": steps if config.UI_show_steps_slider() else sd["steps"],
+                "scheduler": sd.get("scheduler", "")
+            })
+        if len(jobs) > session_state.token:
+            gr.Warning(f"Your credits are sufficient for {session_state.token} of {len(jobs)} styles.")
+            jobs = jobs[:session_state.token]
+        # the credits of all styles are spent before the start, not finished styles are refunded
+        if not _try_spend_token(session_state, len(jobs)):
+            gr.Warning("You have not enough credits to start a generation. Upload a new image to get new credits!", duration=0)
+            yield wrap_generate_all_styles_response(session_state, gallery)
+            return
+        reserved = len(jobs)
+
+        tier = get_resolution_tier(session_state, resolution)
+        full_size = ingest.get_generation_size(image.width, image.height)
+        image = ingest.get_generation_image(image, get_tier_max_size(tier))
+        logger.info(f"GENERATE ALL - {session_state.session} - {len(jobs)} styles ({tier}): {image_description}")
+
+        if config.SKIP_AI:
+            def skip_ai_results():
+                for job in jobs:
+                    time.sleep(1)
+                    yield job["name"], utils.image_convert_to_sepia(image)
+            results = skip_ai_results()
+        else:
+            results = AI.generate_images_for_styles(
+                image=image,
+                styles=jobs,
+                batch_size=config.GenAI_get_style_batch_size())
+
+        with background_generator.foreground():
+            for style, result_image in results:
+                reserved -= 1
+                _record_resolution(tier, full_size, image.size)
+                gallery.append((deliver_generation_result(session_state, result_image, image_sha1, style, image_description), style))
+                yield wrap_generate_all_styles_response(session_state, gallery)
+
+        if reserved > 0: _add_token(session_state, reserved)
+        if session_state.token <= 0: gr.Warning("You running out of Credits.\n\nUpload a new image to continue.", duration=30)
+        yield wrap_generate_all_styles_response(session_state, gallery)
+    except Exception as e:
+        logger.error("Error while creating all styles: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        gr.Error(str(e))
+        if reserved > 0: _add_token(session_state, reserved)
+        yield wrap_generate_all_styles_response(session_state, gallery)
+
 #--------------------------------------------------------------
 # Gradio - Render UI
 #--------------------------------------------------------------
@@ -362,6 +820,23 @@ def wrap_generate_image_response(session_state: SessionState, result_image: any)
         session_state.token
     ]
 
+def wrap_generate_all_styles_response(session_state: SessionState, gallery: list) -> list:
+    """Create a consistent response format for generate_all_styles action.
+
+    Args:
+        session_state: The current SessionState object
+        gallery: List of (image, style name) tuples finished so far
+
+    Returns:
+        List of values in the order: [output_gallery, local_storage, start_button, token_counter]
+    """
+    return [
+        list(gallery),
+        session_state,
+        gr.update(interactive=bool(session_state.token>0)),
+        session_state.token
+    ]
+
 def create_gradio_interface():
     global style_details
     with gr.Blocks(
@@ -403,7 +878,8 @@ def create_gradio_interface():
                     info=config.get_token_explanation())
         with gr.Row():
             with gr.Column():
-                image_input = gr.Image(label="Input", type="pil", height=512)
+                # the file is decoded by ingest in the needed size instead of full size by gradio
+                image_input = gr.Image(label="Input", type="filepath", image_mode=None, height=512, elem_id="image_input")
                 #describe_button = gr.Button("Describe your Image", interactive=False)
                 with gr.Column(visible=False) as area_description:
                     text_description = gr.Textbox(label="Prompt", info="change the image description for better results", show_label=True, max_length=150, max_lines=3, submit_btn="↻")
@@ -427,18 +903,27 @@ def create_gradio_interface():
                         "prompt": config.get_style_prompt(i),
                         "negative_prompt":config.get_style_negative_prompt(i),
                         "strength": config.get_style_strengths(i),
-                        "steps": config.get_default_steps()
+                        "steps": config.get_style_steps(i),
+                        "scheduler": config.get_style_scheduler(i)
                     }
                 if config.DEBUG: styles.append("Open Style")
                 style_dropdown = gr.Radio(styles, label="Style", value=styles[0])
+                # auto = reduced resolution on mobiles, which show the result smaller
+                resolution_radio = gr.Radio([("Auto", RESOLUTION_AUTO), ("Fast", RESOLUTION_REDUCED), ("Full", RESOLUTION_FULL)],
+                                            label="Result size", value=RESOLUTION_AUTO,
+                                            visible=config.UI_show_resolution_choice() and config.GenAI_get_reduced_max_size() < config.get_max_size())
             with gr.Column():
                 output_image = gr.Image(
                     label="Result", 
                     type="pil", 
                     height=512, 
+                    format=config.get_output_format(),
                     show_download_button=True
                     )
                 start_button = gr.Button("Start Creation", interactive=False, variant="primary")
+                upgrade_button = gr.Button("Render in full resolution", visible=False)
+                all_styles_button = gr.Button("Create all Styles", interactive=False, visible=config.UI_show_all_styles_button())
+                output_gallery = gr.Gallery(label="All Styles", columns=3, format=config.get_output_format(), visible=config.UI_show_all_styles_button())
                 with gr.Column(visible=config.UI_show_feedback_area()):
                     gr.Markdown(value="""
 ### Important Information
@@ -475,7 +960,13 @@ As all communication is anonymous through. We can't send any feedback to you.
 
         # Save input image immediately on change
         # adapt wrap_handle_input_response if you change output params
+        # the handle of the former image must not be used until the new one is stored
         image_input.change(
+            fn=action_reset_upload,
+            inputs=[local_storage],
+            outputs=[start_button, local_storage],
+            queue=False
+        ).then(
             fn=action_handle_input_file,
             inputs=[image_input, local_storage],
             outputs=[start_button, text_description, local_storage, area_description, token_counter], 
@@ -493,11 +984,11 @@ As all communication is anonymous through. We can't send any feedback to you.
 
         # adapt wrap_generate_image_response if you change output parameters
         start_button.click(
-            fn=lambda: gr.Button(interactive=False),
-            outputs=[start_button],
+            fn=lambda: [gr.Button(interactive=False), gr.Button(interactive=False)],
+            outputs=[start_button, all_styles_button],
         ).then(
             fn=action_generate_image,
-            inputs=[image_input, style_dropdown, strength_slider, steps_slider, text_description, local_storage],
+            inputs=[image_input, style_dropdown, strength_slider, steps_slider, text_description, local_storage, resolution_radio],
             outputs=[output_image, local_storage, start_button, token_counter],
             concurrency_limit=config.GenAI_get_execution_batch_size(),
             concurrency_id="gpu_queue",
@@ -505,10 +996,51 @@ As all communication is anonymous through. We can't send any feedback to you.
             #batch=False,
             #max_batch_size=config.GenAI_get_execution_batch_size(),
         ).then(
-            fn=lambda: gr.Button(interactive=True),
-            outputs=[start_button],
+            fn=lambda: [gr.Button(interactive=True), gr.Button(interactive=True)],
+            outputs=[start_button, all_styles_button],
+        ).then(
+            fn=action_show_upgrade,
+            inputs=[local_storage, resolution_radio],
+            outputs=[upgrade_button],
+            queue=False
         )
 
+        # the same style again in full resolution, costs one credit like any generation
+        upgrade_button.click(
+            fn=lambda: [gr.Button(interactive=False), gr.Button(interactive=False), gr.Button(visible=False)],
+            outputs=[start_button, all_styles_button, upgrade_button],
+        ).then(
+            fn=action_generate_full_resolution,
+            inputs=[image_input, style_dropdown, strength_slider, steps_slider, text_description, local_storage],
+            outputs=[output_image, local_storage, start_button, token_counter],
+            concurrency_limit=config.GenAI_get_execution_batch_size(),
+            concurrency_id="gpu_queue",
+            show_progress="minimal"
+        ).then(
+            fn=lambda: [gr.Button(interactive=True), gr.Button(interactive=True)],
+            outputs=[start_button, all_styles_button],
+        )
+        # the button belongs to the shown result
+        image_input.change(fn=lambda: gr.Button(visible=False), outputs=[upgrade_button], queue=False)
+        style_dropdown.change(fn=lambda: gr.Button(visible=False), outputs=[upgrade_button], queue=False)
+
+        # all styles share the gpu_queue with single generations, so one click is one scheduled job
+        all_styles_button.click(
+            fn=lambda: [gr.Button(interactive=False), gr.Button(interactive=False)],
+            outputs=[start_button, all_styles_button],
+        ).then(
+            fn=action_generate_all_styles,
+            inputs=[image_input, strength_slider, steps_slider, text_description, local_storage, resolution_radio],
+            outputs=[output_gallery, local_storage, start_button, token_counter],
+            concurrency_limit=config.GenAI_get_execution_batch_size(),
+            concurrency_id="gpu_queue",
+            show_progress="minimal"
+        ).then(
+            fn=lambda: [gr.Button(interactive=True), gr.Button(interactive=True)],
+            outputs=[start_button, all_styles_button],
+        )
+        image_input.change(fn=lambda image: gr.Button(interactive=image is not None), inputs=[image_input], outputs=[all_styles_button])
+
         def action_image_reported(gradio_state, feedback):
             session_state = SessionState.from_gradio_state(gradio_state)
             gr.Info("Thank you for the report. We will try to fine tune our model to avoid such generations in the future.")
@@ -525,6 +1057,77 @@ As all communication is anonymous through. We can't send any feedback to you.
             return gr.update(interactive=True)
         output_image.change(fn=action__activate_button, outputs=[flag_image_button])
 
+        if config.UI_is_client_resize_enabled():
+            # the browser reduces photos to max_size before the upload, the server checks the size anyway (ingest)
+            # selected and dropped files are taken before gradio gets them and passed on reduced
+            js=f"""
+            () => {{
+                const maxSize = {config.get_max_size()};
+                const root = document.getElementById("image_input");
+                if (!root || !window.createImageBitmap || !window.DataTransfer) return;
+                // events sent again with the reduced files
+                const forwarded = new WeakSet();
+
+                async function shrink(file) {{
+                    if (!file.type.startsWith("image/") || file.type === "image/gif" || file.type === "image/svg+xml") return file;
+                    let bitmap;
+                    try {{
+                        // applies the EXIF orientation like the server does
+                        bitmap = await createImageBitmap(file, {{imageOrientation: "from-image"}});
+                    }} catch (e) {{
+                        return file;
+                    }}
+                    const scale = maxSize / Math.max(bitmap.width, bitmap.height);
+                    if (scale >= 1) {{
+                        bitmap.close();
+                        return file;
+                    }}
+                    const canvas = document.createElement("canvas");
+                    canvas.width = Math.max(1, Math.round(bitmap.width * scale));
+                    canvas.height = Math.max(1, Math.round(bitmap.height * scale));
+                    const context = canvas.getContext("2d");
+                    context.imageSmoothingQuality = "high";
+                    context.drawImage(bitmap, 0, 0, canvas.width, canvas.height);
+                    bitmap.close();
+                    const blob = await new Promise((resolve) => canvas.toBlob(resolve, "image/jpeg", 0.92));
+                    if (!blob) return file;
+                    return new File([blob], file.name.replace(/\\.[^.]*$/, "") + ".jpg", {{type: "image/jpeg", lastModified: file.lastModified}});
+                }}
+
+                async function shrinkAll(files) {{
+                    const transfer = new DataTransfer();
+                    for (const file of files) transfer.items.add(await shrink(file));
+                    return transfer;
+                }}
+
+                root.addEventListener("change", async (event) => {{
+                    const input = event.target;
+                    if (forwarded.has(event) || input.type !== "file" || !input.files || input.files.length === 0) return;
+                    event.stopImmediatePropagation();
+                    input.files = (await shrinkAll(Array.from(input.files))).files;
+                    const change = new Event("change", {{bubbles: true}});
+                    forwarded.add(change);
+                    input.dispatchEvent(change);
+                }}, true);
+
+                root.addEventListener("drop", async (event) => {{
+                    if (forwarded.has(event) || !event.dataTransfer || event.dataTransfer.files.length === 0) return;
+                    event.preventDefault();
+                    event.stopImmediatePropagation();
+                    const drop = new DragEvent("drop", {{bubbles: true, cancelable: true, dataTransfer: await shrinkAll(Array.from(event.dataTransfer.files))}});
+                    forwarded.add(drop);
+                    event.target.dispatchEvent(drop);
+                }}, true);
+            }}
+            """
+
+            app.load(
+                fn=None,
+                inputs=None,
+                outputs=None,
+                js=js
+            )
+
         disclaimer = config.get_app_disclaimer()
         if disclaimer:
             js=f"""
@@ -135,6 +135,22 @@ def stop():
         logger.debug("Closing analytics database")
         _ip_geo_reader.close()
 
+def get_client_details(user_agent: str) -> dict:
+    """Splits the user agent string of the browser into the client details of tblSessions.
+
+    Args:
+        user_agent (str): The user agent string from the browser
+
+    Returns:
+        dict: 'OS', 'Browser' and 'IsMobile' (1 for mobiles and tablets, 0 otherwise)
+    """
+    ua = parse_user_agent(user_agent or "")
+    return {
+        'OS': ua.os.family,
+        'Browser': ua.browser.family + (" (bot)" if ua.is_bot else ""),
+        'IsMobile': 1 if ua.is_mobile or ua.is_tablet else 0
+    }
+
 def save_session(session: str, ip: str, user_agent: str, languages: str = None) -> bool:
     """Creates an entry for the current user session if it doesn't exist.
 
@@ -173,12 +189,9 @@ def save_session(session: str, ip: str, user_agent: str, languages: str = None)
                 logger.debug("Failed to determine country and city: %s", str(e))
                 logger.debug("Exception details:", exc_info=True)
 
-        ua = parse_user_agent(user_agent)
         data = {
             'Session': session,
-            'OS': ua.os.family,
-            'Browser': ua.browser.family + (" (bot)" if ua.is_bot else ""),
-            'IsMobile': 1 if ua.is_mobile or ua.is_tablet else 0,
+            **get_client_details(user_agent),
             'Language': languages,
             'UserAgent': user_agent,
             'Continent': continent,
@@ -288,3 +301,33 @@ def save_input_image_details(session: str, sha1: str, cache_path_and_filename: s
         logger.error("Failed to save input image details: %s", str(e))
         logger.debug("Exception details:", exc_info=True)
         return False
+
+def get_top_uploaded_inputs(limit: int = 10) -> list:
+    """Returns the most uploaded input images which are stored in the input cache.
+
+    Args:
+        limit (int, optional): Maximum number of images. Defaults to 10.
+
+    Returns:
+        list: Tuples of SHA1 and cache path, most uploaded first. Empty list on errors.
+    """
+    if not config.is_analytics_enabled(): return []
+
+    query = """
+    SELECT SHA1, MAX(CachePath) as CachePath, COUNT(*) as UploadCount
+    FROM tblInput
+    WHERE CachePath IS NOT NULL AND CachePath != '' AND CachePath != '.'
+    GROUP BY SHA1
+    HAVING UploadCount > 1
+    ORDER BY UploadCount DESC, MAX(Timestamp) DESC
+    LIMIT ?
+    """
+    try:
+        with sqlite3.connect(config.get_analytics_db_path()) as connection:
+            cursor = connection.cursor()
+            cursor.execute(query, (limit,))
+            return [(row[0], row[1]) for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        logger.error("Error while reading top uploaded images: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        return []
@@ -0,0 +1,215 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# lower value = higher priority
+PRIORITY_SPECULATIVE = 10
+PRIORITY_PRECOMPUTE = 20
+# the counters are logged after this number of finished jobs, hits are always logged
+LOG_INTERVAL = 10
+
+
+class _Job:
+    """A generation which runs in background."""
+
+    def __init__(self, key, fn, owner: str, priority: int):
+        self.key = key
+        self.fn = fn
+        self.owner = owner
+        self.priority = priority
+        self.cancel_event = threading.Event()
+        self.done = threading.Event()
+        self.promoted = False
+        self.result = None
+        self.duration = 0.0
+
+
+class BackgroundGenerator:
+    """Runs low priority generations while no user generation is active.
+
+    Jobs are functions which receive a cancel event and return the generated image.
+    As soon as a user generation starts (see foreground), a running job is cancelled
+    unless it was promoted because a user is waiting for its result. The user generation
+    starts after the running job stopped.
+    Finished results are kept until they are claimed or replaced by newer results.
+    """
+
+    def __init__(self, max_results: int = 20):
+        self._condition = threading.Condition()
+        self._queue = []                # heap of (priority, sequence, job)
+        self._sequence = itertools.count()
+        self._jobs = {}                 # key: job which is queued or running
+        self._results = OrderedDict()   # key: finished job, oldest first
+        self._max_results = max_results
+        self._foreground = 0
+        self._running = None
+        self._thread = None
+        self._owner_seconds = {}        # owner: compute time of all finished or cancelled jobs
+        self._finished = 0              # jobs which ran (finished, failed or cancelled)
+        self._stats = {
+            "submitted": 0,
+            "hits": 0,
+            "cancelled": 0,
+            "preempted": 0,
+            "used_seconds": 0.0,
+            "wasted_seconds": 0.0
+        }
+
+    def submit(self, key, fn, owner: str = None, priority: int = PRIORITY_SPECULATIVE) -> bool:
+        """Queue a job, returns False if the same job is already queued, running or finished."""
+        with self._condition:
+            if key in self._jobs or key in self._results:
+                return False
+            job = _Job(key, fn, owner, priority)
+            self._jobs[key] = job
+            heapq.heappush(self._queue, (priority, next(self._sequence), job))
+            self._stats["submitted"] += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="BackgroundGenerator", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+            logger.debug("Background job queued: %s", key)
+            return True
+
+    def claim(self, key, timeout: float = None):
+        """Return the result of the job if it is finished or running (the job is promoted), otherwise None."""
+        with self._condition:
+            job = self._results.pop(key, None)
+            if job is None:
+                job = self._jobs.get(key)
+                if job is None:
+                    return None
+                if job is not self._running:
+                    # not started yet, the caller is faster doing it on its own
+                    self._cancel_job(job)
+                    return None
+                job.promoted = True
+                logger.debug("Background job promoted: %s", key)
+
+        job.done.wait(timeout)
+        with self._condition:
+            if not job.done.is_set() or job.result is None:
+                return None
+            self._stats["hits"] += 1
+            self._stats["used_seconds"] += job.duration
+            self._log_stats()
+            return job.result
+
+    def cancel(self, key):
+        """Cancel a queued or running job and drop its result if it is finished."""
+        with self._condition:
+            job = self._jobs.get(key) or self._results.pop(key, None)
+            if job is not None:
+                self._cancel_job(job)
+
+    def cancel_owner(self, owner: str):
+        """Cancel all jobs of the given owner (e.g. a session) and drop their results."""
+        with self._condition:
+            jobs = [job for job in list(self._jobs.values()) + list(self._results.values()) if job.owner == owner]
+            for job in jobs:
+                self._results.pop(job.key, None)
+                self._cancel_job(job)
+
+    @contextmanager
+    def foreground(self):
+        """Mark a user generation as active, background jobs are paused and a running job is cancelled.
+
+        Returns after the running job stopped, because jobs and user generations share the pipeline.
+        """
+        with self._condition:
+            self._foreground += 1
+            running = self._running
+            if running is not None and not running.promoted and not running.cancel_event.is_set():
+                running.cancel_event.set()
+                self._stats["preempted"] += 1
+                logger.debug("Background job preempted: %s", running.key)
+        try:
+            # a promoted job is not cancelled, its result is served to another user
+            if running is not None: running.done.wait()
+            yield
+        finally:
+            with self._condition:
+                self._foreground -= 1
+                self._condition.notify_all()
+
+    def is_idle(self) -> bool:
+        """Check that neither a user generation nor a background job is active or queued."""
+        with self._condition:
+            return self._foreground == 0 and self._running is None and len(self._jobs) == 0
+
+    def get_stats(self) -> dict:
+        """Get the counters including the hit rate of submitted jobs."""
+        with self._condition:
+            stats = dict(self._stats)
+        stats["hit_rate"] = stats["hits"] / stats["submitted"] if stats["submitted"] > 0 else 0.0
+        return stats
+
+    def get_compute_seconds(self, owner: str) -> float:
+        """Get the compute time used by all jobs of the owner so far."""
+        with self._condition:
+            return self._owner_seconds.get(owner, 0.0)
+
+    def _cancel_job(self, job: _Job):
+        """Cancel the job, must be called with the lock held."""
+        if job.done.is_set():
+            # the result is dropped, so the compute time was wasted
+            self._stats["wasted_seconds"] += job.duration
+        elif job is not self._running:
+            self._stats["cancelled"] += 1
+            self._jobs.pop(job.key, None)
+            job.done.set()
+        job.cancel_event.set()
+
+    def _log_stats(self):
+        stats = self.get_stats()
+        logger.info("Background generation: %i submitted, %i hits (%.0f%%), %i cancelled, %i preempted, %.1fs used, %.1fs wasted",
+                    stats["submitted"], stats["hits"], stats["hit_rate"] * 100, stats["cancelled"],
+                    stats["preempted"], stats["used_seconds"], stats["wasted_seconds"])
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while len(self._queue) == 0 or self._foreground > 0:
+                    self._condition.wait()
+                _, _, job = heapq.heappop(self._queue)
+                if job.done.is_set():
+                    # cancelled while queued
+                    continue
+                self._running = job
+
+            start = time.perf_counter()
+            result = None
+            try:
+                result = job.fn(job.cancel_event)
+            except Exception as e:
+                if not job.cancel_event.is_set():
+                    logger.error("Error in background job: %s", str(e))
+                    logger.debug("Exception details:", exc_info=True)
+
+            with self._condition:
+                job.duration = time.perf_counter() - start
+                self._owner_seconds[job.owner] = self._owner_seconds.get(job.owner, 0.0) + job.duration
+                self._running = None
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
+                if job.cancel_event.is_set() or result is None:
+                    self._stats["wasted_seconds"] += job.duration
+                else:
+                    job.result = result
+                    if not job.promoted:
+                        self._results[job.key] = job
+                        while len(self._results) > self._max_results:
+                            _, evicted = self._results.popitem(last=False)
+                            self._stats["wasted_seconds"] += evicted.duration
+                job.done.set()
+                self._condition.notify_all()
+                # the waste is reported even if there are no hits
+                self._finished += 1
+                if self._finished % LOG_INTERVAL == 0: self._log_stats()
@@ -105,6 +105,26 @@ def get_output_folder():
     """Get the directory path where generated images are saved"""
     return get_config_value("General","output_folder", "./output/")
 
+def get_output_format():
+    """Get the file format of generated images (png, jpeg or webp) for the output folder and the browser"""
+    v = str(get_config_value("General","output_format", "png")).strip().lower()
+    if v == "jpg": v = "jpeg"
+    return v if v in ["png", "jpeg", "webp"] else "png"
+
+def get_output_quality():
+    """Get the quality (1-100) of lossy output formats, 100 = lossless WebP"""
+    v = int(get_config_value("General","output_quality", 90))
+    return min(max(v, 1), 100)
+
+def get_output_effort():
+    """Get the encoder effort (0-6) of output images, higher values give smaller files but take longer"""
+    v = int(get_config_value("General","output_effort", 4))
+    return min(max(v, 0), 6)
+
+def is_output_progressive():
+    """Check if JPEG output images are saved progressive"""
+    return get_boolean_config_value("General","output_progressive", False)
+
 def is_input_cache_enabled():
     """Check if caching is enabled for input images to improve performance"""
     return get_boolean_config_value("General","cache_enabled", False)
@@ -140,6 +160,10 @@ def get_token_time_lock_for_new_image():
     """Get the cooldown period (in minutes) before an image can earn tokens again"""
     return int(get_config_value("Token","image_blocked_in_minutes", 240))
 
+def get_token_lock_max_entries():
+    """Get the maximum number of locked images, the locks which expire next are removed first"""
+    return int(get_config_value("Token","lock_max_entries", 100000))
+
 def get_token_bonus_for_face():
     """Get the bonus token amount awarded for images containing faces"""
     return int(get_config_value("Token","bonus_for_face", 2))
@@ -159,6 +183,10 @@ def UI_show_feedback_area():
     """Check if the feedback area should be shown in the UI"""
     return get_boolean_config_value("UI","allow_feedback", False)
 
+def UI_show_all_styles_button():
+    """Check if the button to create all styles at once should be shown in the UI"""
+    return get_boolean_config_value("UI","allow_all_styles", False)
+
 def UI_show_strength_slider():
     """Check if the strength adjustment slider should be shown in the UI"""
     return get_boolean_config_value("UI","show_strength", False)
@@ -167,10 +195,89 @@ def UI_show_steps_slider():
     """Check if the steps adjustment slider should be shown in the UI"""
     return get_boolean_config_value("UI","show_steps", False)
 
+def UI_get_upload_analysis_workers():
+    """Get the number of threads for captioning and face analysis of uploads"""
+    v = int(get_config_value("UI","upload_analysis_workers", 4))
+    return v if v>0 else 1
+
+def UI_is_client_resize_enabled():
+    """Check if the browser reduces uploaded images to max_size (GenAI) before the upload"""
+    return get_boolean_config_value("UI","client_resize", True)
+
+def UI_get_max_upload_megapixels():
+    """Get the maximum number of pixels (in millions) of an uploaded image, bigger images are rejected"""
+    v = float(get_config_value("UI","max_upload_megapixels", 50))
+    return v if v>0 else 1
+
+def UI_show_resolution_choice():
+    """Check if the user can choose between the automatic, reduced and full resolution of the result"""
+    return get_boolean_config_value("UI","show_resolution", False)
+
 def UI_get_gradio_theme():
     """Get the name of the Gradio theme to use for the UI"""
     return get_config_value("UI","theme", "")
 
+#-----------------------------------------------------------------
+# section ImageStore
+#-----------------------------------------------------------------
+def ImageStore_get_memory_budget_mb():
+    """Get the memory in MB for uploaded images kept for the generations of a session"""
+    v = int(get_config_value("ImageStore","memory_budget_mb", 256))
+    return v if v>0 else 0
+
+def ImageStore_get_disk_budget_mb():
+    """Get the disk space in MB for uploaded images evicted from memory, 0 = disabled"""
+    v = int(get_config_value("ImageStore","disk_budget_mb", 2048))
+    return v if v>0 else 0
+
+def ImageStore_get_ttl_minutes():
+    """Get the minutes after the last use until an uploaded image is removed from the store"""
+    v = int(get_config_value("ImageStore","ttl_minutes", 60))
+    return v if v>0 else 1
+
+def ImageStore_get_folder():
+    """Get the folder of the image store on disk"""
+    return get_config_value("ImageStore","folder", "./cache/image_store")
+
+#-----------------------------------------------------------------
+# section State
+#-----------------------------------------------------------------
+def State_get_backend():
+    """Get the backend of credits and image locks: memory (one instance) or sqlite (shared by instances)"""
+    return str(get_config_value("State","backend", "memory")).strip().lower()
+
+def State_get_sqlite_path():
+    """Get the path of the SQLite database shared by the instances"""
+    return get_config_value("State","sqlite_path", "./cache/state.db")
+
+#-----------------------------------------------------------------
+# section Retention
+#-----------------------------------------------------------------
+def Retention_get_max_size_mb():
+    """Get the disk space in MB for uploads and results in the output folder, 0 = no limit"""
+    v = int(get_config_value("Retention","max_size_mb", 0))
+    return v if v>0 else 0
+
+def Retention_get_max_age_days():
+    """Get the days after which uploads and results are removed from the output folder, 0 = no limit"""
+    v = int(get_config_value("Retention","max_age_days", 0))
+    return v if v>0 else 0
+
+def Retention_get_min_free_mb():
+    """Get the free disk space in MB which is kept by removing uploads and results, 0 = no limit"""
+    v = int(get_config_value("Retention","min_free_mb", 0))
+    return v if v>0 else 0
+
+def Retention_get_delivery_max_age_minutes():
+    """Get the minutes after which results sent to the browser are removed from the cache of gradio, 0 = keep them"""
+    v = int(get_config_value("Retention","delivery_max_age_minutes", 60))
+    return v if v>0 else 0
+
+def Retention_get_interval_minutes():
+    """Get the minutes between two runs of the retention"""
+    v = int(get_config_value("Retention","interval_minutes", 10))
+    return v if v>0 else 1
+
 #-----------------------------------------------------------------
 # section Styles
 #-----------------------------------------------------------------
@@ -198,6 +305,17 @@ def get_style_strengths(style: int):
     """Get the strength value for the specified style, or the default strength if not defined"""
     return get_float_config_value("Styles",f"style_{style}_strength", get_default_strength())
 
+def get_style_steps(style: int):
+    """Get the number of steps for the specified style, or the default steps if not defined (1-100)"""
+    default = get_default_steps()
+    v = int(get_config_value("Styles",f"style_{style}_steps", default))
+    if v<1 or v>100: v=default
+    return v
+
+def get_style_scheduler(style: int):
+    """Get the scheduler (sampler) for the specified style, or the default scheduler if not defined"""
+    return get_config_value("Styles",f"style_{style}_scheduler", get_default_scheduler())
+
 #-----------------------------------------------------------------
 # section GenAI
 #-----------------------------------------------------------------
@@ -217,6 +335,21 @@ def GenAI_get_execution_batch_size():
     """Get the number of parallel image generation processes to run"""
     return int(get_config_value(f"GenAI","execution_batch_size", 1))
 
+def GenAI_get_style_batch_size():
+    """Get the number of styles rendered together in one pipeline call when creating all styles"""
+    v = int(get_config_value(f"GenAI","style_batch_size", 4))
+    return v if v>0 else 1
+
+def GenAI_get_postprocess_queue_size():
+    """Get the number of results which may wait for saving and analytics before generations are delayed"""
+    v = int(get_config_value("GenAI","postprocess_queue_size", 8))
+    return v if v>0 else 1
+
+def GenAI_get_postprocess_workers():
+    """Get the number of threads which save the results of generations"""
+    v = int(get_config_value("GenAI","postprocess_workers", 1))
+    return v if v>0 else 1
+
 def get_default_strength():
     """Get the default strength value (0-1) for image transformation"""
     default = 0.5
@@ -231,10 +364,121 @@ def get_default_steps():
     if v<=10 or v>=100: v=default
     return v
 
+def get_default_scheduler():
+    """Get the default scheduler (sampler) for image generation, empty to use the one of the model"""
+    return get_config_value(f"GenAI","default_scheduler", "")
+
 def get_max_size():
     """Get the maximum allowed dimension for input/output images"""
     return int(get_config_value(f"GenAI","max_size", 1024))
 
+def GenAI_get_reduced_max_size():
+    """Get the maximum dimension of the reduced resolution (mobiles or chosen by the user), 0 = always max_size"""
+    v = int(get_config_value("GenAI","reduced_max_size", 0))
+    if v <= 0: return get_max_size()
+    return min(max(64, v - v % 8), get_max_size())
+
+def GenAI_is_tiled_generation_enabled():
+    """Check if images bigger than the tile size are rendered in overlapping tiles to limit the memory usage"""
+    return get_boolean_config_value(f"GenAI","tiled_generation", False)
+
+def GenAI_get_tile_size():
+    """Get the size of a tile for tiled generation (multiple of 8, minimum 256)"""
+    v = int(get_config_value(f"GenAI","tile_size", 768))
+    return max(256, v - v % 8)
+
+def GenAI_get_tile_overlap():
+    """Get the number of pixels neighboring tiles overlap to blend the seams"""
+    v = int(get_config_value(f"GenAI","tile_overlap", 128))
+    return min(max(0, v - v % 8), GenAI_get_tile_size() // 2)
+
+def GenAI_get_tile_batch_size():
+    """Get the number of tiles rendered together in one pipeline call"""
+    v = int(get_config_value(f"GenAI","tile_batch_size", 1))
+    return v if v>0 else 1
+
+def GenAI_is_speculative_generation_enabled():
+    """Check if the default style is generated in background right after an upload"""
+    return get_boolean_config_value(f"GenAI","speculative_generation", False)
+
+def GenAI_is_idle_precompute_enabled():
+    """Check if the styles for popular uploads are generated in background while the server is idle"""
+    return get_boolean_config_value(f"GenAI","idle_precompute", False)
+
+def GenAI_get_precompute_top_n():
+    """Get the number of most uploaded images which are precomputed"""
+    v = int(get_config_value(f"GenAI","precompute_top_n", 10))
+    return v if v>0 else 1
+
+def GenAI_get_precompute_daily_budget():
+    """Get the compute time in seconds the idle precomputation may use per day"""
+    v = int(get_config_value(f"GenAI","precompute_daily_budget", 1800))
+    return v if v>0 else 0
+
+def FaceAnalysis_get_intra_op_threads():
+    """Get the number of threads one face analyzer uses inside an ONNX operator"""
+    v = int(get_config_value("FaceAnalysis","intra_op_threads", 2))
+    return v if v>0 else 1
+
+def FaceAnalysis_get_inter_op_threads():
+    """Get the number of threads one face analyzer uses to run ONNX operators in parallel"""
+    v = int(get_config_value("FaceAnalysis","inter_op_threads", 1))
+    return v if v>0 else 1
+
+def FaceAnalysis_get_pool_size():
+    """Get the number of face analyzers for concurrent uploads, 0 = number of cores / intra_op_threads"""
+    v = int(get_config_value("FaceAnalysis","pool_size", 0))
+    if v>0: return v
+    return max(1, (os.cpu_count() or 1) // FaceAnalysis_get_intra_op_threads())
+
+def FaceAnalysis_is_adaptive_detection_enabled():
+    """Check if the face detection size is selected by the image size and the expected face size instead of 512x512"""
+    return get_boolean_config_value("FaceAnalysis","adaptive_detection", True)
+
+def FaceAnalysis_get_min_face_size():
+    """Get the size of the smallest face to detect as fraction of the longer image side (0.01-1)"""
+    v = get_float_config_value("FaceAnalysis","min_face_size", 0.04)
+    return min(max(v, 0.01), 1.0)
+
+def FaceAnalysis_is_coarse_detection_enabled():
+    """Check if a fast detection at a small size runs first and skips the fine detection if there is no face"""
+    return get_boolean_config_value("FaceAnalysis","coarse_detection", True)
+
+def FaceAnalysis_get_coarse_detection_size():
+    """Get the longer side of the detection size of the coarse detection"""
+    v = int(get_config_value("FaceAnalysis","coarse_detection_size", 160))
+    return max(32, v - v % 32)
+
+def FaceAnalysis_get_max_faces():
+    """Get the maximum number of faces classified per image (largest first), 0 = all faces"""
+    v = int(get_config_value("FaceAnalysis","max_faces", 0))
+    return v if v>0 else 0
+
+def FaceAnalysis_is_optimized_model_cache_enabled():
+    """Check if ORT-optimized face analysis models are saved on first start and used afterwards"""
+    return get_boolean_config_value("FaceAnalysis","optimized_model_cache", True)
+
+def FaceAnalysis_get_optimized_model_folder():
+    """Get the folder of the ORT-optimized face analysis models"""
+    return get_config_value("FaceAnalysis","optimized_model_folder", os.path.join(get_model_folder(), "onnx/optimized"))
+
+def FaceAnalysis_is_model_memory_shared():
+    """Check if the weights of the optimized models are used memory mapped (shared between processes) instead of prepacked"""
+    return get_boolean_config_value("FaceAnalysis","share_model_memory", True)
+
+def FaceAnalysis_is_face_cache_enabled():
+    """Check if face analysis results are stored by the SHA1 of the image for later uploads"""
+    return get_boolean_config_value("FaceAnalysis","face_cache_enabled", True)
+
+def FaceAnalysis_get_face_cache_path():
+    """Get the path to the SQLite database of the face analysis results"""
+    return get_config_value("FaceAnalysis","face_cache_path", "./analytics/face_cache.db")
+
+def FaceAnalysis_get_face_cache_max_entries():
+    """Get the number of images kept in the face cache, least recently used are removed first"""
+    v = int(get_config_value("FaceAnalysis","face_cache_max_entries", 100000))
+    return v if v>0 else 1
+
 def get_modelurl_onnx_age_googlenet():
     """Get the download URL for the age detection model"""
     return "https://github.com/onnx/models/raw/refs/heads/main/validated/vision/body_analysis/age_gender/models/age_googlenet.onnx"
@@ -244,6 +488,11 @@ def get_modelfile_onnx_age_googlenet():
     mf = get_model_folder()
     return os.path.join(mf, 'onnx/age_googlenet.onnx')
 
+def get_modelfile_onnx_age_gender_googlenet():
+    """Get the local path of the fused age and gender model, created from the single models"""
+    mf = get_model_folder()
+    return os.path.join(mf, 'onnx/age_gender_googlenet.onnx')
+
 def get_modelurl_onnx_gender_googlenet():
     """Get the download URL for the gender detection model"""
     return "https://github.com/onnx/models/raw/refs/heads/main/validated/vision/body_analysis/age_gender/models/gender_googlenet.onnx"
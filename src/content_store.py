@@ -0,0 +1,260 @@
+import logging
+import os
+import shutil
+import sqlite3
+import uuid
+from threading import Lock
+from PIL import Image
+import src.config as config
+import src.utils as utils
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# uploads and results are stored in the output folder by the SHA1 of the upload, sharded by the
+# first two byte pairs of the hash (cache/ab/cd/<sha1>.jpg), so an image uploaded on different days
+# is stored once and no folder gets too many files. Paths are relative to the output folder, like
+# the CachePath of analytics. The index (index.db in the output folder) maps the hashes to the paths.
+# LastAccess is set when an upload is stored again or a file is viewed in the dashboard, the
+# retention (src/retention.py) removes files which were never used first.
+
+INPUT_FOLDER = "cache"
+OUTPUT_FOLDER = "results"
+INDEX_FILE = "index.db"
+
+KIND_INPUT = "input"
+KIND_OUTPUT = "output"
+
+_lock = Lock()
+_ready_paths = set()  # indexes for which the table was created
+
+def get_relative_path(sha1: str, kind: str = KIND_INPUT, name: str = None) -> str:
+    """Returns the path in the store relative to the output folder.
+
+    Args:
+        sha1 (str): The SHA1 hash of the uploaded image
+        kind (str): KIND_INPUT for uploads, KIND_OUTPUT for results
+        name (str): file name of a result, uploads are named by the hash
+    """
+    folder = INPUT_FOLDER if kind == KIND_INPUT else OUTPUT_FOLDER
+    return os.path.join(folder, sha1[:2], sha1[2:4], name if name else f"{sha1}.jpg")
+
+def get_absolute_path(relative_path: str, root: str = None) -> str:
+    return os.path.join(root or config.get_output_folder(), relative_path)
+
+def put_image(image: Image.Image, sha1: str, root: str = None):
+    """Stores an upload as JPEG, an upload which is already stored is not written again.
+
+    Returns:
+        str: the path relative to the output folder (root), None on errors
+    """
+    relative_path = get_relative_path(sha1)
+    try:
+        file_path = get_absolute_path(relative_path, root)
+        if not os.path.exists(file_path):
+            _write_atomic(file_path, lambda tmp_file: image.save(tmp_file, format="JPEG"))
+            logger.debug("Image saved to %s", file_path)
+        _add_to_index(root, sha1, KIND_INPUT, relative_path)
+        return relative_path
+    except Exception as e:
+        logger.error("Error while saving image to content store: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        return None
+
+def put_file(source_path: str, sha1: str, kind: str = KIND_OUTPUT, move: bool = False, root: str = None):
+    """Stores an encoded file (e.g. a result) by the hash of its upload with the file name of source_path.
+
+    The file is hard linked (copied if not possible) or moved with move=True.
+
+    Returns:
+        str: the path relative to the output folder (root), None on errors
+    """
+    relative_path = get_relative_path(sha1, kind, os.path.basename(source_path))
+    try:
+        file_path = get_absolute_path(relative_path, root)
+        if move:
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            try:
+                os.replace(source_path, file_path)
+            except OSError:
+                # other file system
+                _write_atomic(file_path, lambda tmp_file: shutil.copyfile(source_path, tmp_file))
+                os.remove(source_path)
+        elif not os.path.exists(file_path):
+            _write_atomic(file_path, lambda tmp_file: utils.link_or_copy(source_path, tmp_file))
+        _add_to_index(root, sha1, kind, relative_path)
+        return relative_path
+    except Exception as e:
+        logger.error("Error while saving file to content store: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        return None
+
+def get_paths(sha1: str, kind: str = None, root: str = None) -> list:
+    """Returns the stored paths (relative to the output folder) of an upload from the index."""
+    try:
+        with _lock:
+            connection = _connect(root)
+            try:
+                if kind is None:
+                    rows = connection.execute("SELECT Path FROM tblContent WHERE SHA1 = ? ORDER BY Created", (sha1,)).fetchall()
+                else:
+                    rows = connection.execute("SELECT Path FROM tblContent WHERE SHA1 = ? AND Kind = ? ORDER BY Created", (sha1, kind)).fetchall()
+            finally:
+                connection.close()
+        return [row[0] for row in rows]
+    except Exception as e:
+        logger.error("Error while reading content store index: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        return []
+
+def remove_from_index(relative_path: str, root: str = None):
+    """Removes a path from the index, the file has to be removed by the caller."""
+    with _lock:
+        connection = _connect(root)
+        try:
+            connection.execute("DELETE FROM tblContent WHERE Path = ?", (relative_path,))
+            connection.commit()
+        finally:
+            connection.close()
+
+def touch(relative_path: str, root: str = None):
+    """Sets the last access of a stored file, e.g. if it is viewed in the dashboard."""
+    try:
+        with _lock:
+            connection = _connect(root)
+            try:
+                connection.execute("UPDATE tblContent SET LastAccess = strftime('%Y-%m-%d %H:%M:%f','now') WHERE Path = ?", (relative_path,))
+                connection.commit()
+            finally:
+                connection.close()
+    except Exception as e:
+        logger.error("Error while updating content store index: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+
+def get_expired(max_age_days: float, limit: int, root: str = None) -> list:
+    """Returns up to limit (path, size) of the files stored more than max_age_days ago, oldest first."""
+    with _lock:
+        connection = _connect(root)
+        try:
+            return connection.execute(
+                "SELECT Path, Size FROM tblContent WHERE Created < strftime('%Y-%m-%d %H:%M:%f','now', ?) ORDER BY Created LIMIT ?",
+                (f"-{max_age_days} days", limit)).fetchall()
+        finally:
+            connection.close()
+
+def get_least_valuable(limit: int, root: str = None) -> list:
+    """Returns up to limit (path, size) of the files to remove first.
+
+    Results which were never viewed come first, then all files by their last access (or creation).
+    """
+    with _lock:
+        connection = _connect(root)
+        try:
+            return connection.execute("""
+                SELECT Path, Size FROM tblContent
+                ORDER BY (Kind = ? AND LastAccess IS NULL) DESC, COALESCE(LastAccess, Created)
+                LIMIT ?""", (KIND_OUTPUT, limit)).fetchall()
+        finally:
+            connection.close()
+
+def verify(after_rowid: int, limit: int, root: str = None):
+    """Removes the index entries of files which do not exist anymore, checks limit entries after after_rowid.
+
+    Returns:
+        tuple: (rowid to continue with, 0 after the end of the index; number of removed entries)
+    """
+    with _lock:
+        connection = _connect(root)
+        try:
+            rows = connection.execute("SELECT rowid, Path FROM tblContent WHERE rowid > ? ORDER BY rowid LIMIT ?", (after_rowid, limit)).fetchall()
+        finally:
+            connection.close()
+    missing = [path for _, path in rows if not os.path.exists(get_absolute_path(path, root))]
+    for path in missing:
+        remove_from_index(path, root)
+    return (rows[-1][0] if len(rows) == limit else 0), len(missing)
+
+def remove(relative_path: str, root: str = None):
+    """Removes a stored file and its index entry.
+
+    Returns:
+        int: the number of freed bytes, None if the file could not be removed (it stays in the index)
+    """
+    file_path = get_absolute_path(relative_path, root)
+    freed = 0
+    try:
+        stat = os.stat(file_path)
+        os.remove(file_path)
+        # a hard link (e.g. the file sent to the browser) keeps the data
+        if stat.st_nlink == 1: freed = stat.st_size
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error("Error while removing %s from content store: %s", relative_path, str(e))
+        logger.debug("Exception details:", exc_info=True)
+        return None
+    remove_from_index(relative_path, root)
+    return freed
+
+def get_stats(root: str = None) -> dict:
+    """Returns the number of files and their size per kind from the index."""
+    with _lock:
+        connection = _connect(root)
+        try:
+            rows = connection.execute("SELECT Kind, COUNT(*), COALESCE(SUM(Size), 0) FROM tblContent GROUP BY Kind").fetchall()
+        finally:
+            connection.close()
+    return {kind: {"files": files, "bytes": size} for kind, files, size in rows}
+
+def _write_atomic(file_path: str, write):
+    """Calls write with a temporary file beside file_path and renames it, so readers never see a partial file."""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    root, extension = os.path.splitext(file_path)
+    # unique per writer, the extension selects the format for PIL
+    tmp_file = f"{root}.{uuid.uuid4().hex[:8]}.tmp{extension}"
+    try:
+        write(tmp_file)
+        os.replace(tmp_file, file_path)
+    finally:
+        if os.path.exists(tmp_file): os.remove(tmp_file)
+
+def _connect(root: str = None) -> sqlite3.Connection:
+    """Opens the index and creates the table on first use, the lock must be held."""
+    path = get_absolute_path(INDEX_FILE, root)
+    if path not in _ready_paths:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=10)
+    if path not in _ready_paths:
+        connection.execute("""
+        CREATE TABLE IF NOT EXISTS tblContent (
+            Path TEXT NOT NULL PRIMARY KEY,
+            SHA1 TEXT NOT NULL,
+            Kind TEXT NOT NULL,
+            Size INTEGER,
+            Created TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f','now')),
+            LastAccess TEXT
+        );
+        """)
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(tblContent);")]
+        if "LastAccess" not in columns:
+            # index of an earlier version
+            connection.execute("ALTER TABLE tblContent ADD COLUMN LastAccess TEXT;")
+        connection.execute("CREATE INDEX IF NOT EXISTS idxContentSHA1 ON tblContent (SHA1, Kind);")
+        connection.execute("CREATE INDEX IF NOT EXISTS idxContentCreated ON tblContent (Created);")
+        connection.commit()
+        _ready_paths.add(path)
+    return connection
+
+def _add_to_index(root: str, sha1: str, kind: str, relative_path: str):
+    size = os.path.getsize(get_absolute_path(relative_path, root))
+    with _lock:
+        connection = _connect(root)
+        try:
+            # a file stored again (e.g. the same upload) counts as access
+            connection.execute("""
+                INSERT INTO tblContent (Path, SHA1, Kind, Size) VALUES (?, ?, ?, ?)
+                ON CONFLICT (Path) DO UPDATE SET Size = excluded.Size, LastAccess = strftime('%Y-%m-%d %H:%M:%f','now')
+                """, (relative_path, sha1, kind, size))
+            connection.commit()
+        finally:
+            connection.close()
@@ -0,0 +1,130 @@
+import json
+import logging
+import os
+import sqlite3
+from threading import Lock
+import src.config as config
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# remove least recently used entries after this number of writes
+_PRUNE_INTERVAL = 100
+
+_lock = Lock()
+_ready_path = None  # database for which the table was created
+_writes = 0
+
+def _connect() -> sqlite3.Connection:
+    """Opens the face cache database and creates the table on first use."""
+    global _ready_path
+    path = config.FaceAnalysis_get_face_cache_path()
+    if _ready_path != path and os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=10)
+    if _ready_path != path:
+        # every detected face is one dict like returned from FaceAnalyzer.get_gender_and_age_from_image
+        connection.execute("""
+        CREATE TABLE IF NOT EXISTS tblFaces (
+            SHA1 TEXT NOT NULL PRIMARY KEY,
+            Faces TEXT NOT NULL,
+            Created TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f','now')),
+            LastAccess TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f','now'))
+        );
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS idxFacesLastAccess ON tblFaces (LastAccess);")
+        connection.commit()
+        _ready_path = path
+    return connection
+
+def start() -> bool:
+    """Creates the face cache database if it is enabled and does not exist.
+
+    Returns:
+        bool: True if the cache is ready or disabled, False otherwise
+    """
+    if not config.FaceAnalysis_is_face_cache_enabled(): return True
+    try:
+        with _lock:
+            _connect().close()
+        logger.info("Face cache ready")
+        return True
+    except Exception as e:
+        logger.error("Error during face cache startup: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        return False
+
+def get_faces(sha1: str):
+    """Returns the cached faces of an image.
+
+    Args:
+        sha1 (str): The SHA1 hash of the image pixels
+
+    Returns:
+        list: The detected faces, None if the image is not cached or the cache is disabled
+    """
+    if not config.FaceAnalysis_is_face_cache_enabled(): return None
+    try:
+        with _lock:
+            connection = _connect()
+            try:
+                row = connection.execute("SELECT Faces FROM tblFaces WHERE SHA1 = ?", (sha1,)).fetchone()
+                if row is None: return None
+                connection.execute("UPDATE tblFaces SET LastAccess = strftime('%Y-%m-%d %H:%M:%f','now') WHERE SHA1 = ?", (sha1,))
+                connection.commit()
+            finally:
+                connection.close()
+        return json.loads(row[0])
+    except Exception as e:
+        logger.error("Error while reading face cache: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        return None
+
+def save_faces(sha1: str, faces: list) -> bool:
+    """Saves the detected faces of an image.
+
+    Args:
+        sha1 (str): The SHA1 hash of the image pixels
+        faces (list): The detected faces, an empty list if there are no faces
+
+    Returns:
+        bool: True if saved or the cache is disabled, False otherwise
+    """
+    global _writes
+    if not config.FaceAnalysis_is_face_cache_enabled(): return True
+    try:
+        with _lock:
+            connection = _connect()
+            try:
+                connection.execute("INSERT OR REPLACE INTO tblFaces (SHA1, Faces) VALUES (?, ?)", (sha1, json.dumps(faces)))
+                connection.commit()
+                _writes += 1
+                if _writes % _PRUNE_INTERVAL == 0:
+                    _prune(connection, config.FaceAnalysis_get_face_cache_max_entries())
+            finally:
+                connection.close()
+        return True
+    except Exception as e:
+        logger.error("Error while saving to face cache: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        return False
+
+def prune(max_entries: int = None) -> int:
+    """Removes the least recently used entries above max_entries, returns the number of removed entries."""
+    if max_entries is None: max_entries = config.FaceAnalysis_get_face_cache_max_entries()
+    with _lock:
+        connection = _connect()
+        try:
+            return _prune(connection, max_entries)
+        finally:
+            connection.close()
+
+def _prune(connection: sqlite3.Connection, max_entries: int) -> int:
+    cursor = connection.execute("""
+        DELETE FROM tblFaces WHERE SHA1 IN (
+            SELECT SHA1 FROM tblFaces ORDER BY LastAccess DESC LIMIT -1 OFFSET ?
+        )""", (max_entries,))
+    connection.commit()
+    if cursor.rowcount > 0:
+        logger.info("Removed %i least recently used entries from face cache", cursor.rowcount)
+    return cursor.rowcount
@@ -0,0 +1,160 @@
+import os
+import re
+import time
+import logging
+from collections import OrderedDict
+from threading import Lock
+import numpy as np
+from PIL import Image
+import src.config as config
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# uploads are kept by their hash (utils.compute_image_hash), the browser only gets the hash as handle
+# the handle comes from the browser, so only hashes are accepted as file names
+_IMAGE_ID = re.compile(r"[0-9a-f]{40}")
+# the disk is cleaned up at most once in this interval
+_DISK_CLEANUP_INTERVAL = 60
+
+_lock = Lock()
+_images = OrderedDict()  # image_id: [image, bytes, last access], least recently used first
+_memory_bytes = 0
+_last_disk_cleanup = 0.0
+_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+def is_valid_id(image_id) -> bool:
+    """Check if the handle can be an image of the store."""
+    return isinstance(image_id, str) and _IMAGE_ID.fullmatch(image_id) is not None
+
+def put(image_id: str, image: Image.Image) -> bool:
+    """Keeps the canonical image of an upload in memory, see save_to_disk for restarts and evictions.
+
+    Returns:
+        bool: True if stored, False if the id is not a valid handle
+    """
+    global _memory_bytes
+    if not is_valid_id(image_id):
+        logger.error("Invalid image id %s", image_id)
+        return False
+    size = len(image.getbands()) * image.width * image.height
+    with _lock:
+        entry = _images.pop(image_id, None)
+        if entry is not None: _memory_bytes -= entry[1]
+        _images[image_id] = [image, size, time.monotonic()]
+        _memory_bytes += size
+        _evict_memory()
+    return True
+
+def get(image_id: str):
+    """Returns the image of the handle, None if it is unknown or expired."""
+    if not is_valid_id(image_id): return None
+    with _lock:
+        _evict_memory()
+        entry = _images.get(image_id)
+        if entry is not None:
+            entry[2] = time.monotonic()
+            _images.move_to_end(image_id)
+            _stats["hits"] += 1
+            return entry[0]
+
+    image = _load_from_disk(image_id)
+    with _lock:
+        if image is None:
+            _stats["misses"] += 1
+            return None
+        _stats["disk_hits"] += 1
+    put(image_id, image)
+    return image
+
+def save_to_disk(image_id: str, image: Image.Image) -> bool:
+    """Writes the image to the disk store (raw pixels, no encoding), returns False if disabled or failed."""
+    if config.ImageStore_get_disk_budget_mb() <= 0 or not is_valid_id(image_id): return False
+    try:
+        folder = config.ImageStore_get_folder()
+        os.makedirs(folder, exist_ok=True)
+        file_path = _get_file_path(image_id)
+        if os.path.exists(file_path):
+            os.utime(file_path)
+        else:
+            tmp_file = f"{file_path}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as file:
+                np.save(file, np.asarray(image))
+            os.replace(tmp_file, file_path)
+        _cleanup_disk()
+        return True
+    except Exception as e:
+        logger.error("Error while saving image to image store: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        return False
+
+def get_stats() -> dict:
+    """Returns hits, misses, evictions and the used memory of the store."""
+    with _lock:
+        return dict(_stats, images=len(_images), memory_mb=_memory_bytes / 1024 / 1024)
+
+def clear():
+    """Removes all images from memory."""
+    global _memory_bytes
+    with _lock:
+        _images.clear()
+        _memory_bytes = 0
+
+def _get_file_path(image_id: str) -> str:
+    return os.path.join(config.ImageStore_get_folder(), f"{image_id}.npy")
+
+def _load_from_disk(image_id: str):
+    if config.ImageStore_get_disk_budget_mb() <= 0: return None
+    file_path = _get_file_path(image_id)
+    try:
+        if not os.path.exists(file_path): return None
+        if time.time() - os.path.getmtime(file_path) > config.ImageStore_get_ttl_minutes() * 60:
+            os.remove(file_path)
+            return None
+        os.utime(file_path)
+        return Image.fromarray(np.load(file_path))
+    except Exception as e:
+        logger.error("Error while loading image from image store: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        return None
+
+def _evict_memory():
+    """Removes expired and least recently used images above the budget, the lock must be held."""
+    global _memory_bytes
+    budget = config.ImageStore_get_memory_budget_mb() * 1024 * 1024
+    expired = time.monotonic() - config.ImageStore_get_ttl_minutes() * 60
+    while len(_images) > 0:
+        image_id, entry = next(iter(_images.items()))
+        if _memory_bytes <= budget and entry[2] >= expired: break
+        del _images[image_id]
+        _memory_bytes -= entry[1]
+        _stats["evictions"] += 1
+
+def _cleanup_disk():
+    """Removes expired files and the oldest files above the disk budget."""
+    global _last_disk_cleanup
+    now = time.time()
+    with _lock:
+        if now - _last_disk_cleanup < _DISK_CLEANUP_INTERVAL: return
+        _last_disk_cleanup = now
+    folder = config.ImageStore_get_folder()
+    files = []
+    for entry in os.scandir(folder):
+        if entry.is_file() and entry.name.endswith(".npy"):
+            stat = entry.stat()
+            files.append((stat.st_mtime, stat.st_size, entry.path))
+    files.sort()
+    budget = config.ImageStore_get_disk_budget_mb() * 1024 * 1024
+    expired = now - config.ImageStore_get_ttl_minutes() * 60
+    used = sum(size for _, size, _ in files)
+    removed = 0
+    for mtime, size, file_path in files:
+        if used <= budget and mtime >= expired: break
+        try:
+            os.remove(file_path)
+            used -= size
+            removed += 1
+        except FileNotFoundError:
+            pass
+    if removed > 0:
+        logger.info("Removed %i images from the image store on disk", removed)
@@ -0,0 +1,96 @@
+import math
+import logging
+from PIL import Image, ImageOps
+import src.config as config
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# the BLIP captioner scales its input to 384x384
+CAPTION_SIZE = 384
+# EXIF tag of the orientation, 1 = stored as displayed
+_ORIENTATION = 0x0112
+
+def open_image(source, max_size: int = None) -> Image.Image:
+    """Decodes an upload into the canonical RGB image with the long side reduced to max_size.
+
+    JPEG files are decoded at reduced scale (1/2, 1/4 or 1/8) if the result is still bigger
+    than max_size, so the full resolution is never in memory. The EXIF orientation is applied.
+
+    Args:
+        source: path of the uploaded file or a decoded image (API usage), which is not changed
+        max_size (int, optional): maximum width and height. Defaults to config.get_max_size().
+
+    Returns:
+        Image.Image: the canonical image of the upload
+
+    Raises:
+        ValueError: if the image has more pixels than allowed, see check_size
+    """
+    if max_size is None: max_size = config.get_max_size()
+    if isinstance(source, Image.Image):
+        image = source
+        check_size(image.width, image.height)
+    else:
+        image = Image.open(source)
+        # the header is read, the pixels are not decoded yet
+        check_size(image.width, image.height)
+        if image.format == "JPEG" and max(image.size) > max_size:
+            # draft selects the biggest reduction which keeps the image at least this size
+            scale = max_size / max(image.size)
+            image.draft("RGB", (math.ceil(image.width * scale), math.ceil(image.height * scale)))
+
+    if image.getexif().get(_ORIENTATION, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return shrink(image, max_size)
+
+def check_size(width: int, height: int):
+    """Raises ValueError if an upload has more pixels than UI/max_upload_megapixels.
+
+    Browsers reduce uploads to max_size (UI/client_resize), but API clients and old browsers
+    send the original file, so the server checks the size before decoding.
+    """
+    if width <= 0 or height <= 0:
+        raise ValueError(f"Invalid image size {width}x{height}")
+    megapixels = width * height / 1000000
+    if megapixels > config.UI_get_max_upload_megapixels():
+        raise ValueError(f"The image is too large ({width}x{height}), please upload an image with at most {config.UI_get_max_upload_megapixels():g} megapixels")
+
+def shrink(image: Image.Image, max_size: int) -> Image.Image:
+    """Returns the image with the long side reduced to max_size, the image itself if it is small enough."""
+    if max(image.size) <= max_size: return image
+    scale = max_size / max(image.size)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.Resampling.BICUBIC, reducing_gap=3.0)
+
+def get_generation_size(width: int, height: int, max_size: int = None) -> tuple:
+    """Size of the generation input: within max_size (default config.get_max_size()) and both sides multiples of 8 as required by the VAE."""
+    if max_size is None: max_size = config.get_max_size()
+    scale = min(1.0, max_size / max(width, height))
+    return max(8, int(width * scale) // 8 * 8), max(8, int(height * scale) // 8 * 8)
+
+def get_generation_image(image: Image.Image, max_size: int = None) -> Image.Image:
+    """Returns the generation input of the canonical image, the same for speculative and user started generations.
+
+    max_size is the size of the resolution tier, defaults to config.get_max_size().
+    """
+    size = get_generation_size(image.width, image.height, max_size)
+    if size == image.size: return image
+    return image.resize(size, Image.Resampling.BICUBIC, reducing_gap=3.0)
+
+def create_variants(image: Image.Image) -> dict:
+    """Creates the images needed by the consumers of an upload from the canonical image.
+
+    Returns:
+        dict: "image" (canonical), "caption" (captioner size), "faces" (face analysis),
+        "generation" (generation bucket); variants of the same size are the same object
+    """
+    return {
+        "image": image,
+        "caption": shrink(image, CAPTION_SIZE),
+        # the face analysis shrinks to max_size itself, the canonical image is not bigger
+        "faces": image,
+        "generation": get_generation_image(image),
+    }
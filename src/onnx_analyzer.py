@@ -1,17 +1,106 @@
 import numpy as np              # for image manipulation e.g. sepia
 from PIL import Image, ImageOps # for image handling
+import os
+import glob
+import math
+import queue
+import threading
+import time
 import logging
+from contextlib import contextmanager
 import src.config as config
 import cv2                      # prepare images for face recognition
 import onnxruntime as ort       # for age and gender classification
 #import insightface              # face recognition
-from insightface.app import FaceAnalysis    # face boxes detection
+from insightface.app import FaceAnalysis    # downloads the detection model
+from insightface.model_zoo import SCRFD     # face boxes detection
 
 # Set up module logger
 logger = logging.getLogger(__name__)
 
+def _create_session_options(intra_op_threads: int, inter_op_threads: int):
+    """Session options for one analyzer, so that concurrent analyzers do not oversubscribe the cores."""
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # the models are a chain of operators, parallel execution of branches does not pay off
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    return options
+
+def _copy_session_options(session_options=None):
+    """New session options with the threading and optimization settings of the given options."""
+    options = ort.SessionOptions()
+    if session_options is not None:
+        options.intra_op_num_threads = session_options.intra_op_num_threads
+        options.inter_op_num_threads = session_options.inter_op_num_threads
+        options.graph_optimization_level = session_options.graph_optimization_level
+        options.execution_mode = session_options.execution_mode
+    return options
+
+def create_session(model_file: str, session_options=None, providers: list = ['CPUExecutionProvider']):
+    """Creates a session from the ORT-optimized model in the model cache.
+
+    The model is optimized and saved on first use, later starts skip the graph optimization.
+    Weights are stored in an external file which ORT maps into memory, so processes and the
+    analyzers of the pool share the pages (if prepacking of weights is disabled).
+    The cache is per ORT version and should only be used on the machine which created it.
+    """
+    if not config.FaceAnalysis_is_optimized_model_cache_enabled():
+        return ort.InferenceSession(model_file, sess_options=session_options, providers=providers)
+
+    folder = config.FaceAnalysis_get_optimized_model_folder()
+    name = f"{os.path.splitext(os.path.basename(model_file))[0]}.ort{ort.__version__}.onnx"
+    optimized_file = os.path.join(folder, name)
+    options = _copy_session_options(session_options)
+    if config.FaceAnalysis_is_model_memory_shared():
+        # prepacked weights are private copies, the mapped weights are used directly instead
+        options.add_session_config_entry("session.disable_prepacking", "1")
+
+    if os.path.exists(optimized_file) and os.path.getmtime(optimized_file) >= os.path.getmtime(model_file):
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        return ort.InferenceSession(optimized_file, sess_options=options, providers=providers)
+
+    # other processes may start at the same time, so the files are created in a private folder and moved
+    tmp_folder = os.path.join(folder, f"tmp-{os.getpid()}-{threading.get_ident()}")
+    os.makedirs(tmp_folder, exist_ok=True)
+    try:
+        options.optimized_model_filepath = os.path.join(tmp_folder, name)
+        options.add_session_config_entry("session.optimized_model_external_initializers_file_name", name + ".data")
+        options.add_session_config_entry("session.optimized_model_external_initializers_min_size_in_bytes", "1024")
+        session = ort.InferenceSession(model_file, sess_options=options, providers=providers)
+        # the model references the data file, so the data file must be in place first
+        if os.path.exists(os.path.join(tmp_folder, name + ".data")):
+            os.replace(os.path.join(tmp_folder, name + ".data"), optimized_file + ".data")
+        os.replace(os.path.join(tmp_folder, name), optimized_file)
+        logger.info("Optimized model saved to %s", optimized_file)
+        return session
+    finally:
+        for file in glob.glob(os.path.join(tmp_folder, "*")): os.remove(file)
+        os.rmdir(tmp_folder)
+
+def _find_detector_model_file():
+    """Returns the detection model of insightface buffalo_sc, None if it is not downloaded yet."""
+    files = glob.glob(os.path.join(os.path.expanduser("~/.insightface/models/buffalo_sc"), "det_*.onnx"))
+    return files[0] if len(files) > 0 else None
+
+# smallest face in pixels of the detector input which is detected reliably (anchors of stride 8)
+MIN_DETECTABLE_FACE = 20
+# the coarse pass should find any candidate, the fine pass decides
+COARSE_DETECTION_THRESHOLD = 0.3
+
+def get_detection_size(width: int, height: int, long_side: int):
+    """Detector input size with the aspect ratio of the image, the longer side is limited to long_side.
+
+    Both sides are multiples of 32 as required by the detector, small images are not enlarged.
+    """
+    image_long_side = max(width, height)
+    long_side = max(32, min(long_side, -(-image_long_side // 32) * 32))
+    scale = long_side / image_long_side
+    return (max(32, round(width * scale / 32) * 32), max(32, round(height * scale / 32) * 32))
+
 class FaceAnalyzer:
-    def __init__(self):
+    def __init__(self, session_options=None):
         logger.debug("Initializing FaceAnalyzer")
         #https://github.com/onnx/models/blob/main/validated/vision/body_analysis/emotion
         # _ferplus/model/emotion-ferplus-2.onnx
@@ -21,30 +110,98 @@ class FaceAnalyzer:
         #providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
         providers = ['CPUExecutionProvider']
         try:
+            start = time.perf_counter()
             #https://github.com/onnx/models/tree/main/validated/vision/body_analysis/age_gender
-            self.age_classifier = ort.InferenceSession(config.get_modelfile_onnx_age_googlenet(),  providers=providers)    #emotions
-            self.gender_classifier = ort.InferenceSession(config.get_modelfile_onnx_gender_googlenet(),  providers=providers)
+            # the fused model (see onnx_fusion) runs age and gender with one session call
+            self.age_gender_classifier = None
+            self.age_classifier = None
+            self.gender_classifier = None
+            if os.path.exists(config.get_modelfile_onnx_age_gender_googlenet()):
+                self.age_gender_classifier = create_session(config.get_modelfile_onnx_age_gender_googlenet(), session_options, providers)
+                logger.debug("Using fused age and gender model")
+            else:
+                self.age_classifier = create_session(config.get_modelfile_onnx_age_googlenet(), session_options, providers)    #emotions
+                self.gender_classifier = create_session(config.get_modelfile_onnx_gender_googlenet(), session_options, providers)
+            classifier_time = time.perf_counter() - start
 
-            self.face_detector = FaceAnalysis(name="buffalo_sc", providers=providers)  # https://github.com/deepinsight/insightface/tree/master/model_zoo
-            self.face_detector.prepare(ctx_id=self.ctx_id, det_size=(512,512))
-            logger.debug("FaceAnalyzer ONNX initialization done")
+            # only the boxes are used, so only the detection model of buffalo_sc is loaded
+            # https://github.com/deepinsight/insightface/tree/master/model_zoo
+            detector_file = _find_detector_model_file()
+            if detector_file is None:
+                # first start, insightface downloads the models
+                FaceAnalysis(name="buffalo_sc", allowed_modules=["detection"], providers=providers)
+                detector_file = _find_detector_model_file()
+            self.det_model = SCRFD(model_file=detector_file, session=create_session(detector_file, session_options, providers))
+            # ctx_id>=0 keeps the session, a negative ctx_id would recreate it only to set the CPU provider again
+            self.det_model.prepare(0, input_size=(512,512), det_thresh=0.5)
+            logger.info("FaceAnalyzer ready in %.2fs (classifier %.2fs, detector %.2fs, optimized model cache %s)",
+                        time.perf_counter() - start, classifier_time, time.perf_counter() - start - classifier_time,
+                        "on" if config.FaceAnalysis_is_optimized_model_cache_enabled() else "off")
         except Exception as e:
             logger.error("Error while initializing FaceAnalyzer: %s", str(e))
             logger.debug("Exception details:", exc_info=True)
 
-    def _run_classifier(self, classifier, face_only_image):
-        image = cv2.cvtColor(face_only_image, cv2.COLOR_BGR2RGB)
-        image = cv2.resize(image, (224, 224))
-        image_mean = np.array([104, 117, 123])
-        image = image - image_mean
-        image = np.transpose(image, [2, 0, 1])
-        image = np.expand_dims(image, axis=0)
-        image = image.astype(np.float32)
-        input_name = classifier.get_inputs()[0].name
-        values = classifier.run(None, {input_name: image})
-        return values
-    
-    def _get_age(self, face_only_image):
+    def _detect_faces(self, cv2_image: np.ndarray) -> np.ndarray:
+        """Returns the boxes (x1, y1, x2, y2, score) of the faces, largest and most centered first."""
+        detector = self.det_model
+        max_faces = config.FaceAnalysis_get_max_faces()
+        if not config.FaceAnalysis_is_adaptive_detection_enabled():
+            bboxes, _ = detector.detect(cv2_image, max_num=max_faces)
+            return bboxes
+
+        # the smallest expected face must have a detectable size in the detector input
+        height, width = cv2_image.shape[:2]
+        fine_long_side = math.ceil(MIN_DETECTABLE_FACE / config.FaceAnalysis_get_min_face_size())
+        det_size = get_detection_size(width, height, fine_long_side)
+        coarse_size = get_detection_size(width, height, config.FaceAnalysis_get_coarse_detection_size())
+        if config.FaceAnalysis_is_coarse_detection_enabled() and max(coarse_size) < max(det_size):
+            # analyzers are used by one thread at a time (see FaceAnalyzerPool), so the threshold can be changed
+            threshold = detector.det_thresh
+            detector.det_thresh = COARSE_DETECTION_THRESHOLD
+            try:
+                bboxes, _ = detector.detect(cv2_image, input_size=coarse_size, max_num=max_faces)
+            finally:
+                detector.det_thresh = threshold
+            if len(bboxes) == 0:
+                return bboxes
+        bboxes, _ = detector.detect(cv2_image, input_size=det_size, max_num=max_faces)
+        return bboxes
+
+    # input size and channel means (BGR) of the age and gender models
+    _INPUT_SIZE = 224
+    _IMAGE_MEAN = np.array([104, 117, 123], dtype=np.float32).reshape(3, 1, 1)
+
+    def _preprocess_faces(self, face_only_images: list) -> np.ndarray:
+        """Prepares all faces once as one NCHW float32 batch, which is used by the age and gender model."""
+        batch = np.empty((len(face_only_images), 3, self._INPUT_SIZE, self._INPUT_SIZE), dtype=np.float32)
+        for i, face_only_image in enumerate(face_only_images):
+            image = cv2.resize(face_only_image, (self._INPUT_SIZE, self._INPUT_SIZE))
+            # RGB -> BGR and HWC -> CHW in one view, the mean is subtracted directly into the batch
+            np.subtract(image[:, :, ::-1].transpose(2, 0, 1), self._IMAGE_MEAN, out=batch[i])
+        return batch
+
+    def _run_classifier(self, classifier, batch: np.ndarray, output_names: list = None) -> list:
+        """Runs the classifier once for the whole batch, models with a fixed batch size of 1 are run per face.
+
+        The single googlenet models have a batch size of 1, the fused model (see onnx_fusion) a dynamic one.
+        """
+        input = classifier.get_inputs()[0]
+        if input.shape[0] == 1 and len(batch) > 1:
+            rows = [classifier.run(output_names, {input.name: batch[i:i+1]}) for i in range(len(batch))]
+            return [np.concatenate(values) for values in zip(*rows)]
+        return classifier.run(output_names, {input.name: batch})
+
+    def _classify(self, batch: np.ndarray):
+        """Returns the gender and the age scores of all faces of the batch."""
+        if self.age_gender_classifier is not None:
+            age_scores, gender_scores = self._run_classifier(self.age_gender_classifier, batch, ["age", "gender"])
+        else:
+            gender_scores = self._run_classifier(self.gender_classifier, batch)[0]
+            age_scores = self._run_classifier(self.age_classifier, batch)[0]
+        return gender_scores, age_scores
+
+    def _get_ages(self, age_scores: np.ndarray) -> list:
+        """Returns age text, min and max age for each face."""
         #def ageClassifier(orig_image):
         # Start from ORT 1.10, ORT requires explicitly setting the providers parameter if you want to use execution providers
         # other than the default CPU provider (as opposed to the previous behavior of providers getting set/registered by default
@@ -55,33 +212,30 @@ class FaceAnalyzer:
         maxAgeList=[2, 6, 12, 20, 32, 43, 53, 100]
         minAgeList=[0, 4, 8, 15, 25, 38, 48, 60]
 
-        ages = self._run_classifier(self.age_classifier, face_only_image)
-
-        age = ageList[ages[0].argmax()]
-        maxAge = maxAgeList[ages[0].argmax()]
-        minAge = minAgeList[ages[0].argmax()]
-        return age, minAge, maxAge
+        return [(ageList[i], minAgeList[i], maxAgeList[i]) for i in age_scores.argmax(axis=1)]
 
     # gender classification method
-    def _is_male(self, face_only_image):
+    def _get_genders(self, gender_scores: np.ndarray) -> list:
+        """Returns gender text and if it is male for each face."""
         gender_text=['Male','Female']
         gender_male=[True,False]
 
-        genders = self._run_classifier(self.gender_classifier, face_only_image)
-
-        gender = gender_text[genders[0].argmax()]
-        isMale = gender_male[genders[0].argmax()]
-        return gender, isMale
+        return [(gender_text[i], gender_male[i]) for i in gender_scores.argmax(axis=1)]
 
-    def get_gender_and_age_from_image(self, pil_image: Image):
-        """ return values are a list of dictionaries. if len=0, then no face was detected"""
+    def get_gender_and_age_from_image(self, pil_image: Image, raise_errors: bool = False):
+        """ return values are a list of dictionaries. if len=0, then no face was detected
+        errors are logged and return an empty list, with raise_errors they are raised (e.g. to not cache a failed analysis)"""
         retVal = []
         try:
-            # reduce size if it is a big image to process it faster
+            # reduce size if it is a big image to process it faster, uploads are already reduced by ingest
+            # the image of the caller is not changed, other stages of the upload use it at the same time
             max_size = config.get_max_size()
-            pil_image.thumbnail((max_size, max_size))
-            # correct EXIF-Orientation!! very important
-            pil_image = ImageOps.exif_transpose(pil_image)
+            if max(pil_image.size) > max_size:
+                pil_image = pil_image.copy()
+                pil_image.thumbnail((max_size, max_size))
+            # correct EXIF-Orientation!! very important (ingest applied it already to uploads)
+            if pil_image.getexif().get(0x0112, 1) != 1:
+                pil_image = ImageOps.exif_transpose(pil_image)
             # face analysis needs a base RGB format
             cv2_image = np.array(pil_image.convert("RGB"))
 
@@ -92,18 +246,26 @@ class FaceAnalyzer:
                 cv2_image = cv2.cvtColor(cv2_image, cv2.COLOR_GRAY2BGR)
 
             #size = scaling to for face detection (smaller = faster)
-            #if size is bigger then the image size, we got no detection so 512x512 is fine
-            faces = self.face_detector.get(cv2_image)
+            #the size is selected by the image size and the expected face size, see _detect_faces
+            bboxes = self._detect_faces(cv2_image)
 
-            for face in faces:
-                #print ("Face bbox", face['bbox'])
-                x1, y1, x2, y2 = map(int, face.bbox)
-                cropped_face = cv2_image[y1:y2, x1:x2]
+            cropped_faces = []
+            height, width = cv2_image.shape[:2]
+            for bbox in bboxes:
+                #print ("Face bbox", bbox)
+                x1, y1, x2, y2 = map(int, bbox[:4])
+                # boxes of faces at the border can be outside of the image
+                x1, y1, x2, y2 = max(x1, 0), max(y1, 0), min(x2, width), min(y2, height)
+                if x2 <= x1 or y2 <= y1: continue
+                cropped_faces.append(cv2_image[y1:y2, x1:x2])
                 #cv2.imwrite(img=cropped_face, filename=f"./models/face_{x1}.jpg")
 
-                gender_name, isMale = self._is_male(cropped_face)
-                age, minAge, maxAge = self._get_age(cropped_face)
+            if len(cropped_faces) == 0: return retVal
+            gender_scores, age_scores = self._classify(self._preprocess_faces(cropped_faces))
+            genders = self._get_genders(gender_scores)
+            ages = self._get_ages(age_scores)
 
+            for (gender_name, isMale), (age, minAge, maxAge) in zip(genders, ages):
                 retVal.append({
                     "age": age,
                     "minAge": minAge,
@@ -115,6 +277,89 @@ class FaceAnalyzer:
                 })
             logger.debug("Detected Age and Gender: %s", retVal)
         except Exception as e:
+            if raise_errors: raise
             logger.error("Error while detecting face: %s", str(e))
             logger.debug("Exception details:", exc_info=True)
         return retVal
+
+
+class FaceAnalyzerPool:
+    """Pool of face analyzers, each analyzer is used by one thread at a time.
+
+    Analyzers are created on demand up to the pool size. If all analyzers are in use,
+    checkout waits until one is returned, the waiting time is collected in the stats.
+    """
+
+    def __init__(self, size: int, intra_op_threads: int = 1, inter_op_threads: int = 1):
+        self.size = max(1, size)
+        self._session_options = _create_session_options(intra_op_threads, inter_op_threads)
+        # last returned analyzer first, its memory is most likely still in the cache
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "max_wait_seconds": 0.0
+        }
+
+    def checkout(self, timeout: float = None) -> FaceAnalyzer:
+        """Get an analyzer for exclusive use, raises queue.Empty if none is returned within the timeout."""
+        try:
+            analyzer = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._created < self.size
+                if create: self._created += 1
+            if create:
+                logger.debug("Creating face analyzer %i of %i", self._created, self.size)
+                return self._count_checkout(FaceAnalyzer(self._session_options), 0.0)
+            start = time.perf_counter()
+            analyzer = self._idle.get(timeout=timeout)
+            return self._count_checkout(analyzer, time.perf_counter() - start)
+        return self._count_checkout(analyzer, 0.0)
+
+    def warm_up(self):
+        """Creates the first analyzer, so that the first upload does not wait for the model loading."""
+        with self.analyzer():
+            pass
+
+    def checkin(self, analyzer: FaceAnalyzer):
+        """Return an analyzer after use."""
+        self._idle.put(analyzer)
+
+    @contextmanager
+    def analyzer(self, timeout: float = None):
+        """Checkout an analyzer for the with block."""
+        analyzer = self.checkout(timeout)
+        try:
+            yield analyzer
+        finally:
+            self.checkin(analyzer)
+
+    def get_stats(self) -> dict:
+        """Get the counters of the pool including the mean waiting time for an analyzer."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = self.size
+            stats["created"] = self._created
+        stats["in_use"] = stats["created"] - self._idle.qsize()
+        stats["mean_wait_seconds"] = stats["wait_seconds"] / stats["checkouts"] if stats["checkouts"] > 0 else 0.0
+        return stats
+
+    def _count_checkout(self, analyzer: FaceAnalyzer, wait: float) -> FaceAnalyzer:
+        with self._lock:
+            self._stats["checkouts"] += 1
+            if wait > 0:
+                self._stats["waits"] += 1
+                self._stats["wait_seconds"] += wait
+                self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], wait)
+        if wait > 0:
+            logger.debug("Waited %.3fs for a face analyzer", wait)
+        if self._stats["checkouts"] % 100 == 0:
+            stats = self.get_stats()
+            logger.info("Face analyzer pool: %i/%i created, %i checkouts, %i waits, %.3fs mean wait, %.3fs max wait",
+                        stats["created"], stats["size"], stats["checkouts"], stats["waits"],
+                        stats["mean_wait_seconds"], stats["max_wait_seconds"])
+        return analyzer
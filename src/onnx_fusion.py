@@ -0,0 +1,152 @@
+import os
+import logging
+import src.config as config
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# name of the shared input of a fused model
+FUSED_INPUT_NAME = "input"
+# name of the batch dimension of a fused model with a dynamic batch size
+BATCH_DIMENSION = "batch"
+
+def fuse_classifiers(model_files: dict, output_file: str, dynamic_batch: bool = True):
+    """Merges classifiers with the same input into one model with one input and one output per classifier.
+
+    Args:
+        model_files (dict): output name: model file, e.g. {"age": "age.onnx", "gender": "gender.onnx"}
+        output_file (str): file of the fused model, written atomically
+        dynamic_batch (bool): models exported with a batch size of 1 (like the googlenet age and gender
+            models) get a dynamic batch size, so all faces are classified in one run, see _make_batch_dynamic
+
+    Raises:
+        ValueError: if the models have not exactly one and the same input or use different opsets
+    """
+    # onnx is only required to build the model, not to run it
+    import onnx
+    from onnx import compose, helper
+
+    nodes, initializers, value_infos, outputs = [], [], [], []
+    shared_input = None
+    opsets = {}
+    ir_version = 4  # initializers must not be graph inputs anymore
+    for name, model_file in model_files.items():
+        model = compose.add_prefix(onnx.load(model_file), prefix=f"{name}_")
+        graph = model.graph
+        initializer_names = {initializer.name for initializer in graph.initializer}
+        inputs = [input for input in graph.input if input.name not in initializer_names]
+        if len(inputs) != 1 or len(graph.output) != 1:
+            raise ValueError(f"{model_file} must have exactly one input and one output")
+
+        if shared_input is None:
+            shared_input = onnx.ValueInfoProto()
+            shared_input.CopyFrom(inputs[0])
+            shared_input.name = FUSED_INPUT_NAME
+        elif shared_input.type != inputs[0].type:
+            raise ValueError(f"Input of {model_file} differs from the input of the other models")
+
+        for opset in model.opset_import:
+            if opsets.get(opset.domain, opset.version) != opset.version:
+                raise ValueError(f"{model_file} uses opset {opset.version}, other models use {opsets[opset.domain]}")
+            opsets[opset.domain] = opset.version
+        ir_version = max(ir_version, model.ir_version)
+
+        for node in graph.node:
+            node.input[:] = [FUSED_INPUT_NAME if i == inputs[0].name else i for i in node.input]
+        nodes.extend(graph.node)
+        # stable output names independent from the names in the source models
+        nodes.append(helper.make_node("Identity", [graph.output[0].name], [name], name=f"{name}_output"))
+        output = onnx.ValueInfoProto()
+        output.CopyFrom(graph.output[0])
+        output.name = name
+        outputs.append(output)
+        initializers.extend(graph.initializer)
+        value_infos.extend(graph.value_info)
+
+    graph = helper.make_graph(nodes, "fused_classifiers", [shared_input], outputs, initializer=initializers, value_info=value_infos)
+    if dynamic_batch: _make_batch_dynamic(graph)
+    fused = helper.make_model(graph, opset_imports=[helper.make_opsetid(domain, version) for domain, version in opsets.items()])
+    fused.ir_version = ir_version
+    onnx.checker.check_model(fused)
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    tmp_file = output_file + ".tmp"
+    onnx.save(fused, tmp_file)
+    os.replace(tmp_file, output_file)
+
+def _make_batch_dynamic(graph):
+    """Replaces a fixed batch size of 1 of the input and the outputs by a dynamic dimension.
+
+    Reshape nodes with a constant shape starting with 1 (e.g. [1, 1024] before a fully connected
+    layer) keep the batch size of their input with 0 instead. The shapes of the intermediate
+    values are removed, they are inferred again when the model is loaded.
+    """
+    from onnx import numpy_helper
+
+    for value in list(graph.input) + list(graph.output):
+        dims = value.type.tensor_type.shape.dim
+        if len(dims) > 0 and dims[0].HasField("dim_value") and dims[0].dim_value == 1:
+            dims[0].dim_param = BATCH_DIMENSION
+    del graph.value_info[:]
+
+    initializers = {initializer.name: initializer for initializer in graph.initializer}
+    for node in graph.node:
+        if node.op_type != "Reshape" or node.input[1] not in initializers: continue
+        initializer = initializers[node.input[1]]
+        shape = numpy_helper.to_array(initializer).copy()
+        if len(shape) > 1 and shape[0] == 1:
+            shape[0] = 0
+            initializer.CopyFrom(numpy_helper.from_array(shape, initializer.name))
+
+def _supports_batch(model_file: str, batch_size: int = 2) -> bool:
+    """Check that the model runs with a batch of more than one input, True if onnxruntime is not installed."""
+    try:
+        import numpy as np
+        import onnxruntime as ort
+    except ImportError:
+        return True
+    try:
+        session = ort.InferenceSession(model_file, providers=["CPUExecutionProvider"])
+        input = session.get_inputs()[0]
+        shape = [batch_size] + [dim if isinstance(dim, int) else 1 for dim in input.shape[1:]]
+        outputs = session.run(None, {input.name: np.zeros(shape, dtype=np.float32)})
+        return all(len(output) == batch_size for output in outputs)
+    except Exception as e:
+        logger.debug("Model %s does not support a batch of %i inputs: %s", model_file, batch_size, str(e))
+        return False
+
+def build_age_gender_model(force: bool = False) -> bool:
+    """Creates the fused age and gender model from the single models if it does not exist yet.
+
+    Args:
+        force (bool, optional): rebuild an existing model. Defaults to False.
+
+    Returns:
+        bool: True if the fused model exists afterwards, False otherwise
+    """
+    fused_file = config.get_modelfile_onnx_age_gender_googlenet()
+    # models of former versions have a fixed batch size and are built again
+    if os.path.exists(fused_file) and not force and _supports_batch(fused_file): return True
+    try:
+        import onnx
+    except ImportError:
+        if os.path.exists(fused_file): return True
+        logger.info("Package onnx is not installed, age and gender models are used separately")
+        return False
+
+    try:
+        model_files = {
+                "age": config.get_modelfile_onnx_age_googlenet(),
+                "gender": config.get_modelfile_onnx_gender_googlenet()
+            }
+        fuse_classifiers(model_files, fused_file)
+        if not _supports_batch(fused_file):
+            # a node of the models depends on the batch size of 1, all faces are classified one by one
+            logger.warning("Fused age and gender model does not support a dynamic batch size, faces are classified one by one")
+            fuse_classifiers(model_files, fused_file, dynamic_batch=False)
+        logger.info("Fused age and gender model saved to %s", fused_file)
+        return True
+    except Exception as e:
+        logger.error("Error while fusing age and gender model: %s", str(e))
+        logger.debug("Exception details:", exc_info=True)
+        return False
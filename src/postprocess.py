@@ -0,0 +1,86 @@
+import logging
+import queue
+import threading
+import time
+import src.config as config
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# the work after a generation (encoding, saving the output, analytics) runs in this stage, so the
+# generation slot (gpu_queue) is free for the next job while the result is written.
+# The queue is bounded: if the stage falls behind, submit blocks the generation handler until a
+# job is done, so the next generation waits instead of filling the memory with results.
+
+# log a warning if a generation waits longer for the stage
+_BACKPRESSURE_WARNING_SECONDS = 1.0
+
+_lock = threading.Lock()
+_queue = None
+_workers = []
+_stats = {"submitted": 0, "processed": 0, "errors": 0, "blocked": 0, "blocked_seconds": 0.0, "max_queued": 0}
+
+def _start():
+    """Creates the queue and the worker threads on first use, the lock must be held."""
+    global _queue
+    if _queue is not None: return
+    _queue = queue.Queue(maxsize=config.GenAI_get_postprocess_queue_size())
+    for i in range(config.GenAI_get_postprocess_workers()):
+        worker = threading.Thread(target=_work, args=(_queue,), name=f"postprocess-{i}", daemon=True)
+        worker.start()
+        _workers.append(worker)
+    logger.debug("Post-processing stage started with %i worker(s)", len(_workers))
+
+def _work(jobs: queue.Queue):
+    while True:
+        fn, args, kwargs = jobs.get()
+        try:
+            fn(*args, **kwargs)
+            with _lock:
+                _stats["processed"] += 1
+        except Exception as e:
+            with _lock:
+                _stats["errors"] += 1
+            logger.error("Error in post-processing: %s", str(e))
+            logger.debug("Exception details:", exc_info=True)
+        finally:
+            jobs.task_done()
+
+def submit(fn, *args, **kwargs):
+    """Runs fn in the post-processing stage, blocks while the queue is full (backpressure).
+
+    The arguments must not be changed by the caller afterwards.
+    """
+    with _lock:
+        _start()
+        _stats["submitted"] += 1
+    start = time.perf_counter()
+    try:
+        _queue.put_nowait((fn, args, kwargs))
+    except queue.Full:
+        _queue.put((fn, args, kwargs))
+        blocked = time.perf_counter() - start
+        with _lock:
+            _stats["blocked"] += 1
+            _stats["blocked_seconds"] += blocked
+        if blocked > _BACKPRESSURE_WARNING_SECONDS:
+            logger.warning("Post-processing falls behind, generation waited %.1f s", blocked)
+    with _lock:
+        _stats["max_queued"] = max(_stats["max_queued"], _queue.qsize())
+
+def flush(timeout: float = None) -> bool:
+    """Waits until all submitted jobs are done, returns False on timeout."""
+    with _lock:
+        if _queue is None: return True
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _queue.all_tasks_done:
+        while _queue.unfinished_tasks > 0:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0: return False
+            _queue.all_tasks_done.wait(remaining)
+    return True
+
+def get_stats() -> dict:
+    """Returns the counters of the stage and the number of queued jobs."""
+    with _lock:
+        return dict(_stats, queued=0 if _queue is None else _queue.qsize())
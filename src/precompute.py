@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import time
+from datetime import date
+from PIL import Image
+import src.config as config
+import src.analytics as analytics
+import src.AI as AI
+from src.background import PRIORITY_PRECOMPUTE
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# owner of all precomputation jobs in the background generator
+OWNER = "precompute"
+# seconds between two checks if the server is idle
+POLL_INTERVAL = 10
+
+_thread = None
+_stop_event = threading.Event()
+_descriptions = {}          # SHA1: description used for the precomputed results
+_description_seconds = 0.0  # compute time used to describe images
+_budget_day = None
+_budget_start = 0.0         # compute time used before the current day
+
+def get_description(sha1: str) -> str:
+    """Get the description used to precompute the image, empty if the image is not precomputed."""
+    return _descriptions.get(sha1, "")
+
+def start(generator, submit) -> bool:
+    """Starts the precomputation of the most uploaded images while the server is idle.
+
+    Args:
+        generator (BackgroundGenerator): runs the jobs and tells if the server is idle
+        submit (callable): queues the generation of one style, see UI.submit_style_generation
+
+    Returns:
+        bool: True if the precomputation is running or not enabled, False otherwise
+    """
+    global _thread
+    if not config.GenAI_is_idle_precompute_enabled(): return True
+    if not config.is_analytics_enabled() or not config.is_input_cache_enabled():
+        logger.warning("Idle precomputation requires analytics and the input cache, precomputation not started")
+        return False
+    if _thread is not None: return True
+
+    _stop_event.clear()
+    _thread = threading.Thread(target=_run, args=(generator, submit), name="IdlePrecompute", daemon=True)
+    _thread.start()
+    logger.info("Idle precomputation started for the top %i images with a budget of %is per day",
+                config.GenAI_get_precompute_top_n(), config.GenAI_get_precompute_daily_budget())
+    return True
+
+def stop():
+    """Stops the precomputation, a running job is finished by the background generator."""
+    global _thread
+    _stop_event.set()
+    _thread = None
+
+def get_remaining_budget(generator) -> float:
+    """Get the compute time in seconds which is left for today."""
+    global _budget_day, _budget_start
+    used = generator.get_compute_seconds(OWNER) + _description_seconds
+    if _budget_day != date.today():
+        _budget_day = date.today()
+        _budget_start = used
+    return config.GenAI_get_precompute_daily_budget() - (used - _budget_start)
+
+def _load_input(cache_path: str):
+    """Load an image of the input cache, None if it is not in the cache anymore."""
+    path = os.path.join(config.get_output_folder(), cache_path)
+    if not os.path.exists(path): return None
+    with Image.open(path) as image:
+        return image.convert("RGB")
+
+def _describe(sha1: str, image) -> str:
+    global _description_seconds
+    description = _descriptions.get(sha1)
+    if description: return description
+    start_time = time.perf_counter()
+    description = "ai deactivated" if config.SKIP_AI else AI.describe_image(image)
+    _description_seconds += time.perf_counter() - start_time
+    _descriptions[sha1] = description
+    return description
+
+def precompute_next(generator, submit) -> bool:
+    """Queue the next missing generation of the most uploaded images, returns False if nothing is missing."""
+    inputs = analytics.get_top_uploaded_inputs(config.GenAI_get_precompute_top_n())
+
+    # forget images which are not popular anymore
+    popular = {sha1 for sha1, _ in inputs}
+    for sha1 in list(_descriptions.keys()):
+        if sha1 not in popular: del _descriptions[sha1]
+
+    for sha1, cache_path in inputs:
+        image = _load_input(cache_path)
+        if image is None: continue
+        description = _describe(sha1, image)
+        for i in range(1, config.get_style_count() + 1):
+            style = config.get_style_name(i)
+            # already queued or finished styles are rejected
+            if submit(OWNER, image, sha1, description, style, priority=PRIORITY_PRECOMPUTE):
+                logger.debug("Precomputing %s for %s", style, sha1)
+                return True
+    return False
+
+def _run(generator, submit):
+    while not _stop_event.wait(POLL_INTERVAL):
+        try:
+            # user generations and other background jobs always win
+            if not generator.is_idle(): continue
+            if get_remaining_budget(generator) <= 0: continue
+            precompute_next(generator, submit)
+        except Exception as e:
+            logger.error("Error in idle precomputation: %s", str(e))
+            logger.debug("Exception details:", exc_info=True)
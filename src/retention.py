@@ -0,0 +1,181 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import src.config as config
+import src.content_store as content_store
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# uploads and results are removed from the output folder by the index of the content store, so a
+# run does not walk the folder: the size of all files is a sum in the index and the files to remove
+# are the first rows of an ordered query. Each run checks a part of the index for files which were
+# removed by hand (incremental scan), so the index follows the disk without a full scan.
+
+# index entries checked for missing files per run
+SCAN_BATCH = 1000
+# files removed per query, the run stops between two batches if the app is stopped
+REMOVE_BATCH = 200
+# seconds between two checks if the server is idle
+POLL_INTERVAL = 10
+
+_lock = threading.Lock()
+_thread = None
+_stop_event = threading.Event()
+_scan_rowid = 0  # last checked entry of the index
+_stats = {"runs": 0, "removed": 0, "reclaimed_bytes": 0, "missing": 0, "delivered_removed": 0, "last_run": None}
+
+def is_enabled() -> bool:
+    """Check if any limit of the retention is set."""
+    return (config.Retention_get_max_size_mb() > 0 or config.Retention_get_max_age_days() > 0
+            or config.Retention_get_min_free_mb() > 0)
+
+def start(generator=None, delivery_folder: str = None) -> bool:
+    """Starts the retention in the background, it runs while the generator is idle.
+
+    Args:
+        generator (BackgroundGenerator): runs are skipped while it has jobs, None = always run
+        delivery_folder (str): folder of the results sent to the browser, pruned by Retention/delivery_max_age_minutes
+
+    Returns:
+        bool: True if started or disabled, False otherwise
+    """
+    global _thread
+    prune_delivery = delivery_folder is not None and config.Retention_get_delivery_max_age_minutes() > 0
+    if not is_enabled() and not prune_delivery: return True
+    if _thread is not None: return True
+
+    _stop_event.clear()
+    _thread = threading.Thread(target=_run, args=(generator, delivery_folder if prune_delivery else None), name="Retention", daemon=True)
+    _thread.start()
+    logger.info("Retention started (max %i MB, max %i days, min free %i MB, delivered results %i minutes)", config.Retention_get_max_size_mb(),
+                config.Retention_get_max_age_days(), config.Retention_get_min_free_mb(), config.Retention_get_delivery_max_age_minutes())
+    return True
+
+def stop():
+    """Stops the retention after the current batch."""
+    global _thread
+    _stop_event.set()
+    _thread = None
+
+def run_once(root: str = None) -> int:
+    """Removes the files above the limits of the configuration from the output folder (root).
+
+    Returns:
+        int: the reclaimed bytes
+    """
+    global _scan_rowid
+    start = time.perf_counter()
+    root = root or config.get_output_folder()
+    if not os.path.isdir(root): return 0
+
+    _scan_rowid, missing = content_store.verify(_scan_rowid, SCAN_BATCH, root)
+    removed = reclaimed = 0
+    # files which could not be removed stay in the index, they are not queried again in this run
+    skipped = set()
+
+    max_age_days = config.Retention_get_max_age_days()
+    while max_age_days > 0 and not _stop_event.is_set():
+        limit = REMOVE_BATCH + len(skipped)
+        expired = content_store.get_expired(max_age_days, limit, root)
+        for path, _ in expired:
+            if path in skipped: continue
+            freed = content_store.remove(path, root)
+            if freed is None:
+                skipped.add(path)
+                continue
+            reclaimed += freed
+            removed += 1
+        if len(expired) < limit: break
+
+    # the size limit counts the files in the index, the free space only the bytes given back by the disk
+    # (a result which is still linked to the delivery folder frees nothing, see prune_delivery)
+    over_size, below_free = _get_bytes_to_remove(root)
+    while (over_size > 0 or below_free > 0) and not _stop_event.is_set():
+        files = [file for file in content_store.get_least_valuable(REMOVE_BATCH + len(skipped), root) if file[0] not in skipped]
+        if len(files) == 0:
+            logger.warning("Retention can not free %.1f MB, no more files in the output folder", max(over_size, below_free) / 1024 / 1024)
+            break
+        for path, size in files:
+            freed = content_store.remove(path, root)
+            if freed is None:
+                skipped.add(path)
+                continue
+            reclaimed += freed
+            removed += 1
+            over_size -= size or 0
+            below_free -= freed
+            if over_size <= 0 and below_free <= 0: break
+
+    with _lock:
+        _stats["runs"] += 1
+        _stats["removed"] += removed
+        _stats["reclaimed_bytes"] += reclaimed
+        _stats["missing"] += missing
+        _stats["last_run"] = time.time()
+    if removed > 0 or missing > 0:
+        logger.info("Retention removed %i files (%.1f MB reclaimed) and %i missing files from the index in %.1fs",
+                    removed, reclaimed / 1024 / 1024, missing, time.perf_counter() - start)
+    return reclaimed
+
+def prune_delivery(folder: str) -> int:
+    """Removes the results sent to the browser before Retention/delivery_max_age_minutes from folder.
+
+    Results are hard linked from there into the output folder, so their space is only given back
+    after both files are removed.
+
+    Returns:
+        int: the number of removed files
+    """
+    max_age_minutes = config.Retention_get_delivery_max_age_minutes()
+    if max_age_minutes <= 0 or not os.path.isdir(folder): return 0
+    removed_before = time.time() - max_age_minutes * 60
+    removed = 0
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < removed_before:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError as e:
+                logger.error("Error while removing delivered result %s: %s", entry.path, str(e))
+                logger.debug("Exception details:", exc_info=True)
+    with _lock:
+        _stats["delivered_removed"] += removed
+    if removed > 0:
+        logger.info("Retention removed %i delivered results older than %i minutes", removed, max_age_minutes)
+    return removed
+
+def get_stats() -> dict:
+    """Returns the removed files and reclaimed bytes since the start."""
+    with _lock:
+        return dict(_stats)
+
+def _get_bytes_to_remove(root: str):
+    """Returns the bytes above the size limit and the bytes missing to the free space, 0 if the limit is not set."""
+    over_size = below_free = 0
+    max_size_mb = config.Retention_get_max_size_mb()
+    if max_size_mb > 0:
+        used = sum(kind["bytes"] for kind in content_store.get_stats(root).values())
+        over_size = used - max_size_mb * 1024 * 1024
+    min_free_mb = config.Retention_get_min_free_mb()
+    if min_free_mb > 0:
+        below_free = min_free_mb * 1024 * 1024 - shutil.disk_usage(root).free
+    return over_size, below_free
+
+def _run(generator, delivery_folder: str):
+    next_run = 0.0
+    while not _stop_event.wait(POLL_INTERVAL):
+        try:
+            if time.monotonic() < next_run: continue
+            # generations always win
+            if generator is not None and not generator.is_idle(): continue
+            # first, so the results of the output folder are not linked anymore
+            if delivery_folder is not None: prune_delivery(delivery_folder)
+            if is_enabled(): run_once()
+            next_run = time.monotonic() + config.Retention_get_interval_minutes() * 60
+        except Exception as e:
+            logger.error("Error in retention: %s", str(e))
+            logger.debug("Exception details:", exc_info=True)
@@ -0,0 +1,326 @@
+import heapq
+import json
+import logging
+import os
+import sqlite3
+import threading
+from threading import Lock
+import src.config as config
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# the credit balances of the sessions (token_ledger) and the locks of uploaded images (token_lock)
+# are kept in a state backend. The memory backend is local to the process, the sqlite backend is
+# shared by all instances of the app on the same host (e.g. behind a load balancer), so credits
+# can not be gained again by uploading the same image to another instance.
+# Times are unix timestamps, so they are comparable between processes.
+
+class MemoryBackend:
+    """State of one process: dicts for balances and locks and a min heap of the lock expiries.
+
+    Heap entries of renewed or removed locks stay in the heap until they are popped or compacted.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._balances = {}  # session: [token, last change]
+        self._locks = {}  # image_sha1: [expiry, details]
+        self._heap = []  # (expiry, image_sha1), least expiry first
+
+    def sync_balance(self, session: str, token: int, now: float) -> int:
+        """Returns the balance of the session, unknown sessions are added with token."""
+        with self._lock:
+            entry = self._balances.get(session)
+            if entry is None:
+                entry = self._balances[session] = [token, now]
+            return entry[0]
+
+    def add_balance(self, session: str, token: int, amount: int, now: float) -> int:
+        """Changes the balance of the session by amount and returns the new balance."""
+        with self._lock:
+            entry = self._balances.setdefault(session, [token, now])
+            entry[0] += amount
+            entry[1] = now
+            return entry[0]
+
+    def try_spend(self, session: str, token: int, amount: int, now: float):
+        """Spends amount if the balance is sufficient.
+
+        Returns:
+            tuple: (True if spent, the balance afterwards)
+        """
+        with self._lock:
+            entry = self._balances.setdefault(session, [token, now])
+            if entry[0] < amount: return False, entry[0]
+            entry[0] -= amount
+            entry[1] = now
+            return True, entry[0]
+
+    def expire_balances(self, changed_before: float) -> int:
+        """Removes the balances not changed since changed_before, returns their number."""
+        with self._lock:
+            expired = [session for session, entry in self._balances.items() if entry[1] < changed_before]
+            for session in expired:
+                del self._balances[session]
+            return len(expired)
+
+    def set_lock(self, image_sha1: str, expiry: float, details: dict, max_entries: int) -> int:
+        """Locks the image until expiry, returns the number of locks removed because the store is full."""
+        with self._lock:
+            return self._add_lock(image_sha1, expiry, details, max_entries)
+
+    def try_lock(self, image_sha1: str, expiry: float, details: dict, now: float, max_entries: int):
+        """Locks the image until expiry if it is not locked, check and lock are one step.
+
+        Returns:
+            tuple: (None if locked by the caller, (expiry, details) of the existing lock otherwise;
+                    the number of locks removed because the store is full)
+        """
+        with self._lock:
+            entry = self._locks.get(image_sha1)
+            if entry is not None and entry[0] > now: return (entry[0], entry[1]), 0
+            return None, self._add_lock(image_sha1, expiry, details, max_entries)
+
+    def get_lock(self, image_sha1: str, now: float):
+        """Returns (expiry, details) of the lock, None if the image is not locked."""
+        with self._lock:
+            entry = self._locks.get(image_sha1)
+            if entry is None or entry[0] <= now: return None
+            return entry[0], entry[1]
+
+    def remove_lock(self, image_sha1: str) -> bool:
+        with self._lock:
+            return self._locks.pop(image_sha1, None) is not None
+
+    def expire_locks(self, now: float) -> int:
+        """Removes the locks expired before now, returns their number."""
+        removed = 0
+        with self._lock:
+            while len(self._heap) > 0 and self._heap[0][0] <= now:
+                expiry, image_sha1 = heapq.heappop(self._heap)
+                entry = self._locks.get(image_sha1)
+                if entry is not None and entry[0] == expiry:
+                    del self._locks[image_sha1]
+                    removed += 1
+        return removed
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._balances), "entries": len(self._locks), "heap": len(self._heap)}
+
+    def clear_balances(self):
+        with self._lock:
+            self._balances.clear()
+
+    def clear_locks(self):
+        with self._lock:
+            self._locks.clear()
+            self._heap.clear()
+
+    def _add_lock(self, image_sha1: str, expiry: float, details: dict, max_entries: int) -> int:
+        """Sets the lock and removes the locks which expire next above max_entries, the lock must be held."""
+        self._locks[image_sha1] = [expiry, details]
+        heapq.heappush(self._heap, (expiry, image_sha1))
+        evicted = 0
+        while len(self._locks) > max_entries and self._pop_lock() is not None:
+            evicted += 1
+        if len(self._heap) > 2 * len(self._locks) + 1024:
+            self._compact()
+        return evicted
+
+    def _pop_lock(self):
+        """Removes the lock which expires next, the lock must be held."""
+        while len(self._heap) > 0:
+            expiry, image_sha1 = heapq.heappop(self._heap)
+            entry = self._locks.get(image_sha1)
+            # skip heap entries of renewed or removed locks
+            if entry is not None and entry[0] == expiry:
+                del self._locks[image_sha1]
+                return image_sha1
+        return None
+
+    def _compact(self):
+        """Rebuilds the heap without the entries of renewed or removed locks, the lock must be held."""
+        self._heap[:] = [(entry[0], image_sha1) for image_sha1, entry in self._locks.items()]
+        heapq.heapify(self._heap)
+
+
+class SQLiteBackend:
+    """State shared by all processes using the same database file (WAL mode).
+
+    Each thread keeps its own connection. Check-and-spend runs in one immediate transaction,
+    so parallel requests of all instances can not spend the same credit twice.
+    """
+
+    # the number of locks is checked after this number of new locks
+    _EVICT_INTERVAL = 100
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._lock = Lock()
+        self._writes = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = self._connect()
+        connection.execute("""
+        CREATE TABLE IF NOT EXISTS tblBalances (
+            Session TEXT NOT NULL PRIMARY KEY,
+            Token INTEGER NOT NULL,
+            Changed REAL NOT NULL
+        );
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS idxBalancesChanged ON tblBalances (Changed);")
+        connection.execute("""
+        CREATE TABLE IF NOT EXISTS tblLocks (
+            SHA1 TEXT NOT NULL PRIMARY KEY,
+            Expiry REAL NOT NULL,
+            Details TEXT NOT NULL
+        );
+        """)
+        connection.execute("CREATE INDEX IF NOT EXISTS idxLocksExpiry ON tblLocks (Expiry);")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Returns the connection of the current thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # autocommit, transactions are started explicitly
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL;")
+            connection.execute("PRAGMA synchronous=NORMAL;")
+            self._local.connection = connection
+        return connection
+
+    def _transaction(self):
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE;")
+        return connection
+
+    def sync_balance(self, session: str, token: int, now: float) -> int:
+        connection = self._transaction()
+        try:
+            connection.execute("INSERT OR IGNORE INTO tblBalances (Session, Token, Changed) VALUES (?, ?, ?)", (session, token, now))
+            balance = connection.execute("SELECT Token FROM tblBalances WHERE Session = ?", (session,)).fetchone()[0]
+            connection.execute("COMMIT;")
+            return balance
+        except Exception:
+            connection.execute("ROLLBACK;")
+            raise
+
+    def add_balance(self, session: str, token: int, amount: int, now: float) -> int:
+        connection = self._transaction()
+        try:
+            connection.execute("INSERT OR IGNORE INTO tblBalances (Session, Token, Changed) VALUES (?, ?, ?)", (session, token, now))
+            balance = connection.execute(
+                "UPDATE tblBalances SET Token = Token + ?, Changed = ? WHERE Session = ? RETURNING Token",
+                (amount, now, session)).fetchone()[0]
+            connection.execute("COMMIT;")
+            return balance
+        except Exception:
+            connection.execute("ROLLBACK;")
+            raise
+
+    def try_spend(self, session: str, token: int, amount: int, now: float):
+        connection = self._transaction()
+        try:
+            connection.execute("INSERT OR IGNORE INTO tblBalances (Session, Token, Changed) VALUES (?, ?, ?)", (session, token, now))
+            row = connection.execute(
+                "UPDATE tblBalances SET Token = Token - ?, Changed = ? WHERE Session = ? AND Token >= ? RETURNING Token",
+                (amount, now, session, amount)).fetchone()
+            if row is None:
+                result = False, connection.execute("SELECT Token FROM tblBalances WHERE Session = ?", (session,)).fetchone()[0]
+            else:
+                result = True, row[0]
+            connection.execute("COMMIT;")
+            return result
+        except Exception:
+            connection.execute("ROLLBACK;")
+            raise
+
+    def expire_balances(self, changed_before: float) -> int:
+        return self._connect().execute("DELETE FROM tblBalances WHERE Changed < ?", (changed_before,)).rowcount
+
+    def set_lock(self, image_sha1: str, expiry: float, details: dict, max_entries: int) -> int:
+        connection = self._connect()
+        connection.execute("INSERT OR REPLACE INTO tblLocks (SHA1, Expiry, Details) VALUES (?, ?, ?)", (image_sha1, expiry, json.dumps(details)))
+        return self._evict(connection, max_entries)
+
+    def try_lock(self, image_sha1: str, expiry: float, details: dict, now: float, max_entries: int):
+        connection = self._transaction()
+        try:
+            # an expired lock is replaced, a valid lock is kept
+            row = connection.execute("""
+                INSERT INTO tblLocks (SHA1, Expiry, Details) VALUES (?, ?, ?)
+                ON CONFLICT (SHA1) DO UPDATE SET Expiry = excluded.Expiry, Details = excluded.Details
+                WHERE tblLocks.Expiry <= ?
+                RETURNING SHA1""", (image_sha1, expiry, json.dumps(details), now)).fetchone()
+            existing = None
+            if row is None:
+                existing = connection.execute("SELECT Expiry, Details FROM tblLocks WHERE SHA1 = ?", (image_sha1,)).fetchone()
+            connection.execute("COMMIT;")
+        except Exception:
+            connection.execute("ROLLBACK;")
+            raise
+        if existing is not None: return (existing[0], json.loads(existing[1])), 0
+        return None, self._evict(connection, max_entries)
+
+    def _evict(self, connection: sqlite3.Connection, max_entries: int) -> int:
+        """Removes the locks which expire next above max_entries, checked after every _EVICT_INTERVAL new locks."""
+        with self._lock:
+            self._writes += 1
+            if self._writes % self._EVICT_INTERVAL != 0 and max_entries >= self._EVICT_INTERVAL: return 0
+        return connection.execute("""
+            DELETE FROM tblLocks WHERE SHA1 IN (
+                SELECT SHA1 FROM tblLocks ORDER BY Expiry DESC LIMIT -1 OFFSET ?
+            )""", (max_entries,)).rowcount
+
+    def get_lock(self, image_sha1: str, now: float):
+        row = self._connect().execute("SELECT Expiry, Details FROM tblLocks WHERE SHA1 = ? AND Expiry > ?", (image_sha1, now)).fetchone()
+        if row is None: return None
+        return row[0], json.loads(row[1])
+
+    def remove_lock(self, image_sha1: str) -> bool:
+        return self._connect().execute("DELETE FROM tblLocks WHERE SHA1 = ?", (image_sha1,)).rowcount > 0
+
+    def expire_locks(self, now: float) -> int:
+        return self._connect().execute("DELETE FROM tblLocks WHERE Expiry <= ?", (now,)).rowcount
+
+    def get_stats(self) -> dict:
+        connection = self._connect()
+        return {
+            "sessions": connection.execute("SELECT COUNT(*) FROM tblBalances").fetchone()[0],
+            "entries": connection.execute("SELECT COUNT(*) FROM tblLocks").fetchone()[0]
+        }
+
+    def clear_balances(self):
+        self._connect().execute("DELETE FROM tblBalances;")
+
+    def clear_locks(self):
+        self._connect().execute("DELETE FROM tblLocks;")
+
+
+_lock = Lock()
+_backend = None
+_backend_key = None  # (backend, path) of the configuration the backend was created for
+
+def get_backend():
+    """Returns the state backend of the configuration (State/backend), created on first use."""
+    global _backend, _backend_key
+    kind = config.State_get_backend()
+    key = (kind, config.State_get_sqlite_path() if kind == "sqlite" else None)
+    with _lock:
+        if _backend_key != key:
+            if kind == "sqlite":
+                try:
+                    _backend = SQLiteBackend(key[1])
+                    logger.info("Shared state backend %s ready", key[1])
+                except Exception as e:
+                    logger.error("Error while opening the state backend %s, using memory: %s", key[1], str(e))
+                    logger.debug("Exception details:", exc_info=True)
+                    _backend = MemoryBackend()
+            else:
+                if kind != "memory": logger.error("Unknown state backend %s, using memory", kind)
+                _backend = MemoryBackend()
+            _backend_key = key
+        return _backend
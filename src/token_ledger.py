@@ -0,0 +1,68 @@
+import logging
+import time
+import src.state_backend as state_backend
+from src.SessionState import SessionState
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# the credits are stored in the browser, the ledger keeps the last balance of active sessions,
+# so that handlers running at the same time (streamed upload bonus, generation) change the
+# balance by their delta instead of overwriting each other with the value they started with.
+# The balances are kept in the state backend, which can be shared by several instances (State/backend).
+BALANCE_TTL = 3600  # seconds after the last change until the browser value is used again
+_CLEANUP_INTERVAL = 60
+
+_last_cleanup = 0.0
+
+def sync(session_state: SessionState) -> int:
+    """Sets the token of the session state to the balance of the ledger.
+
+    Unknown sessions are added with the token of the session state (from the browser).
+
+    Returns:
+        int: the current balance
+    """
+    _cleanup()
+    browser_token = session_state.token or 0
+    balance = state_backend.get_backend().sync_balance(session_state.session, browser_token, time.time())
+    if balance != session_state.token and session_state.token is not None:
+        logger.debug("Token of %s taken from ledger: %i instead of %s", session_state.session, balance, session_state.token)
+    session_state.token = balance
+    return balance
+
+def add(session_state: SessionState, amount: int) -> int:
+    """Changes the balance of the session by amount (negative to spend) and sets it in the session state.
+
+    Returns:
+        int: the new balance
+    """
+    session_state.token = state_backend.get_backend().add_balance(session_state.session, session_state.token or 0, amount, time.time())
+    return session_state.token
+
+def try_spend(session_state: SessionState, amount: int = 1) -> bool:
+    """Spends amount in one step with the check of the balance, so parallel requests (of all
+    instances with a shared backend) can not spend the same credits.
+
+    Returns:
+        bool: True if spent, False if the balance is not sufficient (the session state gets the balance)
+    """
+    spent, session_state.token = state_backend.get_backend().try_spend(session_state.session, session_state.token or 0, amount, time.time())
+    return spent
+
+def get_stats() -> dict:
+    """Returns the number of tracked sessions."""
+    return {"sessions": state_backend.get_backend().get_stats()["sessions"]}
+
+def clear():
+    """Removes all balances."""
+    state_backend.get_backend().clear_balances()
+
+def _cleanup():
+    global _last_cleanup
+    now = time.time()
+    if now - _last_cleanup < _CLEANUP_INTERVAL: return
+    _last_cleanup = now
+    expired = state_backend.get_backend().expire_balances(now - BALANCE_TTL)
+    if expired > 0:
+        logger.debug("Removed %i expired sessions from token ledger", expired)
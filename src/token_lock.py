@@ -0,0 +1,91 @@
+import logging
+from datetime import datetime
+from threading import Lock
+import src.config as config
+import src.state_backend as state_backend
+
+# Set up module logger
+logger = logging.getLogger(__name__)
+
+# images which earned credits are locked by their hash until a point in time. The locks are kept
+# in the state backend (State/backend), which removes only the expired locks on an upload instead
+# of scanning all locks (a min heap of the expiry in memory, an index of the expiry in sqlite).
+
+_lock = Lock()
+_stats = {"locks": 0, "hits": 0, "expired": 0, "evictions": 0}
+
+def lock(image_sha1: str, until: datetime, **details):
+    """Locks the image until the given time, details are returned by get.
+
+    If the store is full (Token/lock_max_entries), the locks which expire next are removed.
+    """
+    backend = state_backend.get_backend()
+    _purge(backend, datetime.now().timestamp())
+    evicted = backend.set_lock(image_sha1, until.timestamp(), details, config.get_token_lock_max_entries())
+    with _lock:
+        _stats["locks"] += 1
+        _stats["evictions"] += evicted
+
+def try_lock(image_sha1: str, until: datetime, **details):
+    """Locks the image until the given time if it is not locked yet.
+
+    The check and the lock are one step of the state backend, so of parallel uploads of the same
+    image (even on other instances with a shared backend) only one gets the lock.
+
+    Returns:
+        dict: None if the caller got the lock, otherwise the details of the existing lock with the expiry as "dt"
+    """
+    now = datetime.now().timestamp()
+    backend = state_backend.get_backend()
+    _purge(backend, now)
+    entry, evicted = backend.try_lock(image_sha1, until.timestamp(), details, now, config.get_token_lock_max_entries())
+    with _lock:
+        if entry is None:
+            _stats["locks"] += 1
+            _stats["evictions"] += evicted
+        else:
+            _stats["hits"] += 1
+    if entry is None: return None
+    return dict(entry[1], dt=datetime.fromtimestamp(entry[0]))
+
+def get(image_sha1: str):
+    """Returns the details of the lock with the expiry as "dt", None if the image is not locked."""
+    now = datetime.now().timestamp()
+    backend = state_backend.get_backend()
+    _purge(backend, now)
+    entry = backend.get_lock(image_sha1, now)
+    if entry is None: return None
+    with _lock:
+        _stats["hits"] += 1
+    return dict(entry[1], dt=datetime.fromtimestamp(entry[0]))
+
+def unlock(image_sha1: str) -> bool:
+    """Removes the lock of the image, returns False if it was not locked."""
+    return state_backend.get_backend().remove_lock(image_sha1)
+
+def purge() -> int:
+    """Removes all expired locks and returns their number."""
+    return _purge(state_backend.get_backend(), datetime.now().timestamp())
+
+def get_stats() -> dict:
+    """Returns the number of locks and the counters of the store."""
+    with _lock:
+        stats = dict(_stats)
+    backend_stats = state_backend.get_backend().get_stats()
+    backend_stats.pop("sessions", None)
+    return dict(stats, **backend_stats)
+
+def clear():
+    """Removes all locks and resets the counters."""
+    state_backend.get_backend().clear_locks()
+    with _lock:
+        for key in _stats: _stats[key] = 0
+
+def _purge(backend, now: float) -> int:
+    """Removes the locks expired before now."""
+    removed = backend.expire_locks(now)
+    if removed > 0:
+        with _lock:
+            _stats["expired"] += removed
+        logger.debug("Removed token lock for %i image(s)", removed)
+    return removed
@@ -1,4 +1,6 @@
 import os
+import shutil
+import time
 import requests                 # for downloads of files
 from datetime import datetime   # for timestamp
 import numpy as np              # for image manipulation e.g. sepia
@@ -44,9 +46,17 @@ def download_file_if_not_existing(url, local_path):
         logger.info("File %s already exists", local_path)
 
 
-def save_image_as_file(image: Image.Image, dir: str):
+def compute_image_hash(image: Image.Image) -> str:
+    """
+    SHA1 of the decoded pixels, the identity of an image in caches, analytics and token locks.
+    Computed once per upload and passed to all consumers.
+    """
+    return sha1(image.tobytes()).hexdigest()
+
+def save_image_as_file(image: Image.Image, dir: str, image_sha1: str = None):
     """
     saves a image as JPEG to the given directory and uses the SHA1 as filename
+    the SHA1 is computed if it is not given
     return value is the full filename
     """
     try:
@@ -58,9 +68,7 @@ def save_image_as_file(image: Image.Image, dir: str):
         # except:
         #     print("seems no background in image dict")
         #     print (image)
-        # Convert the image to bytes and compute the SHA-1 hash
-        image_bytes = image.tobytes()
-        hash = sha1(image_bytes).hexdigest()
+        hash = image_sha1 if image_sha1 else compute_image_hash(image)
         filetype = "jpg"
         filename_hash = hash + "."+filetype
         file_path = os.path.join(dir, filename_hash)
@@ -76,12 +84,40 @@ def save_image_as_file(image: Image.Image, dir: str):
         return None
 
 
-def save_image_with_timestamp(image, folder_path, ignore_errors=False, reference=""):
+OUTPUT_EXTENSIONS = {"png": ".png", "jpeg": ".jpg", "webp": ".webp"}
+
+def get_encoder_options(image_format: str, quality: int = None, effort: int = None, progressive: bool = None) -> dict:
+    """
+    returns the PIL save options of an output format, missing values are taken from the configuration
+    effort (0-6) is the WebP method, the PNG compression level (effort * 1.5) and optimized JPEG tables from 4
+    """
+    if quality is None: quality = config.get_output_quality()
+    if effort is None: effort = config.get_output_effort()
+    if progressive is None: progressive = config.is_output_progressive()
+    if image_format == "jpeg":
+        return {"format": "JPEG", "quality": quality, "optimize": effort >= 4, "progressive": progressive}
+    if image_format == "webp":
+        return {"format": "WEBP", "quality": quality, "method": effort, "lossless": quality >= 100}
+    return {"format": "PNG", "compress_level": round(effort * 1.5)}
+
+def encode_image(image, fp, image_format: str = None, **options):
+    """
+    encodes a image in the output format (configuration if None) into a file path or stream
+    options overwrite quality, effort and progressive of the configuration
+    """
+    if image_format is None: image_format = config.get_output_format()
+    # JPEG has no alpha, the other formats keep the mode of the image
+    if image_format == "jpeg" and image.mode not in ["RGB", "L"]: image = image.convert("RGB")
+    image.save(fp, **get_encoder_options(image_format, **options))
+
+def save_image_with_timestamp(image, folder_path, ignore_errors=False, reference="", image_format: str = None):
     """
     saves a image in a given folder and returns the used path
     reference: could be the SHA1 from source image to make a combined filename
+    image_format: png, jpeg or webp, the output format of the configuration if None
     """
     try:
+        if image_format is None: image_format = config.get_output_format()
         # Create the folder if it does not exist
         os.makedirs(folder_path, exist_ok=True)
 
@@ -90,13 +126,15 @@ def save_image_with_timestamp(image, folder_path, ignore_errors=False, reference
 
         separator = "" if reference == "" else "-"
         # Create the filename with the timestamp
-        filename = f"{reference}{separator}{timestamp}.png"  # Change the extension as needed
+        filename = f"{reference}{separator}{timestamp}{OUTPUT_EXTENSIONS[image_format]}"
 
         # Full path to save the image
         file_path = os.path.join(folder_path, filename)
 
         # Save the image
-        image.save(file_path)
+        start = time.perf_counter()
+        encode_image(image, file_path, image_format)
+        logger.debug("Saved %s as %s: %.1f KB in %.0f ms", filename, image_format, os.path.getsize(file_path) / 1024, (time.perf_counter() - start) * 1000)
         return file_path
     except Exception as e:
         logger.error("Save image failed: %s", str(e))
@@ -105,6 +143,25 @@ def save_image_with_timestamp(image, folder_path, ignore_errors=False, reference
             raise e
 
 
+def link_or_copy(source_path, target_path, ignore_errors=False):
+    """
+    makes the file available at target_path without writing it again (hard link),
+    copies it if linking is not possible (e.g. other file system) and returns target_path
+    """
+    try:
+        os.makedirs(os.path.dirname(target_path) or ".", exist_ok=True)
+        try:
+            os.link(source_path, target_path)
+        except OSError:
+            shutil.copyfile(source_path, target_path)
+        return target_path
+    except Exception as e:
+        logger.error("Link or copy of %s failed: %s", source_path, str(e))
+        logger.debug("Exception details:", exc_info=True)
+        if not ignore_errors:
+            raise e
+
+
 def image_convert_to_sepia(input: Image):
     """converts a image to a sepia ton image"""
 
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Fill the face cache with the images of the input cache.
+
+Cached inputs are stored as <output_folder>/cache/ab/cd/<SHA1>.jpg (before the content store
+<output_folder>/<date>/<SHA1>.jpg), the SHA1 of the file name is the
+SHA1 of the uploaded pixels and therefore the key of the face cache. Images which are already
+in the face cache are skipped unless --force is used.
+
+Example:
+    python tools/backfill_face_cache.py --folder ./output --limit 1000
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import re
+import time
+import logging
+from PIL import Image
+from src import config
+from src import face_cache
+from src.logging_config import setup_logging
+
+logger = logging.getLogger("tools.backfill_face_cache")
+
+CACHE_FILE_PATTERN = re.compile(r"^([0-9a-f]{40})\.jpg$")
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Fill the face cache with the images of the input cache")
+    parser.add_argument("--folder", default=None, help="input cache folder (Default: output_folder of the configuration)")
+    parser.add_argument("--limit", type=int, default=0, help="maximum number of analyzed images, 0 = all")
+    parser.add_argument("--force", action="store_true", help="analyze images which are already in the face cache")
+    return parser.parse_args()
+
+
+def find_cached_inputs(folder: str):
+    """Yields SHA1 and path of all images in the input cache."""
+    for root, _, files in os.walk(folder):
+        for filename in sorted(files):
+            match = CACHE_FILE_PATTERN.match(filename)
+            if match: yield match.group(1), os.path.join(root, filename)
+
+
+def main():
+    args = parse_arguments()
+    setup_logging()
+    config.read_configuration()
+    if not config.FaceAnalysis_is_face_cache_enabled():
+        logger.error("The face cache is disabled ([FaceAnalysis] face_cache_enabled)")
+        sys.exit(1)
+    face_cache.start()
+
+    from src.onnx_analyzer import FaceAnalyzer
+    analyzer = FaceAnalyzer()
+
+    analyzed = skipped = failed = 0
+    start = time.perf_counter()
+    for sha1, path in find_cached_inputs(args.folder or config.get_output_folder()):
+        if args.limit > 0 and analyzed >= args.limit: break
+        if not args.force and face_cache.get_faces(sha1) is not None:
+            skipped += 1
+            continue
+        try:
+            with Image.open(path) as image:
+                faces = analyzer.get_gender_and_age_from_image(image.convert("RGB"), raise_errors=True)
+            face_cache.save_faces(sha1, faces)
+            analyzed += 1
+        except Exception as e:
+            logger.error("Error while analyzing %s: %s", path, str(e))
+            failed += 1
+    logger.info("%i images analyzed, %i skipped, %i failed in %.1fs", analyzed, skipped, failed, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark the age and gender classification of the face analyzer for group photos.
+
+Test images with 1, 5 and 20 faces are composed from the face images of the unit tests.
+For each image the classification is measured twice on the same detected faces:
+- per face: preprocessing and one session run per face and model (the former implementation)
+- batched: preprocessing once per face into one batch and one session run per model,
+  or a single session run if the fused age and gender model exists
+
+Example:
+    python tools/benchmark_face_analyzer.py --faces 1 5 20 --runs 20
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import math
+import time
+import logging
+import numpy as np
+import onnxruntime as ort
+from PIL import Image
+from src import config
+from src.logging_config import setup_logging
+
+logger = logging.getLogger("tools.benchmark_face_analyzer")
+
+DEFAULT_FACES = [
+    "./unittests/testdata/face_male_age30_nosmile.jpg",
+    "./unittests/testdata/face_female_age20_nosmile.jpg",
+    "./unittests/testdata/face_female_age20_smile.jpg",
+]
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark batched age and gender classification")
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 5, 20], help="number of faces per test image")
+    parser.add_argument("--runs", type=int, default=10, help="measured runs per test image")
+    parser.add_argument("--images", nargs="+", default=DEFAULT_FACES, help="face images used to compose the test images")
+    parser.add_argument("--cell", type=int, default=256, help="size of one face in the composed image")
+    return parser.parse_args()
+
+
+def compose_group_image(faces: list, count: int, cell: int) -> np.ndarray:
+    """Arranges count faces in a grid and returns it as RGB array."""
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    group = Image.new("RGB", (columns * cell, rows * cell), color="white")
+    for i in range(count):
+        face = faces[i % len(faces)].copy()
+        face.thumbnail((cell, cell))
+        group.paste(face, ((i % columns) * cell, (i // columns) * cell))
+    return np.array(group)
+
+
+def classify_per_face(analyzer, classifiers: list, cropped_faces: list):
+    """The former implementation: every model preprocesses and runs each face on its own."""
+    for face in cropped_faces:
+        for classifier in classifiers:
+            batch = analyzer._preprocess_faces([face])
+            analyzer._run_classifier(classifier, batch)
+
+
+def classify_batched(analyzer, cropped_faces: list):
+    """Preprocess once into one batch, one run per model (or one run of the fused model)."""
+    gender_scores, age_scores = analyzer._classify(analyzer._preprocess_faces(cropped_faces))
+    analyzer._get_genders(gender_scores)
+    analyzer._get_ages(age_scores)
+
+
+def measure(fn, runs: int) -> float:
+    """Mean duration of fn in milliseconds after one warm up run."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    args = parse_arguments()
+    setup_logging()
+    config.read_configuration()
+
+    from src.onnx_analyzer import FaceAnalyzer
+    analyzer = FaceAnalyzer()
+    faces = [Image.open(f).convert("RGB") for f in args.images]
+    # the former implementation always used the single models
+    classifiers = [ort.InferenceSession(model_file, providers=["CPUExecutionProvider"])
+                   for model_file in (config.get_modelfile_onnx_gender_googlenet(), config.get_modelfile_onnx_age_googlenet())]
+    logger.info("Fused age and gender model: %s", "yes" if analyzer.age_gender_classifier is not None else "no")
+    logger.info("Batch dimension of the age model: %s", classifiers[1].get_inputs()[0].shape[0])
+
+    rows = []
+    for count in args.faces:
+        image = compose_group_image(faces, count, args.cell)
+        detected = analyzer._detect_faces(image)
+        cropped_faces = []
+        for bbox in detected:
+            x1, y1, x2, y2 = map(int, bbox[:4])
+            x1, y1 = max(x1, 0), max(y1, 0)
+            if x2 > x1 and y2 > y1: cropped_faces.append(image[y1:y2, x1:x2])
+        if len(cropped_faces) == 0:
+            logger.warning("No faces detected in the image with %d faces", count)
+            continue
+        logger.info("Image with %d faces: %d detected", count, len(cropped_faces))
+        detection = measure(lambda: analyzer._detect_faces(image), args.runs)
+        per_face = measure(lambda: classify_per_face(analyzer, classifiers, cropped_faces), args.runs)
+        batched = measure(lambda: classify_batched(analyzer, cropped_faces), args.runs)
+        rows.append((count, len(cropped_faces), detection, per_face, batched))
+
+    print(f"\n{'faces':>6}{'detected':>10}{'detection [ms]':>16}{'per face [ms]':>15}{'batched [ms]':>14}{'speedup':>9}")
+    for count, detected, detection, per_face, batched in rows:
+        print(f"{count:>6}{detected:>10}{detection:>16.1f}{per_face:>15.1f}{batched:>14.1f}{per_face / batched:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
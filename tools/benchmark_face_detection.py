@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Compare the adaptive face detection against the former fixed 512x512 detection.
+
+Every configuration runs on the same images: the face images of the unit tests, an image without
+a face, group images with 5 and 20 faces and any images given with --images. The fixed detection
+is the reference, accuracy is reported as recall (reference faces found with IoU >= 0.5) and the
+number of extra faces, latency as mean detection time.
+
+Example:
+    python tools/benchmark_face_detection.py --runs 20 --images ./photos/*.jpg
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import argparse
+import logging
+import numpy as np
+from PIL import Image
+from src import config
+from src.logging_config import setup_logging
+from benchmark_face_analyzer import DEFAULT_FACES, compose_group_image, measure
+
+logger = logging.getLogger("tools.benchmark_face_detection")
+
+# name: FaceAnalysis settings, the first one is the reference
+CONFIGURATIONS = {
+    "fixed 512": {"adaptive_detection": "false", "max_faces": "0"},
+    "adaptive": {"adaptive_detection": "true", "coarse_detection": "false", "max_faces": "0"},
+    "adaptive+coarse": {"adaptive_detection": "true", "coarse_detection": "true", "max_faces": "0"},
+    "adaptive+coarse, max 10": {"adaptive_detection": "true", "coarse_detection": "true", "max_faces": "10"},
+}
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark adaptive face detection")
+    parser.add_argument("--runs", type=int, default=10, help="measured runs per image and configuration")
+    parser.add_argument("--images", nargs="*", default=[], help="additional images")
+    return parser.parse_args()
+
+
+def iou(a: np.ndarray, b: np.ndarray) -> float:
+    """Intersection over union of two boxes (x1, y1, x2, y2)."""
+    width = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    height = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    intersection = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def matched_faces(reference: np.ndarray, detected: np.ndarray) -> int:
+    """Number of reference boxes which have a detected box with IoU >= 0.5."""
+    return sum(1 for r in reference if any(iou(r, d) >= 0.5 for d in detected))
+
+
+def load_test_images(extra_images: list) -> dict:
+    faces = [Image.open(f).convert("RGB") for f in DEFAULT_FACES]
+    images = {os.path.basename(f): np.array(face) for f, face in zip(DEFAULT_FACES, faces)}
+    images["no face"] = np.array(Image.new("RGB", (1024, 768), color="blue"))
+    images["group 5"] = compose_group_image(faces, 5, 256)
+    images["group 20"] = compose_group_image(faces, 20, 192)
+    for f in extra_images:
+        with Image.open(f) as image:
+            image = image.convert("RGB")
+            image.thumbnail((config.get_max_size(), config.get_max_size()))
+            images[os.path.basename(f)] = np.array(image)
+    return images
+
+
+def main():
+    args = parse_arguments()
+    setup_logging()
+    config.read_configuration()
+    if not config.current_config.has_section("FaceAnalysis"):
+        config.current_config.add_section("FaceAnalysis")
+
+    from src.onnx_analyzer import FaceAnalyzer
+    analyzer = FaceAnalyzer()
+    images = load_test_images(args.images)
+
+    results = {}  # configuration: image: (boxes, latency)
+    for name, settings in CONFIGURATIONS.items():
+        for key, value in settings.items():
+            config.current_config.set("FaceAnalysis", key, value)
+        results[name] = {}
+        for image_name, image in images.items():
+            boxes = analyzer._detect_faces(image)
+            results[name][image_name] = (boxes, measure(lambda: analyzer._detect_faces(image), args.runs))
+
+    reference_name = next(iter(CONFIGURATIONS))
+    reference = results[reference_name]
+    print(f"\n{'configuration':<26}{'image':<36}{'faces':>6}{'recall':>8}{'extra':>7}{'latency [ms]':>14}{'speedup':>9}")
+    for name, per_image in results.items():
+        total_reference = total_matched = 0
+        total_latency = total_reference_latency = 0.0
+        for image_name, (boxes, latency) in per_image.items():
+            reference_boxes, reference_latency = reference[image_name]
+            matched = matched_faces(reference_boxes, boxes)
+            recall = matched / len(reference_boxes) if len(reference_boxes) > 0 else 1.0
+            print(f"{name:<26}{image_name[:35]:<36}{len(boxes):>6}{recall:>8.2f}{len(boxes) - matched:>7}{latency:>14.1f}{reference_latency / latency:>9.2f}")
+            total_reference += len(reference_boxes)
+            total_matched += matched
+            total_latency += latency
+            total_reference_latency += reference_latency
+        recall = total_matched / total_reference if total_reference > 0 else 1.0
+        print(f"{name:<26}{'TOTAL':<36}{'':>6}{recall:>8.2f}{'':>7}{total_latency:>14.1f}{total_reference_latency / total_latency:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
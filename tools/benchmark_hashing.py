@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Benchmark the hashing of uploaded images.
+
+The identity of an upload is the SHA1 of its decoded pixels (utils.compute_image_hash).
+For a random image of the given size the tool measures:
+- tobytes: the copy of the pixels, which every hash needs (Pillow has no buffer without a copy)
+- compute_image_hash: tobytes + sha1
+- other hash functions on the same bytes, for comparison (xxhash only if installed)
+
+Example:
+    python tools/benchmark_hashing.py --megabytes 12 --runs 20
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import hashlib
+import math
+import time
+import numpy as np
+from PIL import Image
+from src import utils
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark the hashing of uploaded images")
+    parser.add_argument("--megabytes", type=float, nargs="+", default=[1, 12], help="size of the decoded RGB image")
+    parser.add_argument("--runs", type=int, default=10, help="measured runs per method")
+    return parser.parse_args()
+
+
+def measure(fn, runs: int) -> float:
+    """Mean duration of fn in milliseconds after one warm up run."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def get_methods() -> dict:
+    """name: function(image) of all measured methods"""
+    methods = {
+        "tobytes": lambda image: image.tobytes(),
+        "compute_image_hash": utils.compute_image_hash,
+    }
+    for name in ("md5", "sha256", "blake2b"):
+        methods[f"tobytes + {name}"] = lambda image, name=name: hashlib.new(name, image.tobytes()).hexdigest()
+    try:
+        import xxhash
+        methods["tobytes + xxh3_128"] = lambda image: xxhash.xxh3_128(image.tobytes()).hexdigest()
+    except ImportError:
+        pass
+    return methods
+
+
+def main():
+    args = parse_arguments()
+    methods = get_methods()
+    print(f"\n{'size [MB]':>10}  {'method':<22}{'time [ms]':>10}{'throughput [MB/s]':>19}")
+    for megabytes in args.megabytes:
+        side = int(math.sqrt(megabytes * 1024 * 1024 / 3))
+        image = Image.fromarray(np.random.default_rng(1).integers(0, 255, (side, side, 3), dtype=np.uint8))
+        size = len(image.getbands()) * image.width * image.height / 1024 / 1024
+        for name, method in methods.items():
+            duration = measure(lambda: method(image), args.runs)
+            print(f"{size:>10.1f}  {name:<22}{duration:>10.1f}{size / duration * 1000:>19.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark the decoding of uploads.
+
+For each JPEG the tool measures:
+- full decode: gradio decodes the full resolution (type="pil") and every consumer
+  resizes it on its own (face analysis, generation, captioner)
+- ingest: src.ingest decodes at reduced scale (draft mode) and creates all variants once
+
+Memory is the size of the decoded pixels held per upload. Without files a random
+4000x3000 JPEG (12 MP) is used.
+
+Example:
+    python tools/benchmark_ingest.py --images photo1.jpg photo2.jpg --runs 10
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import tempfile
+import time
+import numpy as np
+from PIL import Image, ImageOps
+from src import config
+from src import ingest
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark the decoding of uploads")
+    parser.add_argument("--images", nargs="*", default=[], help="JPEG files, a random 12 MP image if empty")
+    parser.add_argument("--runs", type=int, default=10, help="measured runs per image")
+    return parser.parse_args()
+
+
+def measure(fn, runs: int) -> float:
+    """Mean duration of fn in milliseconds after one warm up run."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def get_pixel_megabytes(images) -> float:
+    """size of the distinct decoded images in MB"""
+    distinct = {id(image): image for image in images}.values()
+    return sum(len(image.getbands()) * image.width * image.height for image in distinct) / 1024 / 1024
+
+
+def full_decode(file_path: str) -> list:
+    """The former way: full resolution by gradio, resized copies by each consumer."""
+    image = ImageOps.exif_transpose(Image.open(file_path)).convert("RGB")
+    max_size = config.get_max_size()
+    faces = image.copy()
+    faces.thumbnail((max_size, max_size))
+    generation = image.copy()
+    generation.thumbnail((max_size, max_size))
+    caption = image.resize((ingest.CAPTION_SIZE, ingest.CAPTION_SIZE))
+    return [image, faces, generation, caption]
+
+
+def ingest_decode(file_path: str) -> list:
+    """Reduced decode and all variants in one pass."""
+    return list(ingest.create_variants(ingest.open_image(file_path)).values())
+
+
+def main():
+    args = parse_arguments()
+    config.read_configuration()
+    with tempfile.TemporaryDirectory() as folder:
+        images = args.images
+        if len(images) == 0:
+            file_path = os.path.join(folder, "random_12mp.jpg")
+            Image.fromarray(np.random.default_rng(1).integers(0, 255, (3000, 4000, 3), dtype=np.uint8)).save(file_path, quality=90)
+            images = [file_path]
+
+        print(f"\n{'image':<30}{'size':>12}{'full [ms]':>11}{'ingest [ms]':>13}{'full [MB]':>11}{'ingest [MB]':>13}")
+        for file_path in images:
+            with Image.open(file_path) as image:
+                size = f"{image.width}x{image.height}"
+            full_ms = measure(lambda: full_decode(file_path), args.runs)
+            ingest_ms = measure(lambda: ingest_decode(file_path), args.runs)
+            full_mb = get_pixel_megabytes(full_decode(file_path))
+            ingest_mb = get_pixel_megabytes(ingest_decode(file_path))
+            print(f"{os.path.basename(file_path)[:29]:<30}{size:>12}{full_ms:>11.1f}{ingest_ms:>13.1f}{full_mb:>11.1f}{ingest_mb:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Benchmark the encoding of generated images.
+
+For each output format (PNG, JPEG, progressive JPEG, WebP) and encoder effort the tool
+reports the encode time and the size per image, and the throughput with several threads
+(the post-processing stage encodes with GenAI/postprocess_workers threads, the encoders
+release the GIL).
+
+Without files a 1024x1024 image with gradients and noise is used, which compresses
+similar to a generated image.
+
+Example:
+    python tools/benchmark_output_encoding.py --images result1.png result2.png --quality 90 --threads 4
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from src import utils
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark the encoding of generated images")
+    parser.add_argument("--images", nargs="*", default=[], help="images, a synthetic 1024x1024 image if empty")
+    parser.add_argument("--quality", type=int, default=90, help="quality of JPEG and WebP")
+    parser.add_argument("--efforts", type=int, nargs="*", default=[0, 4, 6], help="encoder efforts (0-6)")
+    parser.add_argument("--runs", type=int, default=5, help="measured runs per setting")
+    parser.add_argument("--threads", type=int, default=4, help="threads of the throughput measurement")
+    return parser.parse_args()
+
+
+def create_test_image(size: int = 1024) -> Image.Image:
+    """smooth gradients with some noise"""
+    y, x = np.mgrid[0:size, 0:size] / size
+    rgb = np.stack([np.sin(x * 7) * 0.5 + 0.5, y, np.cos((x + y) * 5) * 0.5 + 0.5], axis=-1) * 220
+    rgb += np.random.default_rng(1).normal(0, 8, rgb.shape)
+    return Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8))
+
+
+def encode(image: Image.Image, image_format: str, quality: int, effort: int, progressive: bool) -> int:
+    """encodes into memory and returns the size in bytes"""
+    stream = io.BytesIO()
+    utils.encode_image(image, stream, image_format, quality=quality, effort=effort, progressive=progressive)
+    return stream.tell()
+
+
+def measure(fn, runs: int) -> float:
+    """Mean duration of fn in milliseconds after one warm up run."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def measure_throughput(fn, image: Image.Image, runs: int, threads: int) -> float:
+    """images per second with threads encoding at the same time, fn gets the image to encode"""
+    # PIL keeps the save options at the image while saving, each thread needs its own image
+    copies = [image.copy() for _ in range(threads)]
+    def run(i):
+        for _ in range(runs):
+            fn(copies[i])
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        start = time.perf_counter()
+        list(executor.map(run, range(threads)))
+    return runs * threads / (time.perf_counter() - start)
+
+
+def main():
+    args = parse_arguments()
+    images = {os.path.basename(path): Image.open(path).convert("RGB") for path in args.images}
+    if len(images) == 0: images = {"synthetic 1024x1024": create_test_image()}
+
+    settings = [("png", False), ("jpeg", False), ("jpeg", True), ("webp", False)]
+    for name, image in images.items():
+        print(f"\n{name} ({image.width}x{image.height}), quality {args.quality}")
+        print(f"{'format':<18}{'effort':>7}{'encode [ms]':>13}{'size [KB]':>11}{f'{args.threads} threads [img/s]':>22}")
+        for image_format, progressive in settings:
+            for effort in args.efforts:
+                fn = lambda source: encode(source, image_format, args.quality, effort, progressive)
+                duration = measure(lambda: fn(image), args.runs)
+                size = fn(image) / 1024
+                throughput = measure_throughput(fn, image, args.runs, args.threads)
+                label = f"{image_format}{' progressive' if progressive else ''}"
+                print(f"{label:<18}{effort:>7}{duration:>13.1f}{size:>11.1f}{throughput:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Benchmark schedulers (samplers) and step counts for the image generation.
+
+Every candidate is rendered with a fixed seed on the same set of images and compared
+against a reference rendering (by default the scheduler of the model with default_steps).
+The report shows the latency together with the similarity to the reference (SSIM and PSNR),
+so that the style profiles (style_N_scheduler, style_N_steps) can be tuned with data.
+
+Example:
+    python tools/benchmark_samplers.py --style 1 --schedulers dpm++2m unipc --steps 15 20 25
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import glob
+import time
+import logging
+import numpy as np
+from PIL import Image
+from src import config
+from src.logging_config import setup_logging
+
+logger = logging.getLogger("tools.benchmark_samplers")
+
+
+def _box_filter(values: np.ndarray, size: int) -> np.ndarray:
+    """Mean over all size x size windows (valid area only) via an integral image."""
+    integral = np.pad(values.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    return (integral[size:, size:] - integral[:-size, size:] - integral[size:, :-size] + integral[:-size, :-size]) / (size * size)
+
+
+def ssim(image_a: Image.Image, image_b: Image.Image, window: int = 7) -> float:
+    """Structural similarity of two images on the luminance channel (1.0 = identical)."""
+    a = np.asarray(image_a.convert("L"), dtype=np.float64)
+    b = np.asarray(image_b.convert("L").resize(image_a.size), dtype=np.float64)
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    mu_a = _box_filter(a, window)
+    mu_b = _box_filter(b, window)
+    var_a = _box_filter(a * a, window) - mu_a ** 2
+    var_b = _box_filter(b * b, window) - mu_b ** 2
+    covar = _box_filter(a * b, window) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * covar + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+
+def psnr(image_a: Image.Image, image_b: Image.Image) -> float:
+    """Peak signal to noise ratio in dB (higher = more similar)."""
+    a = np.asarray(image_a.convert("RGB"), dtype=np.float64)
+    b = np.asarray(image_b.convert("RGB").resize(image_a.size), dtype=np.float64)
+    mse = np.mean((a - b) ** 2)
+    if mse == 0: return float("inf")
+    return float(10 * np.log10(255 ** 2 / mse))
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark schedulers and steps for the image generation")
+    parser.add_argument("--images", nargs="+", default=sorted(glob.glob("./unittests/testdata/*.jpg")),
+                        help="images used for the benchmark (default: unittests/testdata)")
+    parser.add_argument("--style", type=int, default=1, help="style number used for prompt and strength (default: 1)")
+    parser.add_argument("--prompt", default="a person", help="image description inserted into the style prompt")
+    parser.add_argument("--schedulers", nargs="+", default=["dpm++2m", "dpm++2m_karras", "unipc", "euler_a"],
+                        help="candidate schedulers")
+    parser.add_argument("--steps", nargs="+", type=int, default=[15, 20, 25, 30], help="candidate step counts")
+    parser.add_argument("--reference-scheduler", default="", help="scheduler of the reference (default: model scheduler)")
+    parser.add_argument("--reference-steps", type=int, default=None, help="steps of the reference (default: default_steps)")
+    parser.add_argument("--seed", type=int, default=42, help="seed used for all renderings")
+    parser.add_argument("--csv", default=None, help="optional csv file for the results")
+    return parser.parse_args()
+
+
+def render(AI, image, prompt, negative_prompt, strength, scheduler, steps, seed):
+    """Render one image and return it with the duration in seconds."""
+    start = time.perf_counter()
+    result = AI.generate_image(
+        image=image.copy(),
+        prompt=prompt,
+        negative_prompt=negative_prompt,
+        strength=strength,
+        steps=steps,
+        scheduler=scheduler,
+        seed=seed)
+    return result, time.perf_counter() - start
+
+
+def main():
+    args = parse_arguments()
+    setup_logging()
+    config.read_configuration()
+    if config.SKIP_AI:
+        logger.error("GenAI is deactivated (SKIP_GENAI or GenAI/skip), benchmark not possible")
+        sys.exit(1)
+    if len(args.images) == 0:
+        logger.error("No images for the benchmark found")
+        sys.exit(1)
+
+    import src.AI as AI
+    prompt = config.get_style_prompt(args.style).replace("{prompt}", args.prompt)
+    negative_prompt = config.get_style_negative_prompt(args.style)
+    strength = config.get_style_strengths(args.style)
+    reference_steps = args.reference_steps or config.get_default_steps()
+    images = [Image.open(f).convert("RGB") for f in args.images]
+
+    logger.info("Warm up")
+    render(AI, images[0], prompt, negative_prompt, strength, args.reference_scheduler, 10, args.seed)
+
+    logger.info("Rendering references with scheduler '%s' and %d steps", args.reference_scheduler or "model", reference_steps)
+    references = []
+    reference_time = 0
+    for image in images:
+        result, duration = render(AI, image, prompt, negative_prompt, strength, args.reference_scheduler, reference_steps, args.seed)
+        references.append(result)
+        reference_time += duration
+
+    rows = [(args.reference_scheduler or "model", reference_steps, reference_time / len(images), 1.0, float("inf"))]
+    for scheduler in args.schedulers:
+        for steps in args.steps:
+            logger.info("Rendering with scheduler '%s' and %d steps", scheduler, steps)
+            durations, ssims, psnrs = [], [], []
+            for image, reference in zip(images, references):
+                result, duration = render(AI, image, prompt, negative_prompt, strength, scheduler, steps, args.seed)
+                durations.append(duration)
+                ssims.append(ssim(reference, result))
+                psnrs.append(psnr(reference, result))
+            rows.append((scheduler, steps, float(np.mean(durations)), float(np.mean(ssims)), float(np.mean(psnrs))))
+
+    print(f"\nStyle {args.style} ({config.get_style_name(args.style)}), {len(images)} image(s), strength {strength}")
+    print(f"{'scheduler':<16}{'steps':>6}{'latency [s]':>13}{'speedup':>9}{'SSIM':>8}{'PSNR [dB]':>11}")
+    for scheduler, steps, latency, ssim_value, psnr_value in rows:
+        print(f"{scheduler:<16}{steps:>6}{latency:>13.2f}{rows[0][2] / latency:>9.2f}{ssim_value:>8.3f}{psnr_value:>11.2f}")
+
+    if args.csv:
+        with open(args.csv, "w") as file:
+            file.write("scheduler,steps,latency,ssim,psnr\n")
+            for row in rows:
+                file.write(",".join(str(v) for v in row) + "\n")
+        logger.info("Results saved to %s", args.csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark the state backends of credits and image locks.
+
+Measures the latency of the operations on the hot path of uploads and generations
+(sync, try_spend, set_lock, get_lock) for the memory and the sqlite backend, with one
+thread and with several threads (like parallel requests or instances).
+
+Example:
+    python tools/benchmark_state_backend.py --operations 20000 --threads 4
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import tempfile
+import threading
+import time
+from src.state_backend import MemoryBackend, SQLiteBackend
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark the state backends")
+    parser.add_argument("--operations", type=int, default=20000, help="operations per measurement")
+    parser.add_argument("--threads", type=int, default=4, help="threads of the parallel measurement")
+    return parser.parse_args()
+
+
+def get_operations(backend, count: int) -> dict:
+    """The operations of the hot path, each called with the index of the call."""
+    now = time.time()
+    return {
+        "sync": lambda i: backend.sync_balance(f"session{i % 1000}", 10**9, now),
+        "try_spend": lambda i: backend.try_spend(f"session{i % 1000}", 10**9, 1, now),
+        "set_lock": lambda i: backend.set_lock(f"{i:040x}", now + 3600, {"gender": 0, "min_age": 0, "max_age": 0, "face_detected": False}, count),
+        "get_lock": lambda i: backend.get_lock(f"{i:040x}", now),
+    }
+
+
+def measure(operation, count: int, threads: int) -> float:
+    """Mean latency of one call in milliseconds."""
+    def run(start):
+        for i in range(start, count, threads):
+            operation(i)
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers: worker.start()
+    for worker in workers: worker.join()
+    return (time.perf_counter() - start) / count * threads * 1000
+
+
+def main():
+    args = parse_arguments()
+    with tempfile.TemporaryDirectory() as folder:
+        backends = {
+            "memory": MemoryBackend(),
+            "sqlite": SQLiteBackend(os.path.join(folder, "state.db")),
+        }
+        print(f"\n{'backend':<10}{'operation':<12}{'1 thread [ms]':>15}{f'{args.threads} threads [ms]':>17}")
+        for name, backend in backends.items():
+            for operation_name, operation in get_operations(backend, args.operations).items():
+                single = measure(operation, args.operations, 1)
+                parallel = measure(operation, args.operations, args.threads)
+                print(f"{name:<10}{operation_name:<12}{single:>15.4f}{parallel:>17.4f}")
+
+
+if __name__ == "__main__":
+    main()
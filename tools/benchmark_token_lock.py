@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark the token lock store.
+
+Measures the throughput of src.token_lock for insert, lookup and expiry of millions of
+locks and compares it with the former dict which was scanned completely on every upload
+(measured with fewer entries, as it needs O(n) per upload).
+
+Example:
+    python tools/benchmark_token_lock.py --entries 1000000 --dict-entries 20000
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from configparser import ConfigParser
+from unittest.mock import patch
+import src.config as config
+import src.token_lock as token_lock
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark the token lock store")
+    parser.add_argument("--entries", type=int, default=1000000, help="number of locks in the store")
+    parser.add_argument("--dict-entries", type=int, default=20000, help="number of locks for the former dict scan")
+    return parser.parse_args()
+
+
+def rate(count: int, seconds: float) -> str:
+    return f"{count / seconds:>12,.0f} ops/s"
+
+
+def set_max_entries(max_entries: int):
+    config.current_config = ConfigParser()
+    config.current_config.read_dict({"Token": {"lock_max_entries": max_entries}})
+
+
+def benchmark_store(entries: int):
+    """Insert, lookup and expiry of the lock store."""
+    token_lock.clear()
+    now = datetime.now()
+    keys = [f"{i:040x}" for i in range(entries)]
+    # expiries spread over one hour, so a later point in time expires a part of the locks
+    untils = [now + timedelta(seconds=random.uniform(600, 3600)) for _ in range(entries)]
+
+    set_max_entries(entries)
+    start = time.perf_counter()
+    for key, until in zip(keys, untils):
+        token_lock.lock(key, until, gender=0, min_age=0, max_age=0, face_detected=False)
+    print(f"insert  {entries:>10,} {rate(entries, time.perf_counter() - start)}")
+
+    lookups = random.sample(keys, min(entries, 200000))
+    start = time.perf_counter()
+    for key in lookups:
+        token_lock.get(key)
+    print(f"lookup  {len(lookups):>10,} {rate(len(lookups), time.perf_counter() - start)}")
+
+    with patch("src.token_lock.datetime") as mock_datetime:
+        mock_datetime.now.return_value = now + timedelta(minutes=30)
+        start = time.perf_counter()
+        removed = token_lock.purge()
+        print(f"expire  {removed:>10,} {rate(removed, time.perf_counter() - start)}")
+
+    # evictions if the store is full: each insert removes the lock which expires next
+    set_max_entries(token_lock.get_stats()["entries"])
+    count = min(entries, 200000)
+    start = time.perf_counter()
+    for i in range(count):
+        token_lock.lock(f"new{i}", now + timedelta(hours=2))
+    print(f"evict   {count:>10,} {rate(count, time.perf_counter() - start)}")
+    print(f"stats   {token_lock.get_stats()}")
+    token_lock.clear()
+
+
+def benchmark_dict(entries: int):
+    """The former dict with a scan of all locks on every upload."""
+    now = datetime.now()
+    locks = {f"{i:040x}": now + timedelta(seconds=random.uniform(1, 3600)) for i in range(entries)}
+    count = 1000
+    start = time.perf_counter()
+    for i in range(count):
+        locks[f"new{i}"] = now + timedelta(hours=2)
+        expired = [key for key, dt in locks.items() if dt < now]
+        for key in expired:
+            del locks[key]
+    print(f"dict scan with {entries:,} locks: {rate(count, time.perf_counter() - start)} (uploads)")
+
+
+def main():
+    args = parse_arguments()
+    random.seed(1)
+    benchmark_store(args.entries)
+    benchmark_dict(args.dict_entries)
+
+
+if __name__ == "__main__":
+    main()
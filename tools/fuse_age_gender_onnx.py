@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Merge the age and the gender model into one ONNX model with one input and the outputs "age" and "gender".
+
+Both models get the identical preprocessed face, so the fused model needs only one session call per batch
+and ORT can plan the memory for both networks together. The FaceAnalyzer uses the fused model
+(models/onnx/age_gender_googlenet.onnx) automatically if it exists. The application creates it on startup
+if the onnx package is installed, this tool can be used to (re)build it manually.
+
+Example:
+    python tools/fuse_age_gender_onnx.py --force
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+from src import config
+from src import onnx_fusion
+from src.logging_config import setup_logging
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Fuse the age and gender ONNX models")
+    parser.add_argument("--force", action="store_true", help="rebuild an existing fused model")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    setup_logging()
+    config.read_configuration()
+    if not onnx_fusion.build_age_gender_model(force=args.force):
+        sys.exit(1)
+    print(config.get_modelfile_onnx_age_gender_googlenet())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Move the input cache and the saved results from the daily folders into the content store.
+
+Before the content store, uploads were saved as <output_folder>/<date>/<SHA1>.jpg and results as
+<output_folder>/<date>/<SHA1>-<style>-....<ext>. This tool moves them to cache/ab/cd/<SHA1>.jpg and
+results/ab/cd/<file name>, adds them to the index of the content store and updates CachePath
+(tblInput) and Output (tblGenerations) of analytics. Uploads stored on several days are kept once.
+Empty daily folders are removed.
+
+Example:
+    python tools/migrate_content_store.py --dry-run
+    python tools/migrate_content_store.py --folder ./output
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import re
+import sqlite3
+import time
+import logging
+from src import config
+from src import content_store
+from src.logging_config import setup_logging
+
+logger = logging.getLogger("tools.migrate_content_store")
+
+DAY_FOLDER_PATTERN = re.compile(r"^\d{8}$")
+INPUT_FILE_PATTERN = re.compile(r"^([0-9a-f]{40})\.jpg$")
+OUTPUT_FILE_PATTERN = re.compile(r"^([0-9a-f]{40})-.+")
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Move the daily folders of the output folder into the content store")
+    parser.add_argument("--folder", default=None, help="output folder (Default: output_folder of the configuration)")
+    parser.add_argument("--db", default=None, help="analytics database (Default: analytics db_path of the configuration)")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be moved")
+    return parser.parse_args()
+
+
+def find_stored_files(folder: str):
+    """Yields kind, SHA1 and path relative to folder of all uploads and results in the daily folders."""
+    for day in sorted(os.listdir(folder)):
+        day_folder = os.path.join(folder, day)
+        if not DAY_FOLDER_PATTERN.match(day) or not os.path.isdir(day_folder): continue
+        for filename in sorted(os.listdir(day_folder)):
+            match = INPUT_FILE_PATTERN.match(filename)
+            if match:
+                yield content_store.KIND_INPUT, match.group(1), os.path.join(day, filename)
+                continue
+            match = OUTPUT_FILE_PATTERN.match(filename)
+            if match:
+                yield content_store.KIND_OUTPUT, match.group(1), os.path.join(day, filename)
+
+
+def update_analytics(db_path: str, inputs: dict, outputs: dict):
+    """Replaces the old paths in analytics, returns the number of changed rows."""
+    with sqlite3.connect(db_path) as connection:
+        changed = 0
+        for old_path, new_path in inputs.items():
+            changed += connection.execute("UPDATE tblInput SET CachePath = ? WHERE CachePath = ?", (new_path, old_path)).rowcount
+        for old_path, new_path in outputs.items():
+            changed += connection.execute("UPDATE tblGenerations SET Output = ? WHERE Output = ?", (new_path, old_path)).rowcount
+        connection.commit()
+    return changed
+
+
+def main():
+    args = parse_arguments()
+    setup_logging()
+    config.read_configuration()
+    folder = args.folder or config.get_output_folder()
+    db_path = args.db or config.get_analytics_db_path()
+
+    moved = {content_store.KIND_INPUT: {}, content_store.KIND_OUTPUT: {}}
+    duplicates = failed = 0
+    start = time.perf_counter()
+    for kind, sha1, old_path in find_stored_files(folder):
+        source = os.path.join(folder, old_path)
+        if kind == content_store.KIND_INPUT:
+            new_path = content_store.get_relative_path(sha1)
+        else:
+            new_path = content_store.get_relative_path(sha1, kind, os.path.basename(old_path))
+        if args.dry_run:
+            moved[kind][old_path] = new_path
+            continue
+        if kind == content_store.KIND_INPUT and os.path.exists(os.path.join(folder, new_path)):
+            # the same upload of another day
+            os.remove(source)
+            duplicates += 1
+        elif content_store.put_file(source, sha1, kind, move=True, root=folder) is None:
+            failed += 1
+            continue
+        moved[kind][old_path] = new_path
+
+    action = "would be moved" if args.dry_run else "moved"
+    logger.info("%i uploads (%i duplicates) and %i results %s, %i failed in %.1fs",
+        len(moved[content_store.KIND_INPUT]), duplicates, len(moved[content_store.KIND_OUTPUT]), action, failed, time.perf_counter() - start)
+    if args.dry_run: return
+
+    for day in os.listdir(folder):
+        day_folder = os.path.join(folder, day)
+        if DAY_FOLDER_PATTERN.match(day) and os.path.isdir(day_folder) and len(os.listdir(day_folder)) == 0:
+            os.rmdir(day_folder)
+
+    if os.path.exists(db_path):
+        changed = update_analytics(db_path, moved[content_store.KIND_INPUT], moved[content_store.KIND_OUTPUT])
+        logger.info("%i analytics entries updated", changed)
+    else:
+        logger.warning("Analytics database %s not found, paths are not updated", db_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -129,4 +129,10 @@ class TestGradioUISessionState(unittest.TestCase):
         o1.session = new_session
         self.assertEqual(o1.session, new_session, "test change session value")
         self.assertNotEqual(o2.token, new_session, "changed session should not be applied on second object")
-        
\ No newline at end of file
+        
+    def test_session_state_image_id(self):
+        """Test that the handle of the upload is serialized."""
+        o1 = SessionState(token=1, image_id="0123456789abcdef0123456789abcdef01234567")
+        o2 = SessionState.from_gradio_state(repr(o1))
+        self.assertEqual(o2.image_id, o1.image_id)
+        self.assertIsNone(SessionState.from_dict({"token": 1, "session": "s"}).image_id, "states saved before have no handle")
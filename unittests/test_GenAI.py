@@ -26,7 +26,8 @@ class Test_GenAI(unittest.TestCase):
                 prompt: str,
                 negative_prompt: str = "",
                 num_inference_steps=50,
-                strength=0.0):
+                strength=0.0,
+                generator=None):
             img = Image.new("RGB", image.size, color="blue")
             draw = ImageDraw.Draw(img)
             try:
@@ -133,6 +134,30 @@ class Test_GenAI(unittest.TestCase):
         self.assertEqual(result_image.width, config.get_max_size(), "width wrong")
         self.assertEqual(result_image.width, config.get_max_size(), "height wrong")
 
+    def test_compute_tile_boxes(self):
+        """Check that tiles have the same size, overlap and cover the whole image"""
+        boxes = src_GenAI._compute_tile_boxes(2000, 1000, 768, 128)
+        self.assertEqual(len(boxes), 6)
+        for left, top, right, bottom in boxes:
+            self.assertEqual((right - left, bottom - top), (768, 768))
+            self.assertGreaterEqual(left, 0)
+            self.assertLessEqual(right, 2000)
+            self.assertLessEqual(bottom, 1000)
+        self.assertEqual(max(b[2] for b in boxes), 2000, "last column must end at the border")
+        self.assertEqual(max(b[3] for b in boxes), 1000, "last row must end at the border")
+
+        # small images are not split
+        self.assertEqual(src_GenAI._compute_tile_boxes(512, 256, 768, 128), [(0, 0, 512, 256)])
+
+    def test_blend_tiles(self):
+        """Check that blending identical content does not create visible seams"""
+        img = Image.new("RGB", (1000, 800), color=(10, 120, 250))
+        boxes = src_GenAI._compute_tile_boxes(img.width, img.height, 512, 64)
+        tiles = [img.crop(box) for box in boxes]
+        result = src_GenAI._blend_tiles(img.size, boxes, tiles, 64)
+        self.assertEqual(result.size, img.size)
+        self.assertEqual(result.getextrema(), ((10, 10), (120, 120), (250, 250)))
+
 
 if __name__ == "__main__":
     unittest.main()
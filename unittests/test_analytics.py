@@ -66,6 +66,14 @@ class TestAnalytics(unittest.TestCase):
         self.assertEqual(result[4], "fr-CH")  
         self.assertEqual(result[5], user_agent)  
 
+    def test_get_client_details(self):
+        """Check the client class of mobiles and desktops."""
+        mobile = src_analytics.get_client_details("Mozilla/5.0 (Linux; Android 13; Pixel 7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Mobile Safari/537.36")
+        self.assertEqual(mobile["IsMobile"], 1)
+        self.assertEqual(mobile["OS"], "Android")
+        desktop = src_analytics.get_client_details("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/12.10240")
+        self.assertEqual(desktop, {"OS": "Windows", "Browser": "Edge", "IsMobile": 0})
+
     def test_save_session_private_ip(self):
         """Check if data is correctly stored into database."""
         # Beispielwert
@@ -215,6 +223,20 @@ class TestAnalytics(unittest.TestCase):
             self.assertEqual(result[6], max_age)
             self.assertEqual(result[7], token)
 
+    def test_get_top_uploaded_inputs(self):
+        """Check that recurring cached inputs are returned, most uploaded first."""
+        uploads = {"popular": 3, "recurring": 2, "single": 1}
+        for sha1, count in uploads.items():
+            for i in range(count):
+                src_analytics.save_input_image_details(session=str(uuid.uuid4()), sha1=sha1, cache_path_and_filename=f"20250101/{sha1}.jpg")
+        # not in the input cache
+        for i in range(4):
+            src_analytics.save_input_image_details(session=str(uuid.uuid4()), sha1="uncached")
+
+        result = src_analytics.get_top_uploaded_inputs(limit=10)
+        self.assertEqual(result, [("popular", "20250101/popular.jpg"), ("recurring", "20250101/recurring.jpg")])
+        self.assertEqual(len(src_analytics.get_top_uploaded_inputs(limit=1)), 1)
+
 class TestAnalyticsDisabled(unittest.TestCase):
 
     def setUp(self):
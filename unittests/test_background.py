@@ -0,0 +1,112 @@
+import unittest
+from unittest.mock import patch
+import threading
+import time
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from src.background import BackgroundGenerator
+
+class TestBackgroundGenerator(unittest.TestCase):
+
+    def setUp(self):
+        """Create a new generator for each test."""
+        self.generator = BackgroundGenerator(max_results=2)
+
+    def wait_idle(self, timeout: float = 5):
+        end = time.time() + timeout
+        while not self.generator.is_idle() and time.time() < end:
+            time.sleep(0.01)
+
+    def test_claim_finished_result(self):
+        """A finished job is served once."""
+        self.assertTrue(self.generator.submit("a", lambda cancel_event: "result a", owner="s1"))
+        self.wait_idle()
+        self.assertFalse(self.generator.submit("a", lambda cancel_event: "other", owner="s1"))
+        self.assertEqual(self.generator.claim("a"), "result a")
+        self.assertIsNone(self.generator.claim("a"))
+        self.assertEqual(self.generator.get_stats()["hits"], 1)
+
+    def test_claim_running_job_waits(self):
+        """A running job is promoted and not cancelled by a user generation."""
+        started = threading.Event()
+        def job(cancel_event):
+            started.set()
+            time.sleep(0.2)
+            return None if cancel_event.is_set() else "result"
+        self.generator.submit("a", job)
+        self.assertTrue(started.wait(5))
+        self.assertEqual(self.generator.claim("a", timeout=5), "result")
+        self.assertEqual(self.generator.get_stats()["preempted"], 0)
+
+    def test_foreground_preempts_running_job(self):
+        """A user generation cancels the running background job."""
+        started = threading.Event()
+        def job(cancel_event):
+            started.set()
+            cancel_event.wait(5)
+            return None if cancel_event.is_set() else "result"
+        self.generator.submit("a", job)
+        self.assertTrue(started.wait(5))
+        with self.generator.foreground():
+            self.assertFalse(self.generator.is_idle())
+        self.wait_idle()
+        self.assertIsNone(self.generator.claim("a"))
+        self.assertEqual(self.generator.get_stats()["preempted"], 1)
+
+    def test_foreground_waits_for_running_job(self):
+        """A user generation starts after the running job stopped, both use the same pipeline."""
+        started = threading.Event()
+        stopped = threading.Event()
+        def job(cancel_event):
+            started.set()
+            cancel_event.wait(5)
+            # e.g. the step of the pipeline which is running
+            time.sleep(0.1)
+            stopped.set()
+            return None
+        self.generator.submit("a", job)
+        self.assertTrue(started.wait(5))
+        with self.generator.foreground():
+            self.assertTrue(stopped.is_set())
+            self.assertIsNone(self.generator._running)
+
+    def test_waste_is_logged_without_hits(self):
+        """The counters are logged after finished jobs, not only on hits."""
+        with patch("src.background.LOG_INTERVAL", 1), self.assertLogs("src.background", level="INFO") as logs:
+            self.generator.submit("a", lambda cancel_event: None)
+            self.wait_idle()
+        self.assertIn("0 hits", logs.output[-1])
+
+    def test_jobs_wait_for_foreground(self):
+        """No job is started while a user generation is active."""
+        with self.generator.foreground():
+            self.generator.submit("a", lambda cancel_event: "result")
+            time.sleep(0.1)
+            self.assertIn("a", self.generator._jobs)
+            self.assertIsNone(self.generator._running)
+        self.wait_idle()
+        self.assertEqual(self.generator.claim("a"), "result")
+
+    def test_cancel_owner(self):
+        """All jobs and results of an owner are dropped."""
+        self.generator.submit("a", lambda cancel_event: "result a", owner="s1")
+        self.generator.submit("b", lambda cancel_event: "result b", owner="s2")
+        self.wait_idle()
+        self.generator.cancel_owner("s1")
+        self.assertIsNone(self.generator.claim("a"))
+        self.assertEqual(self.generator.claim("b"), "result b")
+
+    def test_results_are_bounded(self):
+        """Oldest results are dropped if too many results are not claimed."""
+        for key in ["a", "b", "c"]:
+            self.generator.submit(key, lambda cancel_event, key=key: key)
+            self.wait_idle()
+        self.assertIsNone(self.generator.claim("a"))
+        self.assertEqual(self.generator.claim("c"), "c")
+
+if __name__ == '__main__':
+    unittest.main()
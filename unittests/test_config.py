@@ -29,6 +29,10 @@ class TestConfiguration(unittest.TestCase):
                 'is_shared': random.choice([True, False]),
                 'save_output': random.choice([True, False]),
                 'output_folder': str(uuid.uuid4()),
+                'output_format': random.choice(["png", "jpeg", "webp"]),
+                'output_quality': random.randint(1, 100),
+                'output_effort': random.randint(0, 6),
+                'output_progressive': random.choice([True, False]),
                 'cache_enabled': random.choice([True, False]),
                 'analytics_db_path': str(uuid.uuid4()),
                 'analytics_enabled': random.choice([True, False]),
@@ -37,6 +41,7 @@ class TestConfiguration(unittest.TestCase):
             'Token': {
                 'enabled': random.choice([True, False]),
                 'image_blocked_in_minutes': random.randint(60,500 ),
+                'lock_max_entries': random.randint(1000, 1000000),
                 'explanation': str(uuid.uuid4()),
                 'new_image': random.randint(1, 10),
                 'bonus_for_face': random.randint(1, 10),
@@ -49,14 +54,66 @@ class TestConfiguration(unittest.TestCase):
                 'model_folder': str(uuid.uuid4()),
                 'safetensor_url': str(uuid.uuid4()),
                 'execution_batch_size': random.randint(1, 10),
+                'style_batch_size': random.randint(1, 10),
+                'postprocess_queue_size': random.randint(1, 64),
+                'postprocess_workers': random.randint(1, 8),
                 'default_steps': random.randint(10, 100),
                 'default_strength': random.uniform(0, 1),
+                'default_scheduler': random.choice(["", "dpm++2m", "unipc", "euler_a"]),
                 'max_size': random.randint(128, 4096),
+                'reduced_max_size': random.randint(8, 16) * 8,
+                'tiled_generation': random.choice([True, False]),
+                'speculative_generation': random.choice([True, False]),
+                'idle_precompute': random.choice([True, False]),
+                'precompute_top_n': random.randint(1, 50),
+                'precompute_daily_budget': random.randint(0, 7200),
+                'tile_size': random.randint(32, 128) * 8,
+                'tile_overlap': random.randint(0, 16) * 8,
+                'tile_batch_size': random.randint(1, 4),
             },
             'UI': {
                 'show_steps': random.choice([True, False]),
                 'show_strength': random.choice([True, False]),
-                'theme': str(uuid.uuid4())
+                'allow_feedback': random.choice([True, False]),
+                'allow_all_styles': random.choice([True, False]),
+                'show_resolution': random.choice([True, False]),
+                'theme': str(uuid.uuid4()),
+                'upload_analysis_workers': random.randint(1, 16),
+                'client_resize': random.choice([True, False]),
+                'max_upload_megapixels': random.randint(1, 200)
+            },
+            'ImageStore': {
+                'memory_budget_mb': random.randint(1, 1024),
+                'disk_budget_mb': random.randint(1, 4096),
+                'ttl_minutes': random.randint(1, 600),
+                'folder': str(uuid.uuid4()),
+            },
+            'State': {
+                'backend': 'memory',
+                'sqlite_path': str(uuid.uuid4()),
+            },
+            'Retention': {
+                'max_size_mb': random.randint(1, 100000),
+                'max_age_days': random.randint(1, 365),
+                'min_free_mb': random.randint(1, 10000),
+                'delivery_max_age_minutes': random.randint(1, 1440),
+                'interval_minutes': random.randint(1, 60),
+            },
+            'FaceAnalysis': {
+                'pool_size': random.randint(1, 16),
+                'intra_op_threads': random.randint(1, 8),
+                'inter_op_threads': random.randint(1, 4),
+                'adaptive_detection': random.choice([True, False]),
+                'min_face_size': round(random.uniform(0.01, 1), 3),
+                'coarse_detection': random.choice([True, False]),
+                'coarse_detection_size': random.randint(1, 20) * 32,
+                'max_faces': random.randint(0, 50),
+                'optimized_model_cache': random.choice([True, False]),
+                'optimized_model_folder': str(uuid.uuid4()),
+                'share_model_memory': random.choice([True, False]),
+                'face_cache_enabled': random.choice([True, False]),
+                'face_cache_path': str(uuid.uuid4()),
+                'face_cache_max_entries': random.randint(1, 100000),
             },
             'Styles': {
                 'style_count': random.randint(1, 10),
@@ -68,6 +125,8 @@ class TestConfiguration(unittest.TestCase):
             self.testconfiguration["Styles"][f"style_{i}_prompt"] = str(uuid.uuid4())
             self.testconfiguration["Styles"][f"style_{i}_negative_prompt"] = str(uuid.uuid4())
             self.testconfiguration["Styles"][f"style_{i}_strength"] = random.uniform(0, 1)
+            self.testconfiguration["Styles"][f"style_{i}_steps"] = random.randint(1, 100)
+            self.testconfiguration["Styles"][f"style_{i}_scheduler"] = random.choice(["ddim", "dpm++2m_karras", "unipc"])
 
     def tearDown(self):
         """nothing do now so far."""
@@ -94,7 +153,8 @@ class TestConfiguration(unittest.TestCase):
             "model_folder", 
             "safetensor_url", 
             "save_output", "output_folder",
-            "cache_enabled", "cache_folder"]
+            "cache_enabled", "cache_folder",
+            "optimized_model_folder"]
         for section in test_config.sections():
             for key in test_config[section].keys():
                 if key not in excludes:
@@ -117,6 +177,10 @@ class TestConfiguration(unittest.TestCase):
 
         self.assertEqual(src_config.is_save_output_enabled(), general["save_output"])
         self.assertEqual(src_config.get_output_folder(), general["output_folder"])
+        self.assertEqual(src_config.get_output_format(), general["output_format"])
+        self.assertEqual(src_config.get_output_quality(), general["output_quality"])
+        self.assertEqual(src_config.get_output_effort(), general["output_effort"])
+        self.assertEqual(src_config.is_output_progressive(), general["output_progressive"])
 
         self.assertEqual(src_config.is_input_cache_enabled(), general["cache_enabled"])
 
@@ -139,6 +203,10 @@ class TestConfiguration(unittest.TestCase):
 
         self.assertEqual(src_config.is_save_output_enabled(), False)
         self.assertEqual(src_config.get_output_folder(), "./output/")
+        self.assertEqual(src_config.get_output_format(), "png")
+        self.assertEqual(src_config.get_output_quality(), 90)
+        self.assertEqual(src_config.get_output_effort(), 4)
+        self.assertEqual(src_config.is_output_progressive(), False)
 
         self.assertEqual(src_config.is_input_cache_enabled(), False)
 
@@ -158,6 +226,7 @@ class TestConfiguration(unittest.TestCase):
         self.assertEqual(src_config.get_token_explanation(), section["explanation"])
         self.assertEqual(src_config.get_token_for_new_image(), section["new_image"])
         self.assertEqual(src_config.get_token_time_lock_for_new_image(), section["image_blocked_in_minutes"])
+        self.assertEqual(src_config.get_token_lock_max_entries(), section["lock_max_entries"])
         self.assertEqual(src_config.get_token_bonus_for_face(), section["bonus_for_face"])
         self.assertEqual(src_config.get_token_bonus_for_smile(), section["bonus_for_smile"])
         self.assertEqual(src_config.get_token_bonus_for_cuteness(), section["bonus_for_cuteness"])
@@ -174,6 +243,7 @@ class TestConfiguration(unittest.TestCase):
         self.assertEqual(src_config.get_token_explanation(), "")
         self.assertEqual(src_config.get_token_for_new_image(), 3)
         self.assertEqual(src_config.get_token_time_lock_for_new_image(), 240)
+        self.assertEqual(src_config.get_token_lock_max_entries(), 100000)
 
         self.assertEqual(src_config.get_token_bonus_for_face(), 2)
         self.assertEqual(src_config.get_token_bonus_for_smile(), 1)
@@ -188,7 +258,13 @@ class TestConfiguration(unittest.TestCase):
         section = self.testconfiguration["UI"]
         self.assertEqual(src_config.UI_show_strength_slider(), section["show_strength"])
         self.assertEqual(src_config.UI_show_steps_slider(), section["show_steps"])
+        self.assertEqual(src_config.UI_show_resolution_choice(), section["show_resolution"])
         self.assertEqual(src_config.UI_get_gradio_theme(), section["theme"])
+        self.assertEqual(src_config.UI_get_upload_analysis_workers(), section["upload_analysis_workers"])
+        self.assertEqual(src_config.UI_is_client_resize_enabled(), section["client_resize"])
+        self.assertEqual(src_config.UI_get_max_upload_megapixels(), section["max_upload_megapixels"])
+        self.assertEqual(src_config.UI_show_feedback_area(), section["allow_feedback"])
+        self.assertEqual(src_config.UI_show_all_styles_button(), section["allow_all_styles"])
 
     def test_UI_defaults(self):
         """Check section UI."""
@@ -198,7 +274,13 @@ class TestConfiguration(unittest.TestCase):
 
         self.assertEqual(src_config.UI_show_strength_slider(), False)
         self.assertEqual(src_config.UI_show_steps_slider(), False)
+        self.assertEqual(src_config.UI_show_resolution_choice(), False)
         self.assertEqual(src_config.UI_get_gradio_theme(), "")
+        self.assertEqual(src_config.UI_get_upload_analysis_workers(), 4)
+        self.assertTrue(src_config.UI_is_client_resize_enabled())
+        self.assertEqual(src_config.UI_get_max_upload_megapixels(), 50)
+        self.assertEqual(src_config.UI_show_feedback_area(), False)
+        self.assertEqual(src_config.UI_show_all_styles_button(), False)
 
     def test_AI_settings(self):
         """Check section UI."""
@@ -210,10 +292,23 @@ class TestConfiguration(unittest.TestCase):
         self.assertEqual(src_config.get_default_strength(), section["default_strength"])
         self.assertEqual(src_config.get_default_steps(), section["default_steps"])
         self.assertEqual(src_config.GenAI_get_execution_batch_size(), section["execution_batch_size"])
+        self.assertEqual(src_config.GenAI_get_style_batch_size(), section["style_batch_size"])
+        self.assertEqual(src_config.GenAI_get_postprocess_queue_size(), section["postprocess_queue_size"])
+        self.assertEqual(src_config.GenAI_get_postprocess_workers(), section["postprocess_workers"])
         self.assertEqual(src_config.get_model(), section["default_model"])
         self.assertEqual(src_config.get_model_folder(), section["model_folder"])
         self.assertEqual(src_config.get_model_url(), section["safetensor_url"])
         self.assertEqual(src_config.get_max_size(), section["max_size"])
+        self.assertEqual(src_config.get_default_scheduler(), section["default_scheduler"])
+        self.assertEqual(src_config.GenAI_is_tiled_generation_enabled(), section["tiled_generation"])
+        self.assertEqual(src_config.GenAI_get_reduced_max_size(), section["reduced_max_size"])
+        self.assertEqual(src_config.GenAI_is_speculative_generation_enabled(), section["speculative_generation"])
+        self.assertEqual(src_config.GenAI_is_idle_precompute_enabled(), section["idle_precompute"])
+        self.assertEqual(src_config.GenAI_get_precompute_top_n(), section["precompute_top_n"])
+        self.assertEqual(src_config.GenAI_get_precompute_daily_budget(), section["precompute_daily_budget"])
+        self.assertEqual(src_config.GenAI_get_tile_size(), section["tile_size"])
+        self.assertEqual(src_config.GenAI_get_tile_overlap(), section["tile_overlap"])
+        self.assertEqual(src_config.GenAI_get_tile_batch_size(), section["tile_batch_size"])
 
     def test_AI_settings_autocorrection(self):
         """Check section UI."""
@@ -254,12 +349,130 @@ class TestConfiguration(unittest.TestCase):
         self.assertEqual(src_config.get_default_steps(), 50)
 
         self.assertEqual(src_config.GenAI_get_execution_batch_size(), 1)
+        self.assertEqual(src_config.GenAI_get_style_batch_size(), 4)
+        self.assertEqual(src_config.GenAI_get_postprocess_queue_size(), 8)
+        self.assertEqual(src_config.GenAI_get_postprocess_workers(), 1)
 
         self.assertEqual(src_config.get_model(), "./models/toonify.safetensors")
         self.assertEqual(src_config.get_model_folder(), "./models/")
         self.assertEqual(src_config.get_model_url(
         ), "https://civitai.com/api/download/models/244831?type=Model&format=SafeTensor&size=pruned&fp=fp16")
         self.assertEqual(src_config.get_max_size(), 1024)
+        self.assertEqual(src_config.get_default_scheduler(), "")
+        self.assertEqual(src_config.GenAI_is_tiled_generation_enabled(), False)
+        self.assertEqual(src_config.GenAI_get_reduced_max_size(), 1024)
+        self.assertEqual(src_config.GenAI_is_speculative_generation_enabled(), False)
+        self.assertEqual(src_config.GenAI_is_idle_precompute_enabled(), False)
+        self.assertEqual(src_config.GenAI_get_precompute_top_n(), 10)
+        self.assertEqual(src_config.GenAI_get_precompute_daily_budget(), 1800)
+        self.assertEqual(src_config.GenAI_get_tile_size(), 768)
+        self.assertEqual(src_config.GenAI_get_tile_overlap(), 128)
+        self.assertEqual(src_config.GenAI_get_tile_batch_size(), 1)
+
+    def test_ImageStore_settings(self):
+        """Check section ImageStore."""
+        src_config.current_config = ConfigParser()
+        src_config.current_config.read_dict(self.testconfiguration)
+
+        section = self.testconfiguration["ImageStore"]
+        self.assertEqual(src_config.ImageStore_get_memory_budget_mb(), section["memory_budget_mb"])
+        self.assertEqual(src_config.ImageStore_get_disk_budget_mb(), section["disk_budget_mb"])
+        self.assertEqual(src_config.ImageStore_get_ttl_minutes(), section["ttl_minutes"])
+        self.assertEqual(src_config.ImageStore_get_folder(), section["folder"])
+
+    def test_ImageStore_defaults(self):
+        """Check section ImageStore."""
+        src_config.current_config = ConfigParser()
+        src_config.current_config.read_dict({})
+
+        self.assertEqual(src_config.ImageStore_get_memory_budget_mb(), 256)
+        self.assertEqual(src_config.ImageStore_get_disk_budget_mb(), 2048)
+        self.assertEqual(src_config.ImageStore_get_ttl_minutes(), 60)
+        self.assertEqual(src_config.ImageStore_get_folder(), "./cache/image_store")
+
+    def test_State_settings(self):
+        """Check section State."""
+        src_config.current_config = ConfigParser()
+        src_config.current_config.read_dict(self.testconfiguration)
+
+        section = self.testconfiguration["State"]
+        self.assertEqual(src_config.State_get_backend(), section["backend"])
+        self.assertEqual(src_config.State_get_sqlite_path(), section["sqlite_path"])
+
+        src_config.current_config.read_dict({"State": {"backend": " SQLite "}})
+        self.assertEqual(src_config.State_get_backend(), "sqlite")
+
+    def test_State_defaults(self):
+        """Check section State."""
+        src_config.current_config = ConfigParser()
+        src_config.current_config.read_dict({})
+
+        self.assertEqual(src_config.State_get_backend(), "memory")
+        self.assertEqual(src_config.State_get_sqlite_path(), "./cache/state.db")
+
+    def test_Retention_settings(self):
+        """Check section Retention."""
+        src_config.current_config = ConfigParser()
+        src_config.current_config.read_dict(self.testconfiguration)
+
+        section = self.testconfiguration["Retention"]
+        self.assertEqual(src_config.Retention_get_max_size_mb(), section["max_size_mb"])
+        self.assertEqual(src_config.Retention_get_max_age_days(), section["max_age_days"])
+        self.assertEqual(src_config.Retention_get_min_free_mb(), section["min_free_mb"])
+        self.assertEqual(src_config.Retention_get_delivery_max_age_minutes(), section["delivery_max_age_minutes"])
+        self.assertEqual(src_config.Retention_get_interval_minutes(), section["interval_minutes"])
+
+    def test_Retention_defaults(self):
+        """Check section Retention."""
+        src_config.current_config = ConfigParser()
+        src_config.current_config.read_dict({})
+
+        self.assertEqual(src_config.Retention_get_max_size_mb(), 0)
+        self.assertEqual(src_config.Retention_get_max_age_days(), 0)
+        self.assertEqual(src_config.Retention_get_min_free_mb(), 0)
+        self.assertEqual(src_config.Retention_get_delivery_max_age_minutes(), 60)
+        self.assertEqual(src_config.Retention_get_interval_minutes(), 10)
+
+    def test_FaceAnalysis_settings(self):
+        """Check section FaceAnalysis."""
+        src_config.current_config = ConfigParser()
+        src_config.current_config.read_dict(self.testconfiguration)
+
+        section = self.testconfiguration["FaceAnalysis"]
+        self.assertEqual(src_config.FaceAnalysis_get_pool_size(), section["pool_size"])
+        self.assertEqual(src_config.FaceAnalysis_get_intra_op_threads(), section["intra_op_threads"])
+        self.assertEqual(src_config.FaceAnalysis_get_inter_op_threads(), section["inter_op_threads"])
+        self.assertEqual(src_config.FaceAnalysis_is_adaptive_detection_enabled(), section["adaptive_detection"])
+        self.assertAlmostEqual(src_config.FaceAnalysis_get_min_face_size(), section["min_face_size"])
+        self.assertEqual(src_config.FaceAnalysis_is_coarse_detection_enabled(), section["coarse_detection"])
+        self.assertEqual(src_config.FaceAnalysis_get_coarse_detection_size(), section["coarse_detection_size"])
+        self.assertEqual(src_config.FaceAnalysis_get_max_faces(), section["max_faces"])
+        self.assertEqual(src_config.FaceAnalysis_is_optimized_model_cache_enabled(), section["optimized_model_cache"])
+        self.assertEqual(src_config.FaceAnalysis_get_optimized_model_folder(), section["optimized_model_folder"])
+        self.assertEqual(src_config.FaceAnalysis_is_model_memory_shared(), section["share_model_memory"])
+        self.assertEqual(src_config.FaceAnalysis_is_face_cache_enabled(), section["face_cache_enabled"])
+        self.assertEqual(src_config.FaceAnalysis_get_face_cache_path(), section["face_cache_path"])
+        self.assertEqual(src_config.FaceAnalysis_get_face_cache_max_entries(), section["face_cache_max_entries"])
+
+    def test_FaceAnalysis_defaults(self):
+        """Check section FaceAnalysis."""
+        src_config.current_config = ConfigParser()
+        src_config.current_config.read_dict({})
+
+        self.assertEqual(src_config.FaceAnalysis_get_intra_op_threads(), 2)
+        self.assertEqual(src_config.FaceAnalysis_get_inter_op_threads(), 1)
+        self.assertEqual(src_config.FaceAnalysis_get_pool_size(), max(1, (os.cpu_count() or 1) // 2))
+        self.assertEqual(src_config.FaceAnalysis_is_adaptive_detection_enabled(), True)
+        self.assertEqual(src_config.FaceAnalysis_get_min_face_size(), 0.04)
+        self.assertEqual(src_config.FaceAnalysis_is_coarse_detection_enabled(), True)
+        self.assertEqual(src_config.FaceAnalysis_get_coarse_detection_size(), 160)
+        self.assertEqual(src_config.FaceAnalysis_get_max_faces(), 0)
+        self.assertEqual(src_config.FaceAnalysis_is_optimized_model_cache_enabled(), True)
+        self.assertEqual(src_config.FaceAnalysis_get_optimized_model_folder(), os.path.join("./models/", "onnx/optimized"))
+        self.assertEqual(src_config.FaceAnalysis_is_model_memory_shared(), True)
+        self.assertEqual(src_config.FaceAnalysis_is_face_cache_enabled(), True)
+        self.assertEqual(src_config.FaceAnalysis_get_face_cache_path(), "./analytics/face_cache.db")
+        self.assertEqual(src_config.FaceAnalysis_get_face_cache_max_entries(), 100000)
 
     def test_Styles_settings(self):
         """Check section UI."""
@@ -277,12 +490,16 @@ class TestConfiguration(unittest.TestCase):
             self.assertEqual(src_config.get_style_negative_prompt(
                 i), section["general_negative_prompt"] + "," + section[f"style_{i}_negative_prompt"])
             self.assertEqual(src_config.get_style_strengths(i), section[f"style_{i}_strength"])
+            self.assertEqual(src_config.get_style_steps(i), section[f"style_{i}_steps"])
+            self.assertEqual(src_config.get_style_scheduler(i), section[f"style_{i}_scheduler"])
 
         # not existing styles and defaults
         self.assertEqual(src_config.get_style_name(99), "Style 99")
         self.assertEqual(src_config.get_style_prompt(99), "")
         self.assertEqual(src_config.get_style_negative_prompt(99), section["general_negative_prompt"] + ",")
         self.assertEqual(src_config.get_style_strengths(99), self.testconfiguration["GenAI"]["default_strength"])
+        self.assertEqual(src_config.get_style_steps(99), src_config.get_default_steps())
+        self.assertEqual(src_config.get_style_scheduler(99), self.testconfiguration["GenAI"]["default_scheduler"])
 
 
 if __name__ == "__main__":
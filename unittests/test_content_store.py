@@ -0,0 +1,84 @@
+import unittest
+import tempfile
+import threading
+from PIL import Image
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.content_store as content_store
+from src.utils import compute_image_hash
+
+class TestContentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        self.image = Image.new("RGB", (32, 32), color="red")
+        self.sha1 = compute_image_hash(self.image)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_relative_path(self):
+        """paths are sharded by the first two byte pairs of the hash"""
+        sha1 = "abcdef" + "0" * 34
+        self.assertEqual(content_store.get_relative_path(sha1), os.path.join("cache", "ab", "cd", sha1 + ".jpg"))
+        self.assertEqual(content_store.get_relative_path(sha1, content_store.KIND_OUTPUT, "result.webp"),
+            os.path.join("results", "ab", "cd", "result.webp"))
+
+    def test_put_image(self):
+        """an upload is stored once, uploading it again returns the same path"""
+        relative_path = content_store.put_image(self.image, self.sha1, root=self.root)
+        file_path = os.path.join(self.root, relative_path)
+        self.assertTrue(os.path.exists(file_path))
+        modified = os.stat(file_path).st_mtime_ns
+
+        self.assertEqual(content_store.put_image(self.image, self.sha1, root=self.root), relative_path)
+        self.assertEqual(os.stat(file_path).st_mtime_ns, modified, "the file is not written again")
+        self.assertEqual(content_store.get_paths(self.sha1, root=self.root), [relative_path])
+        # no temporary files are left
+        self.assertEqual(os.listdir(os.path.dirname(file_path)), [self.sha1 + ".jpg"])
+
+    def test_put_file(self):
+        """results are linked beside the other results of the upload"""
+        source = os.path.join(self.root, "result-1.png")
+        self.image.save(source)
+        relative_path = content_store.put_file(source, self.sha1, root=self.root)
+        self.assertTrue(os.path.samefile(source, os.path.join(self.root, relative_path)))
+
+        moved = os.path.join(self.root, "result-2.png")
+        self.image.save(moved)
+        relative_path2 = content_store.put_file(moved, self.sha1, move=True, root=self.root)
+        self.assertFalse(os.path.exists(moved))
+        self.assertTrue(os.path.exists(os.path.join(self.root, relative_path2)))
+
+        self.assertEqual(content_store.get_paths(self.sha1, content_store.KIND_OUTPUT, root=self.root), [relative_path, relative_path2])
+        self.assertEqual(content_store.get_paths(self.sha1, content_store.KIND_INPUT, root=self.root), [])
+        stats = content_store.get_stats(root=self.root)
+        self.assertEqual(stats[content_store.KIND_OUTPUT]["files"], 2)
+
+        content_store.remove_from_index(relative_path, root=self.root)
+        self.assertEqual(content_store.get_paths(self.sha1, root=self.root), [relative_path2])
+
+    def test_put_file_missing(self):
+        """errors are logged and return None"""
+        self.assertIsNone(content_store.put_file(os.path.join(self.root, "missing.png"), self.sha1, root=self.root))
+
+    def test_parallel_put_image(self):
+        """parallel uploads of the same image never leave a partial file"""
+        results = []
+        def put():
+            results.append(content_store.put_image(self.image, self.sha1, root=self.root))
+        threads = [threading.Thread(target=put) for _ in range(4)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(set(results), {content_store.get_relative_path(self.sha1)})
+        with Image.open(os.path.join(self.root, results[0])) as image:
+            image.load()
+            self.assertEqual(image.size, (32, 32))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+from configparser import ConfigParser
+import unittest
+import uuid
+import time
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.config as config
+import src.face_cache as face_cache
+
+class TestFaceCache(unittest.TestCase):
+
+    def setUp(self):
+        """Use a new database for each test."""
+        config.current_config = ConfigParser()
+        self.db_path = f"./unittests/tmp/" + str(uuid.uuid4())
+        config.current_config.read_dict({
+            'FaceAnalysis': {
+                'face_cache_enabled': 'true',
+                'face_cache_path': self.db_path,
+                'face_cache_max_entries': '2',
+            }
+        })
+        self.assertTrue(face_cache.start())
+
+    def tearDown(self):
+        """Remove database file."""
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        config.current_config = None
+
+    def test_save_and_get(self):
+        """Check that faces are returned as they were saved, unknown images return None."""
+        faces = [{"age": "(25-32)", "minAge": 25, "maxAge": 32, "isMale": True, "isFemale": False, "gender": "Male", "smiling": False}]
+        self.assertIsNone(face_cache.get_faces("abc"))
+        self.assertTrue(face_cache.save_faces("abc", faces))
+        self.assertTrue(face_cache.save_faces("no_face", []))
+        self.assertEqual(face_cache.get_faces("abc"), faces)
+        self.assertEqual(face_cache.get_faces("no_face"), [])
+
+    def test_prune_least_recently_used(self):
+        """Check that the least recently used entries are removed above the limit."""
+        for sha1 in ["a", "b", "c"]:
+            face_cache.save_faces(sha1, [])
+            time.sleep(0.01)
+        # reading makes "a" the most recently used entry
+        face_cache.get_faces("a")
+        self.assertEqual(face_cache.prune(), 1)
+        self.assertIsNone(face_cache.get_faces("b"))
+        self.assertEqual(face_cache.get_faces("a"), [])
+        self.assertEqual(face_cache.get_faces("c"), [])
+
+    def test_disabled(self):
+        """Check that nothing is stored if the cache is disabled."""
+        config.current_config.read_dict({'FaceAnalysis': {'face_cache_enabled': 'false'}})
+        self.assertTrue(face_cache.save_faces("abc", []))
+        self.assertIsNone(face_cache.get_faces("abc"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,6 @@
 import unittest
+import os
+import tempfile
 from unittest.mock import patch, MagicMock
 import gradio as gr
 from src.UI import (
@@ -6,13 +8,28 @@ from src.UI import (
     wrap_handle_input_response,
     wrap_generate_image_response,
     action_handle_input_file,
-    action_generate_image
+    action_generate_image,
+    action_generate_all_styles,
+    action_session_initialized,
+    action_show_upgrade,
+    get_resolution_stats,
+    RESOLUTION_FULL,
+    flush_background_tasks
 )
 from PIL import Image
 import numpy as np
 import src.config as config
+import src.utils as utils
+import src.token_lock as token_lock
+import src.content_store as content_store
 from hashlib import sha1
 from datetime import datetime, timedelta
+import time
+import threading
+
+def handle_input_file(*args):
+    """Runs the streamed upload handler and returns the final response."""
+    return list(action_handle_input_file(*args))[-1]
 
 class TestGradioUI(unittest.TestCase):
     def setUp(self):
@@ -82,8 +99,7 @@ class TestGradioUI(unittest.TestCase):
 class TestActionHandleInputFile(unittest.TestCase):
     def setUp(self):
         """Set up test fixtures before each test method."""
-        from src.UI import session_image_hashes
-        session_image_hashes.clear()  # Clear shared state
+        token_lock.clear()  # Clear shared state
         self.session_state = SessionState(token=5)
         self.test_image = Image.fromarray(np.zeros((100, 100, 3), dtype=np.uint8))
         self.mock_request = MagicMock()
@@ -93,25 +109,57 @@ class TestActionHandleInputFile(unittest.TestCase):
             "user-agent": "test-browser",
             "accept-language": "en-US"
         }
+        # results of former test runs must not be used
+        self.face_cache_patcher = patch('src.UI.face_cache')
+        self.mock_face_cache = self.face_cache_patcher.start()
+        self.mock_face_cache.get_faces.return_value = None
+        self.save_to_disk_patcher = patch('src.image_store.save_to_disk')
+        self.save_to_disk_patcher.start()
+        # uploads and results are not stored in the output folder (the mocked config has no real folder)
+        self.input_cache_patcher = patch('src.UI._get_input_cache_folder', return_value=None)
+        self.mock_input_cache_folder = self.input_cache_patcher.start()
+        self.output_patcher = patch('src.UI._get_output_folder', return_value=None)
+        self.output_patcher.start()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.delivery_patcher = patch('src.UI.get_delivery_folder', return_value=self.temp_dir.name)
+        self.delivery_patcher.start()
 
     def tearDown(self):
         """Clean up after each test method."""
-        from src.UI import session_image_hashes
-        session_image_hashes.clear()  # Clear shared state
+        token_lock.clear()  # Clear shared state
+        flush_background_tasks(timeout=5)
+        self.face_cache_patcher.stop()
+        self.save_to_disk_patcher.stop()
+        self.input_cache_patcher.stop()
+        self.output_patcher.stop()
+        self.delivery_patcher.stop()
+        self.temp_dir.cleanup()
 
     @patch('src.UI.config')
     @patch('src.UI.analytics')
     def test_handle_input_no_image(self, mock_analytics, mock_config):
         """Test handling when no image is provided."""
-        response = action_handle_input_file(self.mock_request, None, self.session_state)
+        response = handle_input_file(self.mock_request, None, self.session_state)
         self.assertEqual(response[0], gr.update(interactive=False))
         self.assertEqual(response[1], "")
 
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    def test_handle_input_too_large(self, mock_analytics, mock_config):
+        """Test that an upload above the size limit is rejected without credits."""
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        self.session_state.token = 0
+        with patch('src.ingest.check_size', side_effect=ValueError("too large")):
+            response = handle_input_file(self.mock_request, self.test_image, self.session_state)
+        self.assertEqual(response[0], gr.update(interactive=False))
+        self.assertIsNone(response[2].image_id)
+        self.assertEqual(response[2].token, 0)
+
     @patch('src.UI.config')
     @patch('src.UI.analytics')
     def test_handle_input_no_request(self, mock_analytics, mock_config):
         """Test handling when no request object is provided (API usage)."""
-        response = action_handle_input_file(None, self.test_image, self.session_state)
+        response = handle_input_file(None, self.test_image, self.session_state)
         self.assertEqual(response[0], gr.update(interactive=False))
 
     @patch('src.UI.config')
@@ -124,11 +172,34 @@ class TestActionHandleInputFile(unittest.TestCase):
         mock_config.is_feature_generation_with_token_enabled.return_value = False
         mock_describe.return_value = "Test description"
 
-        response = action_handle_input_file(self.mock_request, self.test_image, self.session_state)
+        response = handle_input_file(self.mock_request, self.test_image, self.session_state)
         
+        # analytics are written after the response
+        self.assertTrue(flush_background_tasks(timeout=5))
         mock_analytics.save_input_image_details.assert_called_once()
         self.assertEqual(response[1], "Test description")
 
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.action_describe_image')
+    def test_handle_input_with_input_cache(self, mock_describe, mock_analytics, mock_config):
+        """Test that the upload is stored once in the content store and analytics gets its path."""
+        with tempfile.TemporaryDirectory() as output_folder:
+            mock_config.get_token_time_lock_for_new_image.return_value = 5
+            mock_config.is_analytics_enabled.return_value = True
+            mock_config.is_feature_generation_with_token_enabled.return_value = False
+            self.mock_input_cache_folder.return_value = output_folder
+            mock_describe.return_value = "Test description"
+
+            handle_input_file(self.mock_request, self.test_image, self.session_state)
+            self.assertTrue(flush_background_tasks(timeout=5))
+
+            kwargs = mock_analytics.save_input_image_details.call_args.kwargs
+            cache_path = kwargs["cache_path_and_filename"]
+            self.assertEqual(cache_path, content_store.get_relative_path(kwargs["sha1"]))
+            self.assertTrue(os.path.exists(os.path.join(output_folder, cache_path)))
+            self.assertEqual(content_store.get_paths(kwargs["sha1"], content_store.KIND_INPUT, root=output_folder), [cache_path])
+
     @patch('src.UI.config')
     @patch('src.UI.analytics')
     @patch('src.UI.action_describe_image')
@@ -145,12 +216,144 @@ class TestActionHandleInputFile(unittest.TestCase):
         mock_describe.return_value = "Test description"
         mock_faces.return_value = [{"isFemale": True, "maxAge": 25, "minAge": 20}]
 
-        response = action_handle_input_file(self.mock_request, self.test_image, self.session_state)
+        response = handle_input_file(self.mock_request, self.test_image, self.session_state)
         
         session_state_dict = response[2]
         reconstructed_state = session_state_dict
         self.assertGreater(reconstructed_state.token, self.session_state.token)
 
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.action_describe_image')
+    @patch('src.UI.analyze_faces')
+    def test_handle_input_parallel_analysis(self, mock_faces, mock_describe, mock_analytics, mock_config):
+        """Test that captioning and face analysis run at the same time."""
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        mock_config.get_token_for_new_image.return_value = 1
+        mock_config.get_token_time_lock_for_new_image.return_value = 60
+        def describe(image):
+            time.sleep(0.5)
+            return "Test description"
+        def faces(image):
+            time.sleep(0.5)
+            return []
+        mock_describe.side_effect = describe
+        mock_faces.side_effect = faces
+
+        start = time.perf_counter()
+        response = handle_input_file(self.mock_request, self.test_image, self.session_state)
+        self.assertLess(time.perf_counter() - start, 0.9)
+        self.assertEqual(response[1], "Test description")
+        self.assertEqual(response[2].token, 5 + 1)
+        self.assertEqual(response[2].image_id, sha1(self.test_image.tobytes()).hexdigest())
+
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.action_describe_image')
+    @patch('src.UI.analyze_faces')
+    def test_handle_input_parallel_same_image(self, mock_faces, mock_describe, mock_analytics, mock_config):
+        """Test that parallel uploads of the same image get the credits once."""
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        mock_config.get_token_for_new_image.return_value = 1
+        mock_config.get_token_time_lock_for_new_image.return_value = 60
+        mock_describe.return_value = "Test description"
+        mock_faces.return_value = []
+        barrier = threading.Barrier(4)
+        tokens = []
+        def upload():
+            barrier.wait()
+            tokens.append(handle_input_file(self.mock_request, self.test_image, SessionState(token=0))[2].token)
+        threads = [threading.Thread(target=upload) for _ in range(4)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(sorted(tokens), [0, 0, 0, 1])
+
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.AI')
+    @patch('src.UI.action_describe_image')
+    @patch('src.UI.analyze_faces')
+    def test_handle_input_streamed_bonus(self, mock_faces, mock_describe, mock_ai, mock_analytics, mock_config):
+        """Test that the start button is enabled before the face bonus and a generation in between keeps its cost."""
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        mock_config.SKIP_AI = False
+        mock_config.get_token_for_new_image.return_value = 1
+        mock_config.get_token_bonus_for_face.return_value = 2
+        mock_config.get_token_bonus_for_smile.return_value = 0
+        mock_config.get_token_bonus_for_cuteness.return_value = 0
+        mock_config.get_token_time_lock_for_new_image.return_value = 60
+        mock_describe.return_value = "Test description"
+        mock_ai.generate_image.return_value = self.test_image
+        faces_released = threading.Event()
+        def faces(image):
+            faces_released.wait(5)
+            return [{"isFemale": False, "isMale": True, "maxAge": 32, "minAge": 25}]
+        mock_faces.side_effect = faces
+
+        responses = action_handle_input_file(self.mock_request, self.test_image, SessionState(token=0))
+        first = next(responses)
+        self.assertEqual(first[0], gr.update(interactive=True))
+        self.assertEqual(first[2].token, 1)
+
+        # the generation starts with the state of the first response, before the bonus arrived
+        generated = action_generate_image(self.mock_request, self.test_image, "Style", 50, 10, "Test description", first[2])
+        self.assertEqual(generated[1].token, 0)
+        faces_released.set()
+        last = list(responses)[-1]
+        self.assertEqual(last[1], "Test description")
+        self.assertEqual(last[2].token, 1 + 2 - 1)
+
+    @patch('src.UI.FACE_ANALYSIS_ENABLED', True)
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.action_describe_image')
+    @patch('src.UI.analyze_faces')
+    def test_handle_input_face_cache(self, mock_faces, mock_describe, mock_analytics, mock_config):
+        """Test that cached faces are used instead of a new analysis."""
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        mock_config.get_token_for_new_image.return_value = 1
+        mock_config.get_token_bonus_for_face.return_value = 2
+        mock_config.get_token_bonus_for_smile.return_value = 0
+        mock_config.get_token_bonus_for_cuteness.return_value = 0
+        mock_config.get_token_time_lock_for_new_image.return_value = 60
+        mock_describe.return_value = "Test description"
+        self.mock_face_cache.get_faces.return_value = [{"isFemale": False, "isMale": True, "maxAge": 32, "minAge": 25}]
+
+        response = handle_input_file(self.mock_request, self.test_image, self.session_state)
+
+        mock_faces.assert_not_called()
+        self.mock_face_cache.save_faces.assert_not_called()
+        self.assertEqual(response[2].token, 5 + 1 + 2)
+
+        # a miss analyzes the image and saves the result
+        token_lock.clear()
+        self.mock_face_cache.get_faces.return_value = None
+        mock_faces.return_value = []
+        handle_input_file(self.mock_request, self.test_image, SessionState(token=0))
+        mock_faces.assert_called_once()
+        self.assertTrue(flush_background_tasks(timeout=5))
+        self.mock_face_cache.save_faces.assert_called_once_with(sha1(self.test_image.tobytes()).hexdigest(), [])
+
+    @patch('src.UI.FACE_ANALYSIS_ENABLED', True)
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.action_describe_image')
+    @patch('src.UI.analyze_faces')
+    def test_handle_input_face_analysis_error(self, mock_faces, mock_describe, mock_analytics, mock_config):
+        """Test that a failed face analysis is not cached as an image without faces."""
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        mock_config.get_token_for_new_image.return_value = 1
+        mock_config.get_token_time_lock_for_new_image.return_value = 60
+        mock_describe.return_value = "Test description"
+        mock_faces.side_effect = Exception("ONNX runtime error")
+
+        response = handle_input_file(self.mock_request, self.test_image, self.session_state)
+
+        mock_faces.assert_called_once()
+        self.assertTrue(flush_background_tasks(timeout=5))
+        self.mock_face_cache.save_faces.assert_not_called()
+        self.assertEqual(response[2].token, 5 + 1)
+
     @patch('src.UI.config')
     @patch('src.UI.analytics')
     @patch('src.UI.action_describe_image')
@@ -165,12 +368,12 @@ class TestActionHandleInputFile(unittest.TestCase):
         mock_faces.return_value = []
 
         # First upload
-        response1 = action_handle_input_file(self.mock_request, self.test_image, self.session_state)
+        response1 = handle_input_file(self.mock_request, self.test_image, self.session_state)
         session_state_dict1 = response1[2]
         state_after_first = SessionState.from_gradio_state(session_state_dict1)
         
         # Second upload of same image
-        response2 = action_handle_input_file(self.mock_request, self.test_image, state_after_first)
+        response2 = handle_input_file(self.mock_request, self.test_image, state_after_first)
         session_state_dict2 = response2[2]
         state_after_second = SessionState.from_gradio_state(session_state_dict2)
         
@@ -186,7 +389,7 @@ class TestActionHandleInputFile(unittest.TestCase):
         mock_config.is_feature_generation_with_token_enabled.return_value = False
         mock_config.get_token_time_lock_for_new_image.return_value = 5
 
-        response = action_handle_input_file(self.mock_request, self.test_image, self.session_state)
+        response = handle_input_file(self.mock_request, self.test_image, self.session_state)
         
         self.assertEqual(response[1], "")  # Description should be empty on error
 
@@ -205,24 +408,18 @@ class TestActionHandleInputFile(unittest.TestCase):
         mock_faces.return_value = []
 
         # First upload
-        response1 = action_handle_input_file(self.mock_request, self.test_image, self.session_state)
+        response1 = handle_input_file(self.mock_request, self.test_image, self.session_state)
         session_state_dict1 = response1[2]
         state_after_first = session_state_dict1
         
-        # Simulate time passing - modify the timestamp in session_image_hashes
-        from src.UI import session_image_hashes
+        # Simulate time passing - lock the image with an expiry in the past
         image_sha1 = sha1(self.test_image.tobytes()).hexdigest()
-        if image_sha1 in session_image_hashes:
-            session_image_hashes[image_sha1] = {
-                "dt": datetime.now() - timedelta(minutes=61),
-                "gender": 0,
-                "min_age": 0,
-                "max_age": 0,
-                "face_detected": 0
-                }  # Past the lock period
-        
+        if token_lock.get(image_sha1) is not None:
+            token_lock.lock(image_sha1, datetime.now() - timedelta(minutes=61),
+                gender=0, min_age=0, max_age=0, face_detected=0)  # Past the lock period
+
         # Second upload of same image
-        response2 = action_handle_input_file(self.mock_request, self.test_image, state_after_first)
+        response2 = handle_input_file(self.mock_request, self.test_image, state_after_first)
         session_state_dict2 = response2[2]
         state_after_second = SessionState.from_gradio_state(session_state_dict2)
         
@@ -232,8 +429,7 @@ class TestActionHandleInputFile(unittest.TestCase):
 class TestActionGenerateImage(unittest.TestCase):
     def setUp(self):
         """Set up test fixtures before each test method."""
-        from src.UI import session_image_hashes
-        session_image_hashes.clear()  # Clear shared state
+        token_lock.clear()  # Clear shared state
         self.session_state = SessionState(token=5)
         self.test_image = Image.fromarray(np.zeros((100, 100, 3), dtype=np.uint8))
         self.mock_request = MagicMock()
@@ -242,11 +438,27 @@ class TestActionGenerateImage(unittest.TestCase):
         self.strength = 0.75
         self.steps = 20
         self.image_description = "Test description"
+        # results are encoded into a temporary folder and not saved in the output folder
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.delivery_patcher = patch('src.UI.get_delivery_folder', return_value=self.temp_dir.name)
+        self.delivery_patcher.start()
+        self.output_patcher = patch('src.UI._get_output_folder', return_value=None)
+        self.mock_output_folder = self.output_patcher.start()
 
     def tearDown(self):
         """Clean up after each test method."""
-        from src.UI import session_image_hashes
-        session_image_hashes.clear()  # Clear shared state
+        token_lock.clear()  # Clear shared state
+        flush_background_tasks(timeout=5)
+        self.output_patcher.stop()
+        self.delivery_patcher.stop()
+        self.temp_dir.cleanup()
+
+    def assertResultImage(self, result, expected):
+        """the result is the encoded file of the expected image"""
+        self.assertIsInstance(result, str)
+        self.assertTrue(result.startswith(self.temp_dir.name))
+        with Image.open(result) as image:
+            self.assertTrue(np.array_equal(np.asarray(image.convert("RGB")), np.asarray(expected.convert("RGB"))))
 
     @patch('src.UI.config')
     @patch('src.UI.analytics')
@@ -273,7 +485,7 @@ class TestActionGenerateImage(unittest.TestCase):
             self.session_state
         )
 
-        self.assertEqual(response[0], self.test_image)  # Result image
+        self.assertResultImage(response[0], self.test_image)  # Result image
         reconstructed_state = response[1]
         self.assertEqual(reconstructed_state.token, 9)  # Token is always set to 10 and decrement by one for each tunr if taken handling is disabled
 
@@ -297,10 +509,77 @@ class TestActionGenerateImage(unittest.TestCase):
             self.session_state
         )
 
-        self.assertEqual(response[0], self.test_image)  # Result image
+        self.assertResultImage(response[0], self.test_image)  # Result image
         reconstructed_state = response[1]
         self.assertEqual(reconstructed_state.token, self.session_state.token - 1)  # Token decremented
 
+    @patch('src.UI.SPECULATIVE_GENERATION', True)
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.AI')
+    def test_generate_image_speculative_hit(self, mock_ai, mock_analytics, mock_config):
+        """Test that a finished speculative generation is served without a new generation."""
+        from src.UI import background_generator, _generation_key
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        mock_config.SKIP_AI = False
+        mock_config.UI_show_strength_slider.return_value = True
+        mock_config.UI_show_steps_slider.return_value = True
+        speculative_image = Image.new("RGB", (100, 100), color="red")
+        key = _generation_key(sha1(self.test_image.tobytes()).hexdigest(), self.style, self.strength, self.steps, self.image_description)
+        background_generator.submit(key, lambda cancel_event: speculative_image, owner=self.session_state.session)
+        end = datetime.now() + timedelta(seconds=5)
+        while not background_generator.is_idle() and datetime.now() < end: pass
+
+        response = action_generate_image(
+            self.mock_request,
+            self.test_image,
+            self.style,
+            self.strength * 100,
+            self.steps,
+            self.image_description,
+            self.session_state
+        )
+
+        self.assertResultImage(response[0], speculative_image)
+        mock_ai.generate_image.assert_not_called()
+        self.assertEqual(response[1].token, self.session_state.token - 1)
+
+    @patch('src.UI.SPECULATIVE_GENERATION', True)
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.AI')
+    def test_generate_image_uses_image_store(self, mock_ai, mock_analytics, mock_config):
+        """Test that the upload is taken from the image store by its handle instead of decoding the input."""
+        from src.UI import background_generator, _generation_key
+        import src.image_store as image_store
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        mock_config.SKIP_AI = False
+        mock_config.UI_show_strength_slider.return_value = True
+        mock_config.UI_show_steps_slider.return_value = True
+        image_id = "0123456789abcdef0123456789abcdef01234567"
+        image_store.put(image_id, self.test_image)
+        self.session_state.image_id = image_id
+        speculative_image = Image.new("RGB", (100, 100), color="green")
+        key = _generation_key(image_id, self.style, self.strength, self.steps, self.image_description)
+        background_generator.submit(key, lambda cancel_event: speculative_image, owner=self.session_state.session)
+        end = datetime.now() + timedelta(seconds=5)
+        while not background_generator.is_idle() and datetime.now() < end: pass
+
+        with patch('src.UI.ingest.open_image') as mock_open, patch('src.UI.utils.compute_image_hash') as mock_hash:
+            response = action_generate_image(
+                self.mock_request,
+                "/tmp/upload.jpg",
+                self.style,
+                self.strength * 100,
+                self.steps,
+                self.image_description,
+                self.session_state
+            )
+            mock_open.assert_not_called()
+            mock_hash.assert_not_called()
+        self.assertResultImage(response[0], speculative_image)
+        self.assertEqual(response[1].image_id, image_id)
+
     @patch('src.UI.config')
     @patch('src.UI.analytics')
     def test_generate_image_no_tokens(self, mock_analytics, mock_config):
@@ -343,7 +622,7 @@ class TestActionGenerateImage(unittest.TestCase):
         )
 
         mock_ai.describe_image.assert_called_once()
-        self.assertEqual(response[0], self.test_image)
+        self.assertResultImage(response[0], self.test_image)
 
     @patch('src.UI.config')
     @patch('src.UI.analytics')
@@ -368,6 +647,28 @@ class TestActionGenerateImage(unittest.TestCase):
         reconstructed_state = response[1]
         self.assertEqual(reconstructed_state.token, self.session_state.token)  # Token not decremented on error
 
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.AI')
+    def test_generate_image_error(self, mock_ai, mock_analytics, mock_config):
+        """The credit is given back if the generation raises a plain exception (e.g. the model is not loaded)."""
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        mock_config.SKIP_AI = False
+        mock_ai.generate_image.side_effect = Exception("Error while creating the image. More details in log.")
+
+        response = action_generate_image(
+            self.mock_request,
+            self.test_image,
+            self.style,
+            self.strength,
+            self.steps,
+            self.image_description,
+            self.session_state
+        )
+
+        self.assertIsNone(response[0])
+        self.assertEqual(response[1].token, self.session_state.token)
+
     @patch('src.UI.config')
     @patch('src.UI.analytics')
     @patch('src.UI.utils')
@@ -388,7 +689,9 @@ class TestActionGenerateImage(unittest.TestCase):
         )
 
         mock_utils.image_convert_to_sepia.assert_called_once()
-        self.assertEqual(response[0], self.test_image)
+        mock_utils.save_image_with_timestamp.assert_called_once()
+        self.assertEqual(mock_utils.save_image_with_timestamp.call_args.kwargs["image"], self.test_image)
+        self.assertEqual(response[0], mock_utils.save_image_with_timestamp.return_value)
 
     @patch('src.UI.config')
     @patch('src.UI.analytics')
@@ -450,8 +753,143 @@ class TestActionGenerateImage(unittest.TestCase):
             self.session_state
         )
 
+        # analytics is written by the post-processing stage
+        self.assertTrue(flush_background_tasks(timeout=5))
         mock_analytics.save_generation_details.assert_called_once()
-        self.assertEqual(response[0], self.test_image)
+        self.assertResultImage(response[0], self.test_image)
+
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.AI')
+    def test_generate_image_encoded_once(self, mock_ai, mock_analytics, mock_config):
+        """Test that the result is encoded once, sent as file and linked into the output folder."""
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        mock_config.is_analytics_enabled.return_value = True
+        mock_config.SKIP_AI = False
+        output_folder = os.path.join(self.temp_dir.name, "output")
+        mock_config.get_output_folder.return_value = output_folder
+        self.mock_output_folder.return_value = output_folder
+        mock_ai.generate_image.return_value = self.test_image
+
+        with patch('src.utils.encode_image', wraps=utils.encode_image) as mock_encode:
+            response = action_generate_image(self.mock_request, self.test_image, self.style, self.strength,
+                self.steps, self.image_description, self.session_state)
+        mock_encode.assert_called_once()
+
+        self.assertResultImage(response[0], self.test_image)
+        self.assertTrue(flush_background_tasks(timeout=5))
+        # the result is stored in the content store by the hash of the upload
+        image_sha1 = mock_analytics.save_generation_details.call_args.kwargs["sha1"]
+        rel_path = mock_analytics.save_generation_details.call_args.kwargs["output_filename"]
+        self.assertEqual(rel_path, content_store.get_relative_path(image_sha1, content_store.KIND_OUTPUT, os.path.basename(response[0])))
+        self.assertTrue(os.path.exists(os.path.join(output_folder, rel_path)))
+        self.assertEqual(content_store.get_paths(image_sha1, root=output_folder), [rel_path])
+
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.AI')
+    def test_generate_image_resolution_tiers(self, mock_ai, mock_analytics, mock_config):
+        """Test that mobiles get the reduced resolution and can choose the full resolution."""
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        mock_config.SKIP_AI = False
+        mock_config.get_max_size.return_value = 1024
+        mock_config.GenAI_get_reduced_max_size.return_value = 64
+        mock_ai.generate_image.return_value = self.test_image
+        self.session_state.mobile = True
+        reduced_before = get_resolution_stats().get("reduced", {"generations": 0})["generations"]
+
+        # the saved compute is visible in the log
+        with patch('src.UI.RESOLUTION_LOG_INTERVAL', 1), self.assertLogs('src.UI', level="INFO") as logs:
+            response = action_generate_image(self.mock_request, self.test_image, self.style, self.strength,
+                self.steps, self.image_description, self.session_state)
+        self.assertTrue(any("Resolution reduced" in line for line in logs.output))
+        self.assertEqual(mock_ai.generate_image.call_args.kwargs["image"].size, (64, 64))
+        self.assertTrue(action_show_upgrade(response[1])["visible"])
+        stats = get_resolution_stats()["reduced"]
+        self.assertEqual(stats["generations"], reduced_before + 1)
+        self.assertGreater(stats["saved_percent"], 0)
+
+        response = action_generate_image(self.mock_request, self.test_image, self.style, self.strength,
+            self.steps, self.image_description, response[1], RESOLUTION_FULL)
+        self.assertEqual(mock_ai.generate_image.call_args.kwargs["image"].size, (96, 96))
+        self.assertFalse(action_show_upgrade(response[1], RESOLUTION_FULL)["visible"])
+
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    def test_session_initialized_client_class(self, mock_analytics, mock_config):
+        """Test that the client class of the session is taken from the user agent."""
+        mock_config.is_analytics_enabled.return_value = False
+        mock_analytics.get_client_details.return_value = {"OS": "Android", "Browser": "Chrome Mobile", "IsMobile": 1}
+        action_session_initialized(self.mock_request, self.session_state)
+        self.assertTrue(self.session_state.mobile)
+
+class TestActionGenerateAllStyles(unittest.TestCase):
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        from src.UI import style_details
+        self.style_details_backup = dict(style_details)
+        style_details.clear()
+        for name in ["Style A", "Style B", "Style C"]:
+            style_details[name] = {"prompt": name + " {prompt}", "negative_prompt": "", "strength": 0.5, "steps": 20}
+        self.session_state = SessionState(token=5)
+        self.test_image = Image.fromarray(np.zeros((100, 100, 3), dtype=np.uint8))
+        self.mock_request = MagicMock()
+        self.mock_request.client.host = "127.0.0.1"
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.delivery_patcher = patch('src.UI.get_delivery_folder', return_value=self.temp_dir.name)
+        self.delivery_patcher.start()
+        self.output_patcher = patch('src.UI._get_output_folder', return_value=None)
+        self.output_patcher.start()
+
+    def tearDown(self):
+        """Restore the style details."""
+        flush_background_tasks(timeout=5)
+        self.output_patcher.stop()
+        self.delivery_patcher.stop()
+        self.temp_dir.cleanup()
+        from src.UI import style_details
+        style_details.clear()
+        style_details.update(self.style_details_backup)
+
+    def _configure(self, mock_config):
+        mock_config.is_feature_generation_with_token_enabled.return_value = True
+        mock_config.SKIP_AI = False
+        mock_config.UI_show_strength_slider.return_value = False
+        mock_config.UI_show_steps_slider.return_value = False
+        mock_config.get_style_count.return_value = 3
+        mock_config.get_style_name.side_effect = lambda i: ["Style A", "Style B", "Style C"][i-1]
+
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.AI')
+    def test_generate_all_styles_streams_results(self, mock_ai, mock_analytics, mock_config):
+        """Test that every style is streamed into the gallery and costs one credit."""
+        self._configure(mock_config)
+        mock_ai.generate_images_for_styles.side_effect = lambda image, styles, batch_size: iter(
+            [(s["name"], self.test_image) for s in styles])
+
+        responses = list(action_generate_all_styles(self.mock_request, self.test_image, 50, 20, "a cat", self.session_state))
+
+        mock_ai.describe_image.assert_not_called()
+        mock_ai.generate_images_for_styles.assert_called_once()
+        self.assertEqual([len(r[0]) for r in responses], [1, 2, 3, 3], "gallery should grow with every finished style")
+        self.assertEqual([caption for _, caption in responses[-1][0]], ["Style A", "Style B", "Style C"])
+        self.assertEqual(responses[-1][1].token, 2)
+
+    @patch('src.UI.config')
+    @patch('src.UI.analytics')
+    @patch('src.UI.AI')
+    def test_generate_all_styles_limited_by_tokens(self, mock_ai, mock_analytics, mock_config):
+        """Test that only as many styles are created as credits are available."""
+        self._configure(mock_config)
+        self.session_state.token = 2
+        mock_ai.generate_images_for_styles.side_effect = lambda image, styles, batch_size: iter(
+            [(s["name"], self.test_image) for s in styles])
+
+        responses = list(action_generate_all_styles(self.mock_request, self.test_image, 50, 20, "a cat", self.session_state))
+
+        self.assertEqual(len(responses[-1][0]), 2)
+        self.assertEqual(responses[-1][1].token, 0)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.config as config
+import src.image_store as image_store
+
+class TestImageStore(unittest.TestCase):
+
+    def setUp(self):
+        config.read_configuration()
+        self.folder = tempfile.TemporaryDirectory()
+        config.current_config.set("ImageStore", "folder", self.folder.name)
+        config.current_config.set("ImageStore", "memory_budget_mb", "1")
+        config.current_config.set("ImageStore", "disk_budget_mb", "10")
+        config.current_config.set("ImageStore", "ttl_minutes", "60")
+        image_store.clear()
+        # 300x300 RGB = 270 KB, 3 images fit into the memory budget
+        self.images = {f"{i:040x}": Image.new("RGB", (300, 300), color=(i, 0, 0)) for i in range(5)}
+
+    def tearDown(self):
+        image_store.clear()
+        self.folder.cleanup()
+
+    def test_put_and_get(self):
+        """an image is returned by its handle"""
+        image_id, image = next(iter(self.images.items()))
+        image_store.put(image_id, image)
+        self.assertIs(image_store.get(image_id), image)
+        self.assertIsNone(image_store.get("f" * 40))
+
+    def test_invalid_id(self):
+        """handles from the browser must be hashes, they are used as file names"""
+        self.assertIsNone(image_store.get("../../etc/passwd"))
+        self.assertFalse(image_store.put("../image", Image.new("RGB", (8, 8))))
+
+    def test_memory_budget(self):
+        """the least recently used images are removed above the budget"""
+        for image_id, image in self.images.items():
+            image_store.put(image_id, image)
+        stats = image_store.get_stats()
+        self.assertLessEqual(stats["memory_mb"], 1)
+        self.assertEqual(stats["images"], 3)
+        self.assertIsNone(image_store.get(f"{0:040x}"))
+        self.assertIsNotNone(image_store.get(f"{4:040x}"))
+
+    def test_disk_after_eviction(self):
+        """an image removed from memory is loaded from disk with the same pixels"""
+        image_id, image = next(iter(self.images.items()))
+        image_store.put(image_id, image)
+        self.assertTrue(image_store.save_to_disk(image_id, image))
+        image_store.clear()
+        loaded = image_store.get(image_id)
+        self.assertEqual(loaded.tobytes(), image.tobytes())
+        self.assertEqual(image_store.get_stats()["disk_hits"], 1)
+
+    def test_ttl(self):
+        """images not used within the TTL are removed from memory and disk"""
+        image_id, image = next(iter(self.images.items()))
+        image_store.put(image_id, image)
+        image_store.save_to_disk(image_id, image)
+        file_path = os.path.join(self.folder.name, f"{image_id}.npy")
+        old = time.time() - 2 * 3600
+        os.utime(file_path, (old, old))
+        with image_store._lock:
+            image_store._images[image_id][2] -= 2 * 3600
+        self.assertIsNone(image_store.get(image_id))
+        self.assertFalse(os.path.exists(file_path))
+
+if __name__ == '__main__':
+    unittest.main()
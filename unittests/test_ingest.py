@@ -0,0 +1,83 @@
+import unittest
+import tempfile
+import numpy as np
+from PIL import Image
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.config as config
+import src.ingest as ingest
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self):
+        config.read_configuration()
+        self.folder = tempfile.TemporaryDirectory()
+        self.image = Image.fromarray(np.random.default_rng(1).integers(0, 255, (2000, 3000, 3), dtype=np.uint8))
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _save(self, image: Image.Image, filename: str, **kwargs) -> str:
+        file_path = os.path.join(self.folder.name, filename)
+        image.save(file_path, **kwargs)
+        return file_path
+
+    def test_jpeg_reduced_to_max_size(self):
+        """a big JPEG is decoded with the long side of max_size"""
+        image = ingest.open_image(self._save(self.image, "big.jpg"), 1024)
+        self.assertEqual(image.size, (1024, 683))
+        self.assertEqual(image.mode, "RGB")
+
+    def test_png_reduced_to_max_size(self):
+        """other formats are decoded in full size and reduced"""
+        image = ingest.open_image(self._save(self.image.convert("RGBA"), "big.png"), 1024)
+        self.assertEqual(image.size, (1024, 683))
+        self.assertEqual(image.mode, "RGB")
+
+    def test_small_image_not_enlarged(self):
+        """images smaller than max_size keep their size"""
+        image = ingest.open_image(self._save(self.image.resize((300, 200)), "small.jpg"), 1024)
+        self.assertEqual(image.size, (300, 200))
+
+    def test_exif_orientation(self):
+        """the EXIF orientation is applied once"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # rotated by 90 degrees
+        image = ingest.open_image(self._save(self.image.resize((300, 200)), "rotated.jpg", exif=exif), 1024)
+        self.assertEqual(image.size, (200, 300))
+        self.assertEqual(image.getexif().get(0x0112, 1), 1)
+
+    def test_decoded_image_not_changed(self):
+        """a decoded image is returned reduced without changing it"""
+        image = ingest.open_image(self.image, 1024)
+        self.assertEqual(self.image.size, (3000, 2000))
+        self.assertEqual(image.size, (1024, 683))
+
+    def test_size_checked_before_decoding(self):
+        """uploads above max_upload_megapixels are rejected, the pixels are not decoded"""
+        file_path = self._save(self.image, "big.png")
+        self.addCleanup(config.read_configuration)
+        config.current_config.read_dict({"UI": {"max_upload_megapixels": "7"}})
+        self.assertEqual(ingest.open_image(file_path, 1024).size, (1024, 683))
+        config.current_config.read_dict({"UI": {"max_upload_megapixels": "5"}})
+        with self.assertRaises(ValueError):
+            ingest.open_image(file_path, 1024)
+        with self.assertRaises(ValueError):
+            ingest.open_image(self.image, 1024)
+
+    def test_variants(self):
+        """the variants have the sizes of their consumers"""
+        config.current_config.set("GenAI", "max_size", "1024")
+        variants = ingest.create_variants(ingest.open_image(self.image, 1024))
+        self.assertEqual(max(variants["caption"].size), ingest.CAPTION_SIZE)
+        self.assertIs(variants["faces"], variants["image"])
+        width, height = variants["generation"].size
+        self.assertEqual((width % 8, height % 8), (0, 0))
+        self.assertLessEqual(max(width, height), 1024)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,8 @@
 import unittest
+import tempfile
+import threading
+import time
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import sys
 import os
@@ -102,4 +106,98 @@ class Test_ONNX(unittest.TestCase):
                     self.assertNotEqual(len(v), 0, f"No face deteted on {id}")
                     if gender=="male":
                         self.assertTrue(v[0]["isMale"], id)
-                        self.assertFalse(v[0]["isFemale"], id)
\ No newline at end of file
+                        self.assertFalse(v[0]["isFemale"], id)
+
+    def test_detection_size(self):
+        """check that the detection size keeps the aspect ratio and does not enlarge small images"""
+        self.assertEqual(src_onnx.get_detection_size(1024, 768, 512), (512, 384))
+        self.assertEqual(src_onnx.get_detection_size(768, 1024, 160), (128, 160))
+        self.assertEqual(src_onnx.get_detection_size(100, 80, 512), (128, 96))
+
+    def test_max_faces(self):
+        """check that the number of classified faces is limited"""
+        faces = [self.images['female'][20]['nosmile'], self.images['female'][20]['smile']]
+        group = Image.new("RGB", (512, 256), color="white")
+        for i, face in enumerate(faces):
+            face = face.convert("RGB")
+            face.thumbnail((256, 256))
+            group.paste(face, (i * 256, 0))
+        config.current_config.set("FaceAnalysis", "max_faces", "1")
+        self.assertEqual(len(self.FaceAnalyzer.get_gender_and_age_from_image(group)), 1)
+
+    def test_multiple_faces(self):
+        """check that all faces of a group photo are classified in one batch"""
+        faces = [self.images['male'][40]['nosmile'], self.images['female'][20]['nosmile'], self.images['female'][20]['smile']]
+        group = Image.new("RGB", (256 * len(faces), 256), color="white")
+        for i, face in enumerate(faces):
+            face = face.convert("RGB")
+            face.thumbnail((256, 256))
+            group.paste(face, (i * 256, 0))
+        v = self.FaceAnalyzer.get_gender_and_age_from_image(group)
+        self.assertEqual(len(v), len(faces))
+        self.assertEqual(sum(1 for face in v if face["isMale"]), 1)
+
+
+@unittest.skipIf(config.SKIP_ONNX, "Skipping ONNX Model tests")
+class Test_FaceAnalyzerPool(unittest.TestCase):
+
+    def setUp(self):
+        config.read_configuration()
+        self.pool = src_onnx.FaceAnalyzerPool(size=1, intra_op_threads=1, inter_op_threads=1)
+
+    def test_checkout_waits_for_checkin(self):
+        """check that an analyzer is used by one thread at a time and the waiting is counted"""
+        analyzer = self.pool.checkout()
+        checked_out = []
+        def worker():
+            with self.pool.analyzer(timeout=5) as a:
+                checked_out.append(a)
+        thread = threading.Thread(target=worker)
+        thread.start()
+        time.sleep(0.2)
+        self.assertEqual(len(checked_out), 0)
+        self.pool.checkin(analyzer)
+        thread.join(5)
+        self.assertEqual(checked_out, [analyzer])
+
+        stats = self.pool.get_stats()
+        self.assertEqual(stats["created"], 1)
+        self.assertEqual(stats["in_use"], 0)
+        self.assertEqual(stats["checkouts"], 2)
+        self.assertEqual(stats["waits"], 1)
+        self.assertGreater(stats["max_wait_seconds"], 0.1)
+
+    def test_analyze_with_pool(self):
+        """check that pooled analyzers detect faces"""
+        image = Image.open("./unittests/testdata/face_female_age20_smile.jpg")
+        with self.pool.analyzer() as analyzer:
+            self.assertNotEqual(len(analyzer.get_gender_and_age_from_image(image)), 0)
+
+
+@unittest.skipIf(config.SKIP_ONNX, "Skipping ONNX Model tests")
+class Test_OptimizedModelCache(unittest.TestCase):
+
+    def setUp(self):
+        config.read_configuration()
+        self.folder = tempfile.TemporaryDirectory()
+        config.current_config.set("FaceAnalysis", "optimized_model_cache", "true")
+        config.current_config.set("FaceAnalysis", "optimized_model_folder", self.folder.name)
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_optimized_model_reused(self):
+        """check that the optimized model is saved once and returns the same scores"""
+        model_file = config.get_modelfile_onnx_gender_googlenet()
+        first = src_onnx.create_session(model_file)
+        files = sorted(os.listdir(self.folder.name))
+        self.assertEqual(len([f for f in files if f.endswith(".onnx")]), 1)
+        modified = os.path.getmtime(os.path.join(self.folder.name, files[0]))
+
+        second = src_onnx.create_session(model_file)
+        self.assertEqual(sorted(os.listdir(self.folder.name)), files)
+        self.assertEqual(os.path.getmtime(os.path.join(self.folder.name, files[0])), modified)
+
+        batch = np.random.default_rng(1).random((1, 3, 224, 224), dtype=np.float32)
+        input_name = first.get_inputs()[0].name
+        np.testing.assert_allclose(first.run(None, {input_name: batch})[0], second.run(None, {input_name: batch})[0], rtol=1e-4, atol=1e-5)
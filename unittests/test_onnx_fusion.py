@@ -0,0 +1,107 @@
+import unittest
+import tempfile
+import numpy as np
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.onnx_fusion as onnx_fusion
+
+try:
+    import onnx
+    from onnx import helper, numpy_helper, TensorProto
+    import onnxruntime as ort
+    onnx_available = True
+except ImportError:
+    onnx_available = False
+
+@unittest.skipIf(not onnx_available, "Skipping tests, onnx or onnxruntime is not installed")
+class TestOnnxFusion(unittest.TestCase):
+
+    def setUp(self):
+        """Create two small classifiers with the same input and the same internal names."""
+        self.folder = tempfile.TemporaryDirectory()
+        self.age_file = self._create_classifier("age.onnx", classes=8, seed=1)
+        self.gender_file = self._create_classifier("gender.onnx", classes=2, seed=2)
+
+    def tearDown(self):
+        """Remove the models."""
+        self.folder.cleanup()
+
+    def _create_classifier(self, filename: str, classes: int, seed: int, fixed_batch: bool = False) -> str:
+        """Creates a classifier, with fixed_batch like the googlenet models (batch size 1 and a Reshape to [1, features])."""
+        weights = np.random.default_rng(seed).standard_normal((3 * 4 * 4, classes)).astype(np.float32)
+        batch = 1 if fixed_batch else "N"
+        initializers = [numpy_helper.from_array(weights, "weights")]
+        if fixed_batch:
+            flatten = helper.make_node("Reshape", ["data", "shape"], ["flat"], name="flatten")
+            initializers.append(numpy_helper.from_array(np.array([1, 3 * 4 * 4], dtype=np.int64), "shape"))
+        else:
+            flatten = helper.make_node("Flatten", ["data"], ["flat"], name="flatten")
+        graph = helper.make_graph(
+            [
+                flatten,
+                helper.make_node("MatMul", ["flat", "weights"], ["logits"], name="matmul"),
+                helper.make_node("Softmax", ["logits"], ["prob"], name="softmax"),
+            ],
+            "classifier",
+            [helper.make_tensor_value_info("data", TensorProto.FLOAT, [batch, 3, 4, 4])],
+            [helper.make_tensor_value_info("prob", TensorProto.FLOAT, [batch, classes])],
+            initializer=initializers)
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+        model.ir_version = 8
+        model_file = os.path.join(self.folder.name, filename)
+        onnx.save(model, model_file)
+        return model_file
+
+    def test_fused_outputs_match(self):
+        """The fused model returns the same scores as the single models with one call."""
+        fused_file = os.path.join(self.folder.name, "onnx", "fused.onnx")
+        onnx_fusion.fuse_classifiers({"age": self.age_file, "gender": self.gender_file}, fused_file)
+        self.assertTrue(os.path.exists(fused_file))
+
+        batch = np.random.default_rng(3).standard_normal((5, 3, 4, 4)).astype(np.float32)
+        fused = ort.InferenceSession(fused_file, providers=["CPUExecutionProvider"])
+        self.assertEqual(len(fused.get_inputs()), 1)
+        age, gender = fused.run(["age", "gender"], {fused.get_inputs()[0].name: batch})
+        for model_file, expected in ((self.age_file, age), (self.gender_file, gender)):
+            session = ort.InferenceSession(model_file, providers=["CPUExecutionProvider"])
+            np.testing.assert_allclose(session.run(None, {"data": batch})[0], expected, rtol=1e-5)
+
+    def test_fixed_batch_becomes_dynamic(self):
+        """Models exported with a batch size of 1 classify all faces in one run after the fusion."""
+        age_file = self._create_classifier("age1.onnx", classes=8, seed=1, fixed_batch=True)
+        gender_file = self._create_classifier("gender1.onnx", classes=2, seed=2, fixed_batch=True)
+        fused_file = os.path.join(self.folder.name, "fused1.onnx")
+        onnx_fusion.fuse_classifiers({"age": age_file, "gender": gender_file}, fused_file)
+        self.assertTrue(onnx_fusion._supports_batch(fused_file))
+
+        batch = np.random.default_rng(3).standard_normal((5, 3, 4, 4)).astype(np.float32)
+        fused = ort.InferenceSession(fused_file, providers=["CPUExecutionProvider"])
+        self.assertEqual(fused.get_inputs()[0].shape[0], onnx_fusion.BATCH_DIMENSION)
+        age, gender = fused.run(["age", "gender"], {fused.get_inputs()[0].name: batch})
+        for model_file, expected in ((age_file, age), (gender_file, gender)):
+            session = ort.InferenceSession(model_file, providers=["CPUExecutionProvider"])
+            rows = [session.run(None, {"data": batch[i:i+1]})[0] for i in range(len(batch))]
+            np.testing.assert_allclose(np.concatenate(rows), expected, rtol=1e-5)
+
+        # without the rewrite the model keeps the batch size of 1
+        onnx_fusion.fuse_classifiers({"age": age_file, "gender": gender_file}, fused_file, dynamic_batch=False)
+        self.assertFalse(onnx_fusion._supports_batch(fused_file))
+
+    def test_different_inputs(self):
+        """Models with different inputs can not be fused."""
+        graph = helper.make_graph(
+            [helper.make_node("Identity", ["data"], ["prob"])],
+            "other",
+            [helper.make_tensor_value_info("data", TensorProto.FLOAT, ["N", 3, 8, 8])],
+            [helper.make_tensor_value_info("prob", TensorProto.FLOAT, ["N", 3, 8, 8])])
+        other_file = os.path.join(self.folder.name, "other.onnx")
+        onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)]), other_file)
+        with self.assertRaises(ValueError):
+            onnx_fusion.fuse_classifiers({"age": self.age_file, "other": other_file}, os.path.join(self.folder.name, "fused.onnx"))
+
+if __name__ == '__main__':
+    unittest.main()
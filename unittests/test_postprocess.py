@@ -0,0 +1,64 @@
+import unittest
+from unittest.mock import patch
+import threading
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.postprocess as postprocess
+
+class TestPostprocess(unittest.TestCase):
+
+    def tearDown(self):
+        self.assertTrue(postprocess.flush(timeout=5))
+
+    def test_jobs_run_in_background(self):
+        """submit returns at once, flush waits for the jobs"""
+        release = threading.Event()
+        done = []
+        postprocess.submit(lambda: release.wait(5) and done.append(1))
+        self.assertEqual(done, [])
+        self.assertFalse(postprocess.flush(timeout=0.05))
+        release.set()
+        self.assertTrue(postprocess.flush(timeout=5))
+        self.assertEqual(done, [1])
+
+    def test_errors_are_logged(self):
+        """a failing job does not stop the stage"""
+        errors = postprocess.get_stats()["errors"]
+        def fail():
+            raise ValueError("disk full")
+        done = []
+        postprocess.submit(fail)
+        postprocess.submit(done.append, 1)
+        self.assertTrue(postprocess.flush(timeout=5))
+        self.assertEqual(done, [1])
+        self.assertEqual(postprocess.get_stats()["errors"], errors + 1)
+
+    def test_backpressure(self):
+        """submit blocks while the queue is full"""
+        postprocess.flush(timeout=5)
+        with patch("src.postprocess._queue", None), patch("src.postprocess._workers", []), \
+                patch("src.postprocess.config") as mock_config:
+            mock_config.GenAI_get_postprocess_queue_size.return_value = 1
+            mock_config.GenAI_get_postprocess_workers.return_value = 1
+            release = threading.Event()
+            blocked = postprocess.get_stats()["blocked"]
+            started = threading.Event()
+            postprocess.submit(lambda: started.set() or release.wait(5))  # running
+            self.assertTrue(started.wait(5))
+            postprocess.submit(release.wait, 5)  # queued
+            submitter = threading.Thread(target=postprocess.submit, args=(release.wait, 5))
+            submitter.start()
+            submitter.join(0.2)
+            self.assertTrue(submitter.is_alive(), "the third job has to wait for a free place")
+            release.set()
+            submitter.join(5)
+            self.assertFalse(submitter.is_alive())
+            self.assertTrue(postprocess.flush(timeout=5))
+            self.assertEqual(postprocess.get_stats()["blocked"], blocked + 1)
+
+if __name__ == '__main__':
+    unittest.main()
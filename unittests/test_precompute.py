@@ -0,0 +1,84 @@
+from configparser import ConfigParser
+import unittest
+from unittest.mock import patch, MagicMock
+import tempfile
+from PIL import Image
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.config as config
+import src.precompute as precompute
+from src.background import PRIORITY_PRECOMPUTE
+
+class TestPrecompute(unittest.TestCase):
+
+    def setUp(self):
+        """Prepare an input cache with one image and two styles."""
+        self.output_folder = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.output_folder.name, "20250101"))
+        Image.new("RGB", (64, 64), color="red").save(os.path.join(self.output_folder.name, "20250101", "abc.jpg"))
+        config.current_config = ConfigParser()
+        config.current_config.read_dict({
+            'General': {
+                'output_folder': self.output_folder.name,
+            },
+            'GenAI': {
+                'precompute_top_n': '5',
+                'precompute_daily_budget': '100',
+            },
+            'Styles': {
+                'style_count': '2',
+                'style_1_name': 'A',
+                'style_2_name': 'B',
+            }
+        })
+        precompute._descriptions.clear()
+        self.submitted = set()
+
+    def tearDown(self):
+        """Remove the input cache."""
+        self.output_folder.cleanup()
+        config.current_config = None
+
+    def submit(self, owner, image, sha1, description, style, priority):
+        self.assertEqual(owner, precompute.OWNER)
+        self.assertEqual(priority, PRIORITY_PRECOMPUTE)
+        if (sha1, style) in self.submitted: return False
+        self.submitted.add((sha1, style))
+        return True
+
+    @patch('src.precompute.config.SKIP_AI', True)
+    @patch('src.precompute.analytics')
+    def test_precompute_next(self, mock_analytics):
+        """Each call queues one missing style, images not in the cache are skipped."""
+        mock_analytics.get_top_uploaded_inputs.return_value = [("missing", "20250101/missing.jpg"), ("abc", "20250101/abc.jpg")]
+        generator = MagicMock()
+
+        self.assertTrue(precompute.precompute_next(generator, self.submit))
+        self.assertTrue(precompute.precompute_next(generator, self.submit))
+        self.assertFalse(precompute.precompute_next(generator, self.submit))
+        self.assertEqual(self.submitted, {("abc", "A"), ("abc", "B")})
+        self.assertEqual(precompute.get_description("abc"), "ai deactivated")
+        self.assertEqual(precompute.get_description("missing"), "")
+
+        # images which are not popular anymore are forgotten
+        mock_analytics.get_top_uploaded_inputs.return_value = []
+        self.assertFalse(precompute.precompute_next(generator, self.submit))
+        self.assertEqual(precompute.get_description("abc"), "")
+
+    def test_remaining_budget(self):
+        """The budget counts the compute time of the current day only."""
+        generator = MagicMock()
+        generator.get_compute_seconds.return_value = 500.0
+        precompute._budget_day = None
+        self.assertAlmostEqual(precompute.get_remaining_budget(generator), 100)
+        generator.get_compute_seconds.return_value = 580.0
+        self.assertAlmostEqual(precompute.get_remaining_budget(generator), 20)
+        generator.get_compute_seconds.return_value = 650.0
+        self.assertLessEqual(precompute.get_remaining_budget(generator), 0)
+
+if __name__ == '__main__':
+    unittest.main()
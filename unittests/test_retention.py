@@ -0,0 +1,155 @@
+import unittest
+from unittest.mock import patch, MagicMock
+import sqlite3
+import tempfile
+from PIL import Image
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.content_store as content_store
+import src.retention as retention
+
+class TestRetention(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        retention._scan_rowid = 0
+        self.config_patcher = patch("src.retention.config")
+        self.mock_config = self.config_patcher.start()
+        self.mock_config.get_output_folder.return_value = self.root
+        self.mock_config.Retention_get_max_size_mb.return_value = 0
+        self.mock_config.Retention_get_max_age_days.return_value = 0
+        self.mock_config.Retention_get_min_free_mb.return_value = 0
+
+    def tearDown(self):
+        self.config_patcher.stop()
+        self.temp_dir.cleanup()
+
+    def store_result(self, sha1: str, name: str, size: int) -> str:
+        source = os.path.join(self.root, name)
+        with open(source, "wb") as file:
+            file.write(b"0" * size)
+        return content_store.put_file(source, sha1, move=True, root=self.root)
+
+    def set_created(self, relative_path: str, created: str):
+        with sqlite3.connect(os.path.join(self.root, content_store.INDEX_FILE)) as connection:
+            connection.execute("UPDATE tblContent SET Created = ? WHERE Path = ?", (created, relative_path))
+
+    def test_disabled(self):
+        """without limits nothing is removed"""
+        path = self.store_result("a" * 40, "a.png", 1024)
+        self.assertFalse(retention.is_enabled())
+        self.assertEqual(retention.run_once(), 0)
+        self.assertTrue(os.path.exists(os.path.join(self.root, path)))
+
+    def test_max_age(self):
+        """files older than max_age_days are removed"""
+        old = self.store_result("a" * 40, "old.png", 1000)
+        new = self.store_result("b" * 40, "new.png", 1000)
+        self.set_created(old, "2000-01-01 00:00:00.000")
+        self.mock_config.Retention_get_max_age_days.return_value = 30
+
+        self.assertEqual(retention.run_once(), 1000)
+        self.assertFalse(os.path.exists(os.path.join(self.root, old)))
+        self.assertTrue(os.path.exists(os.path.join(self.root, new)))
+        self.assertEqual(content_store.get_paths("a" * 40, root=self.root), [])
+
+    def test_max_size_removes_unviewed_results_first(self):
+        """above the budget results which were never viewed are removed before viewed results and uploads"""
+        viewed = self.store_result("a" * 40, "viewed.png", 600 * 1024)
+        self.set_created(viewed, "2000-01-01 00:00:00.000")
+        content_store.touch(viewed, root=self.root)
+        upload = content_store.put_image(Image.new("RGB", (16, 16)), "c" * 40, root=self.root)
+        unviewed = self.store_result("b" * 40, "unviewed.png", 600 * 1024)
+        self.mock_config.Retention_get_max_size_mb.return_value = 1
+
+        reclaimed = retention.run_once()
+        self.assertEqual(reclaimed, 600 * 1024)
+        self.assertFalse(os.path.exists(os.path.join(self.root, unviewed)))
+        self.assertTrue(os.path.exists(os.path.join(self.root, viewed)))
+        self.assertTrue(os.path.exists(os.path.join(self.root, upload)))
+        self.assertGreaterEqual(retention.get_stats()["reclaimed_bytes"], reclaimed)
+
+    def test_min_free(self):
+        """files are removed until the free disk space is reached"""
+        self.store_result("a" * 40, "a.png", 1000)
+        self.store_result("b" * 40, "b.png", 1000)
+        self.mock_config.Retention_get_min_free_mb.return_value = 1
+        usage = MagicMock(free=1024 * 1024 - 1500)
+        with patch("src.retention.shutil.disk_usage", return_value=usage):
+            self.assertEqual(retention.run_once(), 2000)
+        self.assertEqual(content_store.get_stats(root=self.root), {})
+
+    def test_min_free_counts_freed_bytes(self):
+        """a hard linked file (e.g. still in the delivery folder) frees no space, so more files are removed"""
+        source = os.path.join(self.root, "delivered.png")
+        with open(source, "wb") as file:
+            file.write(b"0" * 1000)
+        linked = content_store.put_file(source, "a" * 40, root=self.root)
+        unlinked = self.store_result("b" * 40, "b.png", 1000)
+        self.mock_config.Retention_get_min_free_mb.return_value = 1
+        usage = MagicMock(free=1024 * 1024 - 500)
+        with patch("src.retention.shutil.disk_usage", return_value=usage):
+            self.assertEqual(retention.run_once(), 1000)
+        self.assertFalse(os.path.exists(os.path.join(self.root, linked)))
+        self.assertFalse(os.path.exists(os.path.join(self.root, unlinked)))
+        self.assertTrue(os.path.exists(source))
+
+    def test_prune_delivery(self):
+        """results sent to the browser are removed after delivery_max_age_minutes"""
+        delivery_folder = os.path.join(self.root, "delivery")
+        os.makedirs(delivery_folder)
+        old = os.path.join(delivery_folder, "old.png")
+        new = os.path.join(delivery_folder, "new.png")
+        for path in (old, new):
+            with open(path, "wb") as file:
+                file.write(b"0" * 10)
+        stored = content_store.put_file(old, "a" * 40, root=self.root)
+        os.utime(old, (0, 0))
+        self.mock_config.Retention_get_delivery_max_age_minutes.return_value = 60
+
+        self.assertEqual(retention.prune_delivery(delivery_folder), 1)
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(new))
+        # the stored result is not linked anymore, removing it frees the space
+        self.assertEqual(content_store.remove(stored, root=self.root), 10)
+
+        self.mock_config.Retention_get_delivery_max_age_minutes.return_value = 0
+        os.utime(new, (0, 0))
+        self.assertEqual(retention.prune_delivery(delivery_folder), 0)
+
+    def test_remove_error(self):
+        """a file which can not be removed is logged and skipped, the run continues"""
+        protected = self.store_result("a" * 40, "a.png", 1000)
+        other = self.store_result("b" * 40, "b.png", 1000)
+        self.set_created(protected, "2000-01-01 00:00:00.000")
+        self.set_created(other, "2000-01-02 00:00:00.000")
+        self.mock_config.Retention_get_max_age_days.return_value = 30
+        remove = os.remove
+        def remove_protected(path):
+            if path.endswith("a.png"): raise PermissionError("denied")
+            remove(path)
+        with patch("src.content_store.os.remove", side_effect=remove_protected):
+            self.assertEqual(retention.run_once(), 1000)
+        self.assertTrue(os.path.exists(os.path.join(self.root, protected)))
+        self.assertFalse(os.path.exists(os.path.join(self.root, other)))
+        self.assertEqual(content_store.get_paths("a" * 40, root=self.root), [protected])
+
+    def test_incremental_scan(self):
+        """files removed by hand are removed from the index in batches"""
+        paths = [self.store_result(f"{i:040x}", f"{i}.png", 10) for i in range(5)]
+        for path in paths:
+            os.remove(os.path.join(self.root, path))
+        with patch("src.retention.SCAN_BATCH", 3):
+            retention.run_once()
+            self.assertEqual(content_store.get_stats(root=self.root)[content_store.KIND_OUTPUT]["files"], 2)
+            retention.run_once()
+        self.assertEqual(content_store.get_stats(root=self.root), {})
+        self.assertEqual(retention._scan_rowid, 0, "the scan starts again at the beginning")
+
+if __name__ == '__main__':
+    unittest.main()
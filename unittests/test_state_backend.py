@@ -0,0 +1,174 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import threading
+import time
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.state_backend as state_backend
+from src.state_backend import MemoryBackend, SQLiteBackend
+
+class BackendTests:
+    """Tests for all backends, create_backend returns a new backend."""
+
+    def test_balance(self):
+        """unknown sessions start with the browser token, changes are kept"""
+        backend = self.create_backend()
+        now = time.time()
+        self.assertEqual(backend.sync_balance("s1", 3, now), 3)
+        self.assertEqual(backend.sync_balance("s1", 10, now), 3, "the browser value is ignored for known sessions")
+        self.assertEqual(backend.add_balance("s1", 10, 2, now), 5)
+        self.assertEqual(backend.add_balance("s2", 1, -1, now), 0)
+        self.assertEqual(backend.get_stats()["sessions"], 2)
+
+    def test_try_spend(self):
+        """credits are only spent if the balance is sufficient"""
+        backend = self.create_backend()
+        now = time.time()
+        self.assertEqual(backend.try_spend("s1", 2, 1, now), (True, 1))
+        self.assertEqual(backend.try_spend("s1", 2, 2, now), (False, 1))
+        self.assertEqual(backend.try_spend("s1", 2, 1, now), (True, 0))
+        self.assertEqual(backend.try_spend("s1", 2, 1, now), (False, 0))
+
+    def test_concurrent_spend(self):
+        """parallel requests spend each credit only once"""
+        backend = self.create_backend()
+        backend.sync_balance("s1", 50, time.time())
+        spent = []
+        def spend():
+            for _ in range(40):
+                if backend.try_spend("s1", 0, 1, time.time())[0]: spent.append(1)
+        threads = [threading.Thread(target=spend) for _ in range(4)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(len(spent), 50)
+        self.assertEqual(backend.sync_balance("s1", 0, time.time()), 0)
+
+    def test_expire_balances(self):
+        """balances not changed for a while are removed"""
+        backend = self.create_backend()
+        now = time.time()
+        backend.sync_balance("old", 1, now - 100)
+        backend.sync_balance("new", 1, now)
+        self.assertEqual(backend.expire_balances(now - 50), 1)
+        self.assertEqual(backend.get_stats()["sessions"], 1)
+
+    def test_locks(self):
+        """locks are returned until they expire"""
+        backend = self.create_backend()
+        now = time.time()
+        backend.set_lock("a", now + 60, {"gender": 1}, 100)
+        backend.set_lock("b", now - 1, {}, 100)
+        expiry, details = backend.get_lock("a", now)
+        self.assertAlmostEqual(expiry, now + 60)
+        self.assertEqual(details, {"gender": 1})
+        self.assertIsNone(backend.get_lock("b", now))
+        self.assertEqual(backend.expire_locks(now), 1)
+        self.assertTrue(backend.remove_lock("a"))
+        self.assertFalse(backend.remove_lock("a"))
+        self.assertEqual(backend.get_stats()["entries"], 0)
+
+    def test_try_lock(self):
+        """an image is only locked if it is not locked or the lock expired"""
+        backend = self.create_backend()
+        now = time.time()
+        self.assertEqual(backend.try_lock("a", now + 60, {"gender": 1}, now, 100), (None, 0))
+        entry, _ = backend.try_lock("a", now + 120, {"gender": 2}, now, 100)
+        self.assertAlmostEqual(entry[0], now + 60)
+        self.assertEqual(entry[1], {"gender": 1})
+        self.assertIsNone(backend.try_lock("a", now + 180, {}, now + 60, 100)[0], "an expired lock is replaced")
+
+    def test_concurrent_try_lock(self):
+        """of parallel uploads of the same image only one gets the lock"""
+        backend = self.create_backend()
+        acquired = []
+        barrier = threading.Barrier(4)
+        def lock():
+            barrier.wait()
+            now = time.time()
+            if backend.try_lock("a", now + 60, {}, now, 100)[0] is None: acquired.append(1)
+        threads = [threading.Thread(target=lock) for _ in range(4)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(len(acquired), 1)
+
+    def test_max_locks(self):
+        """the locks which expire next are removed above max_entries"""
+        backend = self.create_backend()
+        now = time.time()
+        for i in range(5):
+            backend.set_lock(str(i), now + 100 - i, {}, 3)
+        self.assertEqual(backend.get_stats()["entries"], 3)
+        self.assertIsNone(backend.get_lock("4", now))
+        self.assertIsNotNone(backend.get_lock("0", now))
+
+    def test_clear(self):
+        """balances and locks are cleared separately"""
+        backend = self.create_backend()
+        now = time.time()
+        backend.sync_balance("s1", 1, now)
+        backend.set_lock("a", now + 60, {}, 100)
+        backend.clear_locks()
+        self.assertEqual(backend.get_stats()["sessions"], 1)
+        backend.clear_balances()
+        self.assertEqual(backend.get_stats()["sessions"], 0)
+
+
+class TestMemoryBackend(BackendTests, unittest.TestCase):
+
+    def create_backend(self):
+        return MemoryBackend()
+
+
+class TestSQLiteBackend(BackendTests, unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "state", "state.db")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def create_backend(self):
+        return SQLiteBackend(self.path)
+
+    def test_shared_between_instances(self):
+        """two backends on the same database (like two app instances) share credits and locks"""
+        first = self.create_backend()
+        second = self.create_backend()
+        now = time.time()
+        first.sync_balance("s1", 1, now)
+        self.assertEqual(second.try_spend("s1", 5, 1, now), (True, 0))
+        self.assertEqual(first.try_spend("s1", 5, 1, now), (False, 0))
+        first.set_lock("a", now + 60, {"face_detected": True}, 100)
+        self.assertEqual(second.get_lock("a", now)[1], {"face_detected": True})
+        self.assertIsNotNone(second.try_lock("a", now + 60, {}, now, 100)[0])
+
+
+class TestGetBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        state_backend._backend = None
+        state_backend._backend_key = None
+        self.temp_dir.cleanup()
+
+    @patch("src.state_backend.config")
+    def test_backend_of_configuration(self, mock_config):
+        """the backend follows the configuration, unknown backends use memory"""
+        mock_config.State_get_sqlite_path.return_value = os.path.join(self.temp_dir.name, "state.db")
+        mock_config.State_get_backend.return_value = "sqlite"
+        backend = state_backend.get_backend()
+        self.assertIsInstance(backend, SQLiteBackend)
+        self.assertIs(state_backend.get_backend(), backend)
+        mock_config.State_get_backend.return_value = "redis"
+        self.assertIsInstance(state_backend.get_backend(), MemoryBackend)
+
+if __name__ == '__main__':
+    unittest.main()
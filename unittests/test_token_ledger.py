@@ -0,0 +1,58 @@
+import unittest
+import threading
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.token_ledger as token_ledger
+from src.SessionState import SessionState
+
+class TestTokenLedger(unittest.TestCase):
+
+    def setUp(self):
+        token_ledger.clear()
+
+    def tearDown(self):
+        token_ledger.clear()
+
+    def test_unknown_session_uses_browser_value(self):
+        """the first sync takes the token of the browser"""
+        state = SessionState(token=3)
+        self.assertEqual(token_ledger.sync(state), 3)
+        self.assertEqual(state.token, 3)
+
+    def test_known_session_uses_ledger(self):
+        """a state with an outdated token gets the balance of the ledger"""
+        state = SessionState(token=3)
+        token_ledger.sync(state)
+        token_ledger.add(state, 2)
+        outdated = SessionState(token=3, session=state.session)
+        self.assertEqual(token_ledger.sync(outdated), 5)
+        self.assertEqual(outdated.token, 5)
+
+    def test_concurrent_changes(self):
+        """bonus and spending of parallel handlers are both counted"""
+        state = SessionState(token=0)
+        token_ledger.sync(state)
+        def change(amount):
+            for _ in range(100):
+                token_ledger.add(SessionState(token=0, session=state.session), amount)
+        threads = [threading.Thread(target=change, args=(amount,)) for amount in (2, -1, 1, -1)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(token_ledger.sync(state), 100)
+        self.assertEqual(token_ledger.get_stats()["sessions"], 1)
+
+    def test_try_spend(self):
+        """a generation can only spend available credits, the state gets the balance"""
+        state = SessionState(token=1)
+        self.assertTrue(token_ledger.try_spend(state))
+        self.assertEqual(state.token, 0)
+        outdated = SessionState(token=1, session=state.session)
+        self.assertFalse(token_ledger.try_spend(outdated))
+        self.assertEqual(outdated.token, 0)
+
+if __name__ == '__main__':
+    unittest.main()
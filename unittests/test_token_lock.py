@@ -0,0 +1,103 @@
+import unittest
+from unittest.mock import patch
+from datetime import datetime, timedelta
+import threading
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.token_lock as token_lock
+
+class TestTokenLock(unittest.TestCase):
+
+    def setUp(self):
+        token_lock.clear()
+
+    def tearDown(self):
+        token_lock.clear()
+
+    def test_lock_and_get(self):
+        """a locked image returns its details and expiry"""
+        until = datetime.now() + timedelta(minutes=5)
+        token_lock.lock("a", until, gender=1, min_age=20, max_age=30, face_detected=True)
+        details = token_lock.get("a")
+        self.assertEqual(details["gender"], 1)
+        self.assertEqual(details["max_age"], 30)
+        self.assertTrue(details["face_detected"])
+        self.assertAlmostEqual(details["dt"].timestamp(), until.timestamp(), places=3)
+        self.assertIsNone(token_lock.get("b"))
+
+    def test_try_lock(self):
+        """the first caller gets the lock, later callers get the details of the lock"""
+        until = datetime.now() + timedelta(minutes=5)
+        self.assertIsNone(token_lock.try_lock("a", until, gender=1))
+        details = token_lock.try_lock("a", until + timedelta(minutes=5), gender=2)
+        self.assertEqual(details["gender"], 1)
+        self.assertAlmostEqual(details["dt"].timestamp(), until.timestamp(), places=3)
+        stats = token_lock.get_stats()
+        self.assertEqual((stats["locks"], stats["hits"]), (1, 1))
+
+    def test_expired_locks_are_removed(self):
+        """expired locks are not returned and removed from the store"""
+        token_lock.lock("old", datetime.now() - timedelta(minutes=1))
+        token_lock.lock("new", datetime.now() + timedelta(minutes=5))
+        self.assertIsNone(token_lock.get("old"))
+        stats = token_lock.get_stats()
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["expired"], 1)
+
+    def test_renew_lock(self):
+        """a renewed lock keeps the new expiry, its former heap entry is ignored"""
+        token_lock.lock("a", datetime.now() + timedelta(seconds=1))
+        token_lock.lock("a", datetime.now() + timedelta(minutes=5), gender=2)
+        with patch("src.token_lock.datetime") as mock_datetime:
+            mock_datetime.now.return_value = datetime.now() + timedelta(minutes=1)
+            mock_datetime.fromtimestamp = datetime.fromtimestamp
+            self.assertEqual(token_lock.purge(), 0)
+            self.assertEqual(token_lock.get("a")["gender"], 2)
+
+    def test_unlock(self):
+        """an unlocked image can earn credits again"""
+        token_lock.lock("a", datetime.now() + timedelta(minutes=5))
+        self.assertTrue(token_lock.unlock("a"))
+        self.assertFalse(token_lock.unlock("a"))
+        self.assertIsNone(token_lock.get("a"))
+
+    @patch("src.token_lock.config")
+    def test_max_entries(self, mock_config):
+        """the locks which expire next are removed if the store is full"""
+        mock_config.get_token_lock_max_entries.return_value = 3
+        now = datetime.now()
+        for i in range(5):
+            token_lock.lock(str(i), now + timedelta(minutes=10 - i))
+        # 4 and 3 expire first
+        self.assertIsNone(token_lock.get("4"))
+        self.assertIsNone(token_lock.get("3"))
+        for i in range(3):
+            self.assertIsNotNone(token_lock.get(str(i)))
+        self.assertEqual(token_lock.get_stats()["evictions"], 2)
+
+    def test_heap_is_compacted(self):
+        """renewing the same locks does not grow the heap without bound"""
+        for _ in range(5):
+            for i in range(1000):
+                token_lock.lock(str(i), datetime.now() + timedelta(minutes=5))
+        stats = token_lock.get_stats()
+        self.assertEqual(stats["entries"], 1000)
+        self.assertLessEqual(stats["heap"], 2 * 1000 + 1024)
+
+    def test_concurrent_locks(self):
+        """locks of parallel uploads are all stored"""
+        until = datetime.now() + timedelta(minutes=5)
+        def lock_range(start):
+            for i in range(start, start + 500):
+                token_lock.lock(str(i), until)
+        threads = [threading.Thread(target=lock_range, args=(i * 500,)) for i in range(4)]
+        for thread in threads: thread.start()
+        for thread in threads: thread.join()
+        self.assertEqual(token_lock.get_stats()["entries"], 2000)
+
+if __name__ == '__main__':
+    unittest.main()
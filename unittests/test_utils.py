@@ -0,0 +1,73 @@
+import unittest
+import tempfile
+import numpy as np
+from PIL import Image
+from hashlib import sha1
+
+# Add parent Path to search path for python modules
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import src.utils as utils
+
+class TestImageHash(unittest.TestCase):
+
+    def setUp(self):
+        self.image = Image.fromarray(np.random.default_rng(1).integers(0, 255, (37, 53, 3), dtype=np.uint8))
+
+    def test_hash_equals_sha1_of_pixels(self):
+        """the hash is the same as the SHA1 of the pixel bytes used before"""
+        for mode in ["RGB", "RGBA", "L", "P", "1", "I", "F"]:
+            image = self.image.convert(mode)
+            self.assertEqual(utils.compute_image_hash(image), sha1(image.tobytes()).hexdigest(), mode)
+
+    def test_save_image_with_given_hash(self):
+        """the given hash is used as filename"""
+        with tempfile.TemporaryDirectory() as folder:
+            file_path = utils.save_image_as_file(self.image, folder, "given")
+            self.assertEqual(os.path.basename(file_path), "given.jpg")
+            file_path = utils.save_image_as_file(self.image, folder)
+            self.assertEqual(os.path.basename(file_path), sha1(self.image.tobytes()).hexdigest() + ".jpg")
+
+class TestOutputEncoding(unittest.TestCase):
+
+    def setUp(self):
+        self.image = Image.fromarray(np.random.default_rng(1).integers(0, 255, (64, 96, 3), dtype=np.uint8))
+
+    def test_save_in_output_formats(self):
+        """the file gets the extension and the encoding of the format"""
+        with tempfile.TemporaryDirectory() as folder:
+            for image_format, pil_format, extension in [("png", "PNG", ".png"), ("jpeg", "JPEG", ".jpg"), ("webp", "WEBP", ".webp")]:
+                file_path = utils.save_image_with_timestamp(self.image, folder, reference=image_format, image_format=image_format)
+                self.assertTrue(file_path.endswith(extension))
+                with Image.open(file_path) as saved:
+                    self.assertEqual(saved.format, pil_format)
+                    self.assertEqual(saved.size, self.image.size)
+
+    def test_lossless_formats(self):
+        """PNG and WebP with quality 100 keep the pixels"""
+        for image_format in ["png", "webp"]:
+            with tempfile.TemporaryFile() as file:
+                utils.encode_image(self.image, file, image_format, quality=100)
+                file.seek(0)
+                with Image.open(file) as saved:
+                    self.assertTrue(np.array_equal(np.asarray(saved.convert("RGB")), np.asarray(self.image)), image_format)
+
+    def test_jpeg_options(self):
+        """JPEG is saved progressive if configured and without alpha channel"""
+        with tempfile.TemporaryFile() as file:
+            utils.encode_image(self.image.convert("RGBA"), file, "jpeg", quality=80, effort=4, progressive=True)
+            file.seek(0)
+            with Image.open(file) as saved:
+                self.assertEqual(saved.mode, "RGB")
+                self.assertTrue(saved.info.get("progressive"))
+
+    def test_encoder_options(self):
+        """effort selects the WebP method and the PNG compression level"""
+        self.assertEqual(utils.get_encoder_options("webp", 90, 6, False)["method"], 6)
+        self.assertEqual(utils.get_encoder_options("png", 90, 4, False)["compress_level"], 6)
+        self.assertFalse(utils.get_encoder_options("jpeg", 90, 1, False)["optimize"])
+
+if __name__ == '__main__':
+    unittest.main()